@@ -0,0 +1,515 @@
+#!/usr/bin/env python3
+"""
+Latency benchmark for the Study Assistant backend.
+
+Runs the FastAPI app in-process (uvicorn on a free local port) against two
+local stand-ins, so results don't depend on a GPU or a Notion workspace:
+
+- one or more fake Ollama hosts with configurable latency that answer
+  classification prompts with one of a fixed set of subjects/topics
+- a fake Notion API with a request rate limit that answers 429 + Retry-After
+  when exceeded (and optionally at random)
+
+It captures notes through /capture at the given concurrency, then reads them
+back through /notes, /notes/{id} and /topics, waits for the Notion outbox to
+drain, and writes throughput and p50/p95/p99 latency per stage (plus the
+app's own per-stage means from /metrics) to a JSON file so runs can be compared.
+
+Usage:
+  python benchmark.py
+  python benchmark.py --captures 500 --concurrency 16 --ollama-latency 0.4
+  python benchmark.py --env DB_POOL_SIZE=16 --env CAPTURE_MODE=async --label pool16-async
+  python benchmark.py --ollama-hosts 3 --ollama-slow-host 1.0 --env OLLAMA_HEDGE_AFTER=0.5 --label hedged
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+
+# (subject, topic, keywords) the fake model picks from, by hash of the prompt
+FAKE_CLASSIFICATIONS = [
+    ("Biology", "Photosynthesis", "light, chlorophyll, glucose"),
+    ("Biology", "Cell Division", "mitosis, meiosis, chromosomes"),
+    ("Computer Science", "Databases", "sql, index, transaction"),
+    ("Computer Science", "Machine Learning", "model, training, gradient"),
+    ("Mathematics", "Linear Algebra", "matrix, vector, eigenvalue"),
+    ("Mathematics", "Calculus", "derivative, integral, limit"),
+    ("Physics", "Thermodynamics", "entropy, heat, energy"),
+    ("History", "World War II", "allies, axis, 1945"),
+]
+
+WORDS = (
+    "energy cell matrix light protein vector index query entropy heat model gradient "
+    "chlorophyll glucose mitosis integral derivative limit transaction allies treaty "
+    "photon enzyme membrane eigenvalue tensor sorting graph network theorem"
+).split()
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# ========== FAKE OLLAMA ==========
+
+class FakeOllama:
+    """Stand-in for Ollama's /api/generate and /api/embed with configurable latency"""
+
+    def __init__(self, latency: float, jitter: float, token_delay: float):
+        self.latency = latency
+        self.jitter = jitter
+        self.token_delay = token_delay
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="fake-ollama", daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+
+    def answer(self, prompt: str) -> str:
+        if "JSON array" in prompt:
+            count = max(prompt.count("<<<"), 1)
+            return json.dumps([
+                {"index": i, **self._classification(prompt + str(i))} for i in range(count)
+            ])
+        return json.dumps(self._classification(prompt))
+
+    @staticmethod
+    def _classification(prompt: str) -> dict:
+        digest = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest(), 16)
+        subject, topic, keywords = FAKE_CLASSIFICATIONS[digest % len(FAKE_CLASSIFICATIONS)]
+        return {"subject": subject, "topic": topic, "create_new": False, "keywords": keywords}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _json(self, code: int, obj):
+                body = json.dumps(obj).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self._json(200, {"models": []})
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with fake._lock:
+                    fake.calls += 1
+
+                if self.path in ("/api/embed", "/api/embeddings"):
+                    inputs = body.get("input") or body.get("prompt") or ""
+                    inputs = [inputs] if isinstance(inputs, str) else inputs
+                    vectors = [
+                        [b / 255 for b in hashlib.sha256(text.lower().encode("utf-8")).digest()[:16]]
+                        for text in inputs
+                    ]
+                    return self._json(200, {"embeddings": vectors, "embedding": vectors[0] if vectors else []})
+
+                time.sleep(max(0.0, fake.latency + random.uniform(-fake.jitter, fake.jitter)))
+                answer = fake.answer(body.get("prompt", ""))
+                if not body.get("stream", True):
+                    return self._json(200, {"model": body.get("model"), "response": answer, "done": True})
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for i in range(0, len(answer), 8):
+                        self._chunk({"model": body.get("model"), "response": answer[i:i + 8], "done": False})
+                        if fake.token_delay:
+                            time.sleep(fake.token_delay)
+                    self._chunk({"model": body.get("model"), "response": "", "done": True})
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client stopped reading once the JSON closed
+
+            def _chunk(self, obj):
+                data = (json.dumps(obj) + "\n").encode("utf-8")
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+        return Handler
+
+
+# ========== FAKE NOTION ==========
+
+class FakeNotion:
+    """Stand-in for the Notion pages/search/blocks API with a per-second rate limit"""
+
+    def __init__(self, latency: float, rate_limit: float, error_rate: float):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.pages: Dict[str, Tuple[str, str]] = {}  # page id -> (parent id, title)
+        self.requests = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+        self._tokens = rate_limit
+        self._refilled = time.monotonic()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="fake-notion", daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+
+    def admit(self) -> bool:
+        """Token bucket of rate_limit requests per second, plus random 429s"""
+        with self._lock:
+            self.requests += 1
+            now = time.monotonic()
+            self._tokens = min(self.rate_limit, self._tokens + (now - self._refilled) * self.rate_limit)
+            self._refilled = now
+            if self._tokens >= 1 and random.random() >= self.error_rate:
+                self._tokens -= 1
+                return True
+            self.throttled += 1
+            return False
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "throttled": self.throttled, "pages": len(self.pages)}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _json(self, code: int, obj, headers: Optional[dict] = None):
+                body = json.dumps(obj).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _throttle(self) -> bool:
+                time.sleep(fake.latency)
+                if fake.admit():
+                    return False
+                self._json(429, {"object": "error", "code": "rate_limited"}, {"Retry-After": "1"})
+                return True
+
+            def do_GET(self):
+                if self._throttle():
+                    return
+                parts = urlparse(self.path).path.strip("/").split("/")
+                if len(parts) == 3 and parts[0] == "blocks" and parts[2] == "children":
+                    with fake._lock:
+                        children = [
+                            {"id": page_id, "type": "child_page", "child_page": {"title": title}}
+                            for page_id, (parent, title) in fake.pages.items() if parent == parts[1]
+                        ]
+                    return self._json(200, {"results": children, "has_more": False})
+                self._json(404, {"object": "error", "code": "object_not_found"})
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if self._throttle():
+                    return
+                path = urlparse(self.path).path.rstrip("/")
+                if path == "/search":
+                    query = body.get("query", "")
+                    with fake._lock:
+                        results = [
+                            {
+                                "id": page_id,
+                                "object": "page",
+                                "parent": {"page_id": parent},
+                                "properties": {"title": {"title": [{"plain_text": title}]}},
+                            }
+                            for page_id, (parent, title) in fake.pages.items() if query in title
+                        ]
+                    return self._json(200, {"results": results})
+                if path == "/pages":
+                    title_prop = body.get("properties", {}).get("title", [])
+                    if isinstance(title_prop, dict):
+                        title_prop = title_prop.get("title", [])
+                    title = title_prop[0]["text"]["content"] if title_prop else ""
+                    page_id = str(uuid.uuid4())
+                    with fake._lock:
+                        fake.pages[page_id] = (body.get("parent", {}).get("page_id", ""), title)
+                    return self._json(200, {"id": page_id, "url": f"https://www.notion.so/{page_id.replace('-', '')}"})
+                self._json(404, {"object": "error", "code": "object_not_found"})
+
+        return Handler
+
+
+# ========== LOAD GENERATION ==========
+
+class Recorder:
+    """Per-stage latencies (seconds) and error counts, safe to use from worker threads"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.elapsed: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float, ok: bool):
+        with self._lock:
+            self.latencies.setdefault(stage, []).append(seconds)
+            if not ok:
+                self.errors[stage] = self.errors.get(stage, 0) + 1
+
+    def summary(self) -> dict:
+        stages = {}
+        for stage, values in self.latencies.items():
+            values = sorted(values)
+            elapsed = self.elapsed.get(stage) or sum(values)
+            stages[stage] = {
+                "count": len(values),
+                "errors": self.errors.get(stage, 0),
+                "throughput_rps": round(len(values) / elapsed, 2) if elapsed else 0.0,
+                "mean_ms": round(sum(values) / len(values) * 1000, 2),
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p95_ms": round(percentile(values, 95) * 1000, 2),
+                "p99_ms": round(percentile(values, 99) * 1000, 2),
+                "max_ms": round(values[-1] * 1000, 2),
+            }
+        return stages
+
+
+def random_text(rng: random.Random, words: int = 60) -> str:
+    """A unique pseudo-sentence so captures aren't deduplicated"""
+    body = " ".join(rng.choice(WORDS) for _ in range(words))
+    return f"{body.capitalize()}. ({uuid.UUID(int=rng.getrandbits(128))})"
+
+
+def run_phase(recorder: Recorder, phase: str, jobs: List[Tuple[str, Callable[[requests.Session], requests.Response]]],
+              concurrency: int):
+    """Run (stage, request) jobs on `concurrency` threads, each with its own HTTP session"""
+    local = threading.local()
+
+    def run(job):
+        stage, send = job
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            ok = send(local.session).status_code < 400
+        except requests.RequestException:
+            ok = False
+        recorder.record(stage, time.perf_counter() - started, ok)
+
+    print(f"🏁 {phase}: {len(jobs)} requests at concurrency {concurrency}")
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(run, jobs))
+    elapsed = time.perf_counter() - started
+    for stage in {stage for stage, _ in jobs}:
+        recorder.elapsed[stage] = elapsed
+    return elapsed
+
+
+def start_app(port: int):
+    """Import the app with the benchmark environment and serve it on a background thread"""
+    import uvicorn
+    import main
+
+    config = uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, name="uvicorn", daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 30
+    while not server.started:
+        if time.monotonic() > deadline or not thread.is_alive():
+            raise RuntimeError("App didn't start")
+        time.sleep(0.05)
+    return server, thread
+
+
+def wait_for_sync(base_url: str, timeout: float) -> dict:
+    """Poll /sync/status until the Notion outbox is drained (or timeout); returns the last status"""
+    started = time.perf_counter()
+    status: dict = {}
+    while time.perf_counter() - started < timeout:
+        status = requests.get(f"{base_url}/sync/status", timeout=10).json()
+        if not status.get("pending") and not status.get("in_flight"):
+            break
+        time.sleep(0.25)
+    return {**status, "drain_seconds": round(time.perf_counter() - started, 2)}
+
+
+def server_stages(base_url: str) -> dict:
+    """Mean seconds and count per server-side stage, from the app's /metrics histograms"""
+    stages: Dict[str, dict] = {}
+    for line in requests.get(f"{base_url}/metrics", timeout=10).text.splitlines():
+        if not line.startswith("study_assistant_stage_seconds_"):
+            continue
+        name, value = line.rsplit(" ", 1)
+        kind = name[len("study_assistant_stage_seconds_"):name.index("{")]
+        if kind in ("sum", "count"):
+            stage = name.split('stage="', 1)[1].split('"', 1)[0]
+            stages.setdefault(stage, {})[kind] = float(value)
+    return {
+        stage: {"count": int(v.get("count", 0)), "mean_ms": round(v.get("sum", 0) / v["count"] * 1000, 2)}
+        for stage, v in stages.items() if v.get("count")
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Study Assistant backend against fake Ollama/Notion")
+    parser.add_argument("--captures", type=int, default=100, help="POST /capture requests (default: 100)")
+    parser.add_argument("--reads", type=int, default=300, help="Requests per read stage (default: 300)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients (default: 8)")
+    parser.add_argument("--ollama-latency", type=float, default=0.2, help="Seconds before the fake model answers")
+    parser.add_argument("--ollama-jitter", type=float, default=0.05, help="± random seconds added to that latency")
+    parser.add_argument("--ollama-token-delay", type=float, default=0.0, help="Seconds between streamed chunks")
+    parser.add_argument("--ollama-hosts", type=int, default=1, help="Fake Ollama hosts behind OLLAMA_BACKENDS (default: 1)")
+    parser.add_argument("--ollama-slow-host", type=float, default=0.0,
+                        help="Extra seconds of latency on the first fake host (exercises routing and hedging)")
+    parser.add_argument("--notion-latency", type=float, default=0.05, help="Seconds per fake Notion request")
+    parser.add_argument("--notion-rate", type=float, default=3.0, help="Fake Notion requests/second before 429s")
+    parser.add_argument("--notion-error-rate", type=float, default=0.0, help="Fraction of extra random 429s")
+    parser.add_argument("--no-sync", action="store_true", help="Run with SYNC_TO_NOTION=false")
+    parser.add_argument("--sync-timeout", type=float, default=120.0, help="Max seconds to wait for the outbox to drain")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="App setting for this run (repeatable), e.g. DB_POOL_SIZE=16")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for texts and request order")
+    parser.add_argument("--label", default="", help="Name stored with the results")
+    parser.add_argument("--output", default="benchmark-results.json", help="JSON file to write")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    rng = random.Random(args.seed)
+
+    ollamas = [
+        FakeOllama(args.ollama_latency + (args.ollama_slow_host if i == 0 else 0.0),
+                   args.ollama_jitter, args.ollama_token_delay)
+        for i in range(max(args.ollama_hosts, 1))
+    ]
+    notion = FakeNotion(args.notion_latency, args.notion_rate, args.notion_error_rate)
+    for ollama in ollamas:
+        ollama.start()
+    notion.start()
+
+    workdir = tempfile.mkdtemp(prefix="study-assistant-bench-")
+    overrides = dict(item.split("=", 1) for item in args.env)
+    os.environ.update({
+        "DB_PATH": os.path.join(workdir, "bench.db"),
+        "OLLAMA_BASE_URL": ollamas[0].url,
+        "OLLAMA_BACKENDS": ",".join(ollama.url for ollama in ollamas) if len(ollamas) > 1 else "",
+        "OLLAMA_WARMUP": "false",
+        "NOTION_API_URL": notion.url,
+        "NOTION_API_KEY": "benchmark",
+        "NOTION_DATABASE_ID": "benchmark-root",
+        "SYNC_TO_NOTION": "false" if args.no_sync else "true",
+        **overrides,
+    })
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server, thread = start_app(port)
+    recorder = Recorder()
+    phases = {}
+
+    try:
+        captures = [
+            ("capture", lambda s, text=random_text(rng), url=f"https://example.com/{rng.randrange(50)}": s.post(
+                f"{base_url}/capture", json={"text": text, "url": url, "pageTitle": ""}, timeout=120
+            ))
+            for _ in range(args.captures)
+        ]
+        phases["capture"] = run_phase(recorder, "capture", captures, args.concurrency)
+
+        notes = requests.get(f"{base_url}/notes", params={"limit": 500}, timeout=30).json().get("notes", [])
+        note_ids = [note["id"] for note in notes] or [1]
+        reads = (
+            [("notes", lambda s: s.get(f"{base_url}/notes", params={"limit": 50}, timeout=30))] * args.reads
+            + [("note", lambda s, i=rng.choice(note_ids): s.get(f"{base_url}/notes/{i}", timeout=30))
+               for _ in range(args.reads)]
+            + [("topics", lambda s: s.get(f"{base_url}/topics", timeout=30))] * args.reads
+        )
+        rng.shuffle(reads)
+        phases["read"] = run_phase(recorder, "read", reads, args.concurrency)
+
+        sync = wait_for_sync(base_url, args.sync_timeout) if not args.no_sync else None
+        app_stages = server_stages(base_url)
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+        for ollama in ollamas:
+            ollama.stop()
+        notion.stop()
+
+    results = {
+        "label": args.label,
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "label")},
+        "app_env": overrides,
+        "phases_seconds": {phase: round(seconds, 2) for phase, seconds in phases.items()},
+        "stages": recorder.summary(),
+        "server_stages": app_stages,
+        "notion_sync": sync,
+        "fake_ollama": {"calls": sum(ollama.calls for ollama in ollamas),
+                        "calls_per_host": [ollama.calls for ollama in ollamas]},
+        "fake_notion": notion.stats(),
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print(f"\n📊 {'Stage':<8} {'count':>6} {'err':>4} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for stage, s in results["stages"].items():
+        print(f"   {stage:<8} {s['count']:>6} {s['errors']:>4} {s['throughput_rps']:>8} "
+              f"{s['p50_ms']:>9} {s['p95_ms']:>9} {s['p99_ms']:>9}")
+    for stage, s in app_stages.items():
+        print(f"   ⏱️ server {stage:<14} {s['count']:>6} calls, mean {s['mean_ms']} ms")
+    if sync:
+        print(f"📤 Notion outbox drained in {sync['drain_seconds']}s "
+              f"({sync.get('done', 0)} done, {sync.get('failed', 0)} failed, {notion.throttled} 429s)")
+    if len(ollamas) > 1:
+        print(f"🖥️ Fake Ollama calls per host: {results['fake_ollama']['calls_per_host']}")
+    print(f"💾 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Classification cache for the Study Assistant backend.
+
+Re-highlighted passages skip the LLM: results are keyed by a hash of the
+normalised text, the model name and the current topic set. Lookups go to an
+in-memory LRU first, then to the `classification_cache` table in SQLite so
+the cache survives restarts.
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and collapse whitespace so trivially different highlights share a key"""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def topic_set_version(topic_names: Iterable[str]) -> str:
+    """Short, order-independent fingerprint of the topic list shown to the LLM"""
+    joined = "\n".join(sorted(topic_names))
+    return hashlib.sha1(joined.encode("utf-8")).hexdigest()[:12]
+
+
+def make_cache_key(text: str, model: str, topic_version: str) -> str:
+    """Cache key for one classification"""
+    payload = f"{model}\x00{topic_version}\x00{normalize_text(text)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ClassificationCache:
+    """
+    Two-tier (memory LRU + SQLite) cache of classification results.
+
+    `get_db` is the app's connection context manager; values are plain dicts
+    (the LLMResponse fields) stored as JSON.
+    """
+
+    def __init__(self, get_db: Callable, max_size: int = 1024, ttl_seconds: int = 0, enabled: bool = True):
+        self.get_db = get_db
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds  # 0 = entries never expire
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, created_at)
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl_seconds > 0 and time.time() - created_at > self.ttl_seconds
+
+    def _remember(self, key: str, value: dict, created_at: float):
+        with self._lock:
+            self._entries[key] = (value, created_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return a cached result or None"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and not self._expired(entry[1]):
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return entry[0]
+            if entry:
+                del self._entries[key]
+
+        with self.get_db() as conn:
+            row = conn.execute(
+                "SELECT result, created_at FROM classification_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+
+        if row and not self._expired(row[1]):
+            value = json.loads(row[0])
+            self._remember(key, value, row[1])
+            with self._lock:
+                self.db_hits += 1
+            return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: dict):
+        """Store a result in both tiers"""
+        if not self.enabled:
+            return
+        created_at = time.time()
+        self._remember(key, value, created_at)
+        with self.get_db() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO classification_cache (cache_key, result, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), created_at)
+            )
+            conn.commit()
+
+    def prune(self) -> int:
+        """Delete expired rows from the persistent tier; returns rows removed"""
+        if self.ttl_seconds <= 0:
+            return 0
+        with self.get_db() as conn:
+            cursor = conn.execute(
+                "DELETE FROM classification_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            )
+            conn.commit()
+            return cursor.rowcount
+
+    def stats(self) -> dict:
+        """Hit/miss counters for the health endpoint"""
+        with self._lock:
+            lookups = self.memory_hits + self.db_hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.db_hits) / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,278 @@
+"""
+Metrics and structured logging for the Study Assistant backend.
+
+Metrics live in one in-process registry: counters, histograms (seconds, with
+Prometheus' default buckets) and gauges read from a callback when scraped.
+`GET /metrics` renders them in the Prometheus text format.
+
+Log lines are key/value records tagged with the id of the request (or
+background job) that produced them. Records go through a queue and are
+written by a listener thread, so request threads never block on stdout.
+"""
+
+import atexit
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Id of the HTTP request or background job the current code runs for
+request_id: ContextVar[str] = ContextVar("request_id", default="-")
+
+
+@contextmanager
+def request_context(rid: str):
+    """Tag logs written inside the block with `rid`"""
+    token = request_id.set(rid)
+    try:
+        yield
+    finally:
+        request_id.reset(token)
+
+
+# ========== METRICS ==========
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def samples(self) -> Iterator[Tuple[str, Sequence[str], tuple, float]]:
+        """(sample name, label names, label values, value) for rendering"""
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, self.label_names, key, value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[tuple, list] = {}  # label values -> [per-bucket counts, sum, count]
+
+    def observe(self, seconds: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += seconds
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the block took (also when it raises)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+        bucket_names = self.label_names + ("le",)
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", bucket_names, key + (_format_value(bound),), cumulative
+            yield f"{self.name}_sum", self.label_names, key, total
+            yield f"{self.name}_count", self.label_names, key, count
+
+
+class Gauge(Metric):
+    """Read when scraped from a callback returning a number or {label values tuple: number}"""
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, read: Callable, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self.read = read
+
+    def samples(self):
+        value = self.read()
+        if isinstance(value, dict):
+            for key, item in value.items():
+                yield self.name, self.label_names, key if isinstance(key, tuple) else (key,), item
+        elif value is not None:
+            yield self.name, (), (), value
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: Metric) -> Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name: str, help: str, read: Callable, labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, read, labels))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines: List[str] = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            try:
+                samples = list(metric.samples())
+            except Exception as e:  # a failing gauge callback shouldn't break the scrape
+                lines.append(f"# {metric.name} unavailable: {_escape(e)}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, label_names, label_values, value in samples:
+                lines.append(f"{name}{_format_labels(label_names, label_values)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# ========== STRUCTURED LOGGING ==========
+
+class _RequestIdFilter(logging.Filter):
+    # Runs on the logging thread before the record is queued, so the context is still the caller's
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, request_id, msg and the record's fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+            **getattr(record, "fields", {}),
+        }
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Readable lines for the terminal: time, level, [request id], message, key=value fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = " ".join(f"{key}={value}" for key, value in getattr(record, "fields", {}).items())
+        line = (
+            f"{datetime.fromtimestamp(record.created).strftime('%H:%M:%S.%f')[:-3]} "
+            f"{record.levelname:<7} [{getattr(record, 'request_id', '-')}] {record.getMessage()}"
+        )
+        return f"{line} {fields}" if fields else line
+
+
+class StructuredLogger:
+    """Logger taking key/value fields: log.info("💾 Saved note", note_id=3)"""
+
+    def __init__(self, name: str):
+        self.logger = logging.getLogger(name)
+
+    def _log(self, level: int, msg: str, fields: dict):
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, msg, extra={"fields": fields})
+
+    def debug(self, msg: str, **fields):
+        self._log(logging.DEBUG, msg, fields)
+
+    def info(self, msg: str, **fields):
+        self._log(logging.INFO, msg, fields)
+
+    def warning(self, msg: str, **fields):
+        self._log(logging.WARNING, msg, fields)
+
+    def error(self, msg: str, **fields):
+        self._log(logging.ERROR, msg, fields)
+
+    def exception(self, msg: str, **fields):
+        """Error with the current exception's traceback as the `exc` field"""
+        import traceback
+        self._log(logging.ERROR, msg, {**fields, "exc": traceback.format_exc()})
+
+
+def setup_logging(name: str, level: str = "INFO", fmt: str = "text") -> Optional[QueueListener]:
+    """
+    Send `name` logs through a queue to stdout in `fmt` ("text" or "json").
+    Returns the started listener (None if already set up); it's flushed at exit.
+    """
+    logger = logging.getLogger(name)
+    if any(isinstance(handler, QueueHandler) for handler in logger.handlers):
+        return None
+    records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    handler = QueueHandler(records)
+    handler.addFilter(_RequestIdFilter())
+    logger.addHandler(handler)
+    logger.setLevel(level.upper())
+    logger.propagate = False
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    listener = QueueListener(records, output)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,179 @@
+"""
+Deterministic keyword classifier for the Study Assistant backend.
+
+The subject/topic keyword table is compiled once into a single regular
+expression, so classifying a text is one pass over it no matter how many
+keywords the table has. Every subject is scored from the same pass, and the
+result carries a confidence so it can stand in for the LLM ("fast mode") or
+serve as the fallback when the LLM fails.
+"""
+
+import json
+import re
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional
+
+
+DEFAULT_SUBJECT = "General Studies"
+DEFAULT_TOPIC = "Study Notes"
+
+# Subjects in priority order (earlier wins ties). Each subject has keywords
+# that identify it, optional topics with their own keywords (which also count
+# toward the subject), and a default topic when no topic keyword matched.
+DEFAULT_KEYWORD_TABLE = [
+    {
+        "subject": "Environmental Science",
+        "keywords": ["water", "harvesting", "rainwater", "conservation", "sustainability", "climate",
+                     "environment", "ecosystem", "pollution", "renewable", "solar", "wind"],
+        "topics": {
+            "Water Conservation": ["water", "harvesting", "rainwater"],
+            "Climate Change": ["climate", "warming", "carbon"],
+            "Renewable Energy": ["solar", "wind", "renewable"],
+        },
+        "default_topic": "Sustainability",
+    },
+    {
+        "subject": "Engineering",
+        "keywords": ["engineering", "design", "structure", "construction", "circuit", "mechanical", "electrical"],
+        "topics": {},
+        "default_topic": "General Engineering",
+    },
+    {
+        "subject": "Computer Science",
+        "keywords": ["algorithm", "code", "programming", "software", "computer", "database", "javascript",
+                     "python", "api"],
+        "topics": {
+            "Web Development": ["web", "html", "css", "frontend", "backend"],
+            "Machine Learning": ["machine learning", "ai", "neural", "model"],
+        },
+        "default_topic": "Programming",
+    },
+    {
+        "subject": "Mathematics",
+        "keywords": ["math", "equation", "theorem", "calculate", "algebra", "calculus", "geometry"],
+        "topics": {},
+        "default_topic": "General Math",
+    },
+    {
+        "subject": "Physics",
+        "keywords": ["physics", "force", "energy", "quantum", "velocity", "momentum"],
+        "topics": {},
+        "default_topic": "General Physics",
+    },
+    {
+        "subject": "Chemistry",
+        "keywords": ["chemistry", "molecule", "reaction", "atom", "compound", "element"],
+        "topics": {},
+        "default_topic": "General Chemistry",
+    },
+    {
+        "subject": "Biology",
+        "keywords": ["biology", "cell", "dna", "organism", "genetics", "protein"],
+        "topics": {},
+        "default_topic": "General Biology",
+    },
+    {
+        "subject": "Agriculture",
+        "keywords": ["agriculture", "farming", "crop", "soil", "harvest", "livestock", "irrigation"],
+        "topics": {},
+        "default_topic": "Farming & Crops",
+    },
+    {
+        "subject": "Business",
+        "keywords": ["business", "marketing", "management", "finance", "entrepreneur", "startup"],
+        "topics": {},
+        "default_topic": "General Business",
+    },
+    {
+        "subject": "Medicine",
+        "keywords": ["medicine", "health", "disease", "treatment", "patient", "medical", "anatomy"],
+        "topics": {},
+        "default_topic": "General Medicine",
+    },
+]
+
+
+class KeywordMatch(NamedTuple):
+    subject: str
+    topic: str
+    confidence: float  # 0.0 (no evidence) to 1.0 (many hits, all for one subject)
+    keywords: List[str]  # matched keywords in order of first appearance
+
+
+def _normalize_keyword(keyword: str) -> str:
+    return " ".join(keyword.lower().split())
+
+
+class KeywordClassifier:
+    """
+    Scores all subjects from a single regex pass over the text.
+
+    Confidence is the winning subject's share of all subject hits, scaled
+    down until it has at least `saturation_hits` hits, so one stray word
+    never produces a confident answer.
+    """
+
+    def __init__(self, table: Optional[List[dict]] = None, saturation_hits: int = 3):
+        self.table = table or DEFAULT_KEYWORD_TABLE
+        self.saturation_hits = saturation_hits
+        self.subject_order = {entry["subject"]: i for i, entry in enumerate(self.table)}
+        self.default_topics = {entry["subject"]: entry.get("default_topic", DEFAULT_TOPIC) for entry in self.table}
+
+        # keyword -> subjects it supports, and keyword -> (subject, topic) pairs it supports
+        # (lists rather than sets so ties resolve the same way on every run)
+        self.keyword_subjects: Dict[str, list] = defaultdict(list)
+        self.keyword_topics: Dict[str, list] = defaultdict(list)
+        for entry in self.table:
+            subject = entry["subject"]
+            for keyword in entry.get("keywords", []):
+                self._add(self.keyword_subjects, keyword, subject)
+            for topic, keywords in entry.get("topics", {}).items():
+                for keyword in keywords:
+                    self._add(self.keyword_subjects, keyword, subject)
+                    self._add(self.keyword_topics, keyword, (subject, topic))
+
+        # Longest keywords first so "machine learning" wins over any shorter overlap;
+        # whole words only (plus plural s/es) so "ai" doesn't match inside "rain"
+        alternatives = sorted(self.keyword_subjects, key=len, reverse=True)
+        body = "|".join(r"\s+".join(re.escape(part) for part in keyword.split()) for keyword in alternatives)
+        self.pattern = re.compile(rf"\b({body})(?:e?s)?\b", re.IGNORECASE) if body else None
+
+    @staticmethod
+    def _add(mapping: Dict[str, list], keyword: str, value):
+        values = mapping[_normalize_keyword(keyword)]
+        if value not in values:
+            values.append(value)
+
+    @classmethod
+    def from_file(cls, path: str) -> "KeywordClassifier":
+        """Load a keyword table from a JSON file with the same shape as DEFAULT_KEYWORD_TABLE"""
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def classify(self, text: str) -> KeywordMatch:
+        """Best subject/topic for the text with a confidence score"""
+        subject_hits: Dict[str, int] = defaultdict(int)
+        topic_hits: Dict[tuple, int] = defaultdict(int)
+        matched: List[str] = []
+
+        if self.pattern:
+            for match in self.pattern.finditer(text):
+                keyword = _normalize_keyword(match.group(1))
+                if keyword not in matched:
+                    matched.append(keyword)
+                for subject in self.keyword_subjects.get(keyword, ()):
+                    subject_hits[subject] += 1
+                for pair in self.keyword_topics.get(keyword, ()):
+                    topic_hits[pair] += 1
+
+        if not subject_hits:
+            return KeywordMatch(DEFAULT_SUBJECT, DEFAULT_TOPIC, 0.0, matched)
+
+        subject = max(subject_hits, key=lambda s: (subject_hits[s], -self.subject_order[s]))
+        topics = {topic: hits for (s, topic), hits in topic_hits.items() if s == subject}
+        topic = max(topics, key=topics.get) if topics else self.default_topics[subject]
+
+        best = subject_hits[subject]
+        share = best / sum(subject_hits.values())
+        confidence = share * min(1.0, best / self.saturation_hits)
+        return KeywordMatch(subject, topic, round(confidence, 3), matched)
@@ -0,0 +1,193 @@
+"""
+Guarded gateway for LLM calls in the Study Assistant backend.
+
+Every classification goes through one LLMGateway (embeddings through a
+second one, so they never hold generation slots or trip its breaker), which
+- caps in-flight generations with a semaphore (what the Ollama host can serve),
+- enforces a per-call deadline covering both the wait for a slot and generation,
+- trips a circuit breaker after repeated failures/timeouts so callers go
+  straight to the keyword fallback, then half-opens to probe recovery,
+- records queue wait and generation time separately.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Optional
+
+from instrumentation import StructuredLogger
+
+log = StructuredLogger("study_assistant.llm_gateway")
+
+
+class LLMUnavailableError(Exception):
+    """Base class for calls the gateway refused or gave up on"""
+
+
+class CircuitOpenError(LLMUnavailableError):
+    """The circuit breaker is open; the LLM is not being called"""
+
+
+class LLMTimeoutError(LLMUnavailableError):
+    """The call missed its deadline (waiting for a slot or generating)"""
+
+
+class CircuitBreaker:
+    """
+    Closed → open after `failure_threshold` consecutive failures.
+    Open → half-open after `reset_timeout` seconds; one trial call is let through.
+    Half-open → closed on success, back to open on failure.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, name: str = "llm"):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may proceed right now"""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._trial_in_flight = False
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                    log.warning("🔌 LLM circuit breaker opened", gateway=self.name,
+                                failures=self.consecutive_failures, reset_seconds=self.reset_timeout)
+                self.state = "open"
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class LLMGateway:
+    """Runs LLM calls with a concurrency cap, deadline and circuit breaker"""
+
+    def __init__(self, max_concurrency: int = 2, timeout: float = 30.0,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0, name: str = "llm"):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout, name)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        # Timed-out calls keep running until Ollama answers and hold their slot
+        # meanwhile, so the executor never needs more threads than slots
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=name)
+        self._stats_lock = threading.Lock()
+        self.in_flight = 0
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.generations = 0
+        self.generation_total = 0.0
+        self.generation_max = 0.0
+
+    def _run(self, fn: Callable, args: tuple, kwargs: dict):
+        with self._stats_lock:
+            self.in_flight += 1
+        start = time.monotonic()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.monotonic() - start
+            with self._stats_lock:
+                self.in_flight -= 1
+                self.generations += 1
+                self.generation_total += elapsed
+                self.generation_max = max(self.generation_max, elapsed)
+            self._slots.release()
+
+    def call(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        Call fn(*args, **kwargs) under the gateway's limits.
+
+        Raises CircuitOpenError or LLMTimeoutError instead of blocking past the
+        deadline; exceptions from fn are re-raised after counting as failures.
+        """
+        deadline = timeout or self.timeout
+        with self._stats_lock:
+            self.calls += 1
+
+        if not self.breaker.allow():
+            with self._stats_lock:
+                self.rejected += 1
+            raise CircuitOpenError("LLM circuit breaker is open")
+
+        start = time.monotonic()
+        acquired = self._slots.acquire(timeout=deadline)
+        waited = time.monotonic() - start
+        with self._stats_lock:
+            self.queue_wait_total += waited
+            self.queue_wait_max = max(self.queue_wait_max, waited)
+        if not acquired:
+            self._record_failure(timed_out=True)
+            raise LLMTimeoutError(f"No LLM slot free within {deadline:.1f}s")
+
+        future = self._executor.submit(self._run, fn, args, kwargs)
+        try:
+            result = future.result(timeout=max(0.0, deadline - waited))
+        except FutureTimeoutError:
+            self._record_failure(timed_out=True)
+            raise LLMTimeoutError(f"LLM call exceeded {deadline:.1f}s deadline")
+        except Exception:
+            self._record_failure()
+            raise
+
+        with self._stats_lock:
+            self.successes += 1
+        self.breaker.record_success()
+        return result
+
+    def _record_failure(self, timed_out: bool = False):
+        with self._stats_lock:
+            self.failures += 1
+            if timed_out:
+                self.timeouts += 1
+        self.breaker.record_failure()
+
+    def stats(self) -> dict:
+        """Counters plus average/max queue wait and generation time in seconds"""
+        with self._stats_lock:
+            admitted = self.calls - self.rejected
+            return {
+                "max_concurrency": self.max_concurrency,
+                "timeout_seconds": self.timeout,
+                "circuit_state": self.breaker.state,
+                "circuit_opened": self.breaker.times_opened,
+                "in_flight": self.in_flight,
+                "calls": self.calls,
+                "successes": self.successes,
+                "failures": self.failures,
+                "timeouts": self.timeouts,
+                "rejected": self.rejected,
+                "queue_wait_avg": round(self.queue_wait_total / admitted, 4) if admitted else 0.0,
+                "queue_wait_max": round(self.queue_wait_max, 4),
+                "generation_avg": round(self.generation_total / self.generations, 4) if self.generations else 0.0,
+                "generation_max": round(self.generation_max, 4),
+            }
@@ -7,24 +7,66 @@ UPDATED: Now creates hierarchical categories in Notion:
 Database → Subject → Topic → Individual Notes
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, field_validator
+from typing import Callable, List, Optional
 import os
 from dotenv import load_dotenv
 import requests
 import json
-import sqlite3
+import hashlib
+import re
+import queue
+import threading
+import time
+import uuid
+import contextvars
 from datetime import datetime
-from contextlib import contextmanager
-from langchain_ollama import OllamaLLM
+from urllib.parse import urlsplit, urlunsplit
+from contextlib import contextmanager, asynccontextmanager, nullcontext
+from langchain_ollama import OllamaLLM, OllamaEmbeddings
 from langchain_core.prompts import ChatPromptTemplate
+from classification_cache import ClassificationCache, make_cache_key, normalize_text, topic_set_version
+from topic_index import TopicIndex
+from topic_registry import TopicRegistry
+from keyword_classifier import KeywordClassifier, KeywordMatch
+from llm_gateway import LLMGateway
+from ollama_pool import OllamaBackend, OllamaPool, parse_backends
+from notion_outbox import NotionOutbox, NotionRateLimitError, TokenBucket
+from db_pool import ConnectionPool
+from note_search import NoteSearch, index_note, unindex_note
+from note_keywords import KeywordIndex, set_note_keywords
+from migrations import migrate as migrate_schema, get_schema_version
+import text_codec
+from text_codec import decode_text, encode_text
+from instrumentation import MetricsRegistry, StructuredLogger, request_context, setup_logging
+from tenants import Tenant, TenantCache, TenantRegistry
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI(title="Study Assistant API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background workers and warm up the LLM on startup; stop workers on shutdown"""
+    if not MULTI_TENANT:
+        default_workspace()  # tenants' workspaces open on their first request instead
+    start_capture_workers()
+    ollama_pool.start()
+    if OLLAMA_WARMUP:
+        # Load the model on every host in the background so startup isn't blocked on Ollama
+        for backend in ollama_pool.backends:
+            threading.Thread(target=backend.client.warm_up, name="ollama-warmup", daemon=True).start()
+    yield
+    stop_capture_workers()
+    ollama_pool.stop()
+    close_workspaces()
+
+
+app = FastAPI(title="Study Assistant API", lifespan=lifespan)
 
 # CORS middleware to allow Chrome extension and all origins (for hackathon demo)
 app.add_middleware(
@@ -35,17 +77,186 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+# Reachable without an API token in multi-tenant mode
+PUBLIC_PATHS = {"/metrics", "/docs", "/redoc", "/openapi.json"}
+
+
+@app.middleware("http")
+async def tenant_routing(request: Request, call_next):
+    """With MULTI_TENANT on, pick the workspace owning the request's API token (401 without one)"""
+    if not MULTI_TENANT or request.method == "OPTIONS" or request.url.path in PUBLIC_PATHS:
+        return await call_next(request)
+    authorization = request.headers.get("Authorization", "")
+    token = request.headers.get("X-API-Token") or (
+        authorization[7:].strip() if authorization.lower().startswith("bearer ") else ""
+    )
+    tenant = await run_in_threadpool(tenant_registry.authenticate, token)
+    if tenant is None:
+        # The CORS middleware sits inside this one, so add its header here for the extension to read the 401
+        return JSONResponse(
+            status_code=401,
+            content={"detail": "Missing or invalid API token"},
+            headers={"WWW-Authenticate": "Bearer", "Access-Control-Allow-Origin": "*"}
+        )
+    workspace = await run_in_threadpool(workspace_for, tenant.id)
+    workspace.hold()
+    try:
+        with workspace.activate():
+            response = await call_next(request)
+    except BaseException:
+        workspace.release()
+        raise
+    # Streamed bodies (/export, /capture/stream) keep running after call_next returns;
+    # keep the workspace from being evicted until the last chunk is sent
+    response.body_iterator = release_after_body(response.body_iterator, workspace.release)
+    return response
+
+
+async def release_after_body(body, release: Callable[[], None]):
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        release()
+
+
+@app.middleware("http")
+async def request_metrics(request: Request, call_next):
+    """Tag the request's log lines with an id (X-Request-ID or a new one) and time it"""
+    rid = re.sub(r"[^\w.-]", "", request.headers.get("X-Request-ID", ""))[:64] or uuid.uuid4().hex[:12]
+    started = time.perf_counter()
+    status = 500
+    with request_context(rid):
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            response.headers["X-Request-ID"] = rid
+            return response
+        finally:
+            # Route templates, not raw paths, so note ids don't each become a label
+            route = request.scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            HTTP_SECONDS.observe(time.perf_counter() - started, method=request.method, route=path)
+            HTTP_REQUESTS.inc(method=request.method, route=path, status=status)
+
 # Configuration
 NOTION_API_KEY = os.getenv("NOTION_API_KEY")
 NOTION_DATABASE_ID = os.getenv("NOTION_DATABASE_ID")
+NOTION_API_URL = os.getenv("NOTION_API_URL", "https://api.notion.com/v1")  # Override to point at a test stand-in
+NOTION_RATE_LIMIT = float(os.getenv("NOTION_RATE_LIMIT", "3"))  # Requests per second (Notion allows ~3)
+NOTION_HTTP_TIMEOUT = float(os.getenv("NOTION_HTTP_TIMEOUT", "30"))
+NOTION_SYNC_WORKERS = int(os.getenv("NOTION_SYNC_WORKERS", "1"))
+NOTION_SYNC_BATCH = int(os.getenv("NOTION_SYNC_BATCH", "10"))  # Outbox rows claimed per worker pass
+NOTION_SYNC_MAX_ATTEMPTS = int(os.getenv("NOTION_SYNC_MAX_ATTEMPTS", "8"))
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama2")  # Default to llama2, can use mistral, codellama, etc.
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")  # Default Ollama URL
+OLLAMA_TEMPERATURE = float(os.getenv("OLLAMA_TEMPERATURE", "0.7"))
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")  # How long Ollama keeps the model loaded between calls
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "2048"))  # Context window; the prompt plus 1000 chars of text fits
+OLLAMA_NUM_PREDICT = int(os.getenv("OLLAMA_NUM_PREDICT", "128"))  # Cap on generated tokens; the JSON answer is short
+OLLAMA_WARMUP = os.getenv("OLLAMA_WARMUP", "true").lower() == "true"
+OLLAMA_JSON_MODE = os.getenv("OLLAMA_JSON_MODE", "true").lower() == "true"  # Constrain classification output to JSON
+OLLAMA_HTTP_TIMEOUT = float(os.getenv("OLLAMA_HTTP_TIMEOUT", "120"))  # Hard cap for any single Ollama HTTP request
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))  # Per-call deadline: waiting for a slot plus generation
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "2"))  # In-flight generations the Ollama host can serve
+OLLAMA_BACKENDS = os.getenv("OLLAMA_BACKENDS", "")  # "url|weight|concurrency,..." to spread calls over several hosts
+OLLAMA_HEDGE_AFTER = float(os.getenv("OLLAMA_HEDGE_AFTER", "0"))  # Seconds before a slow call is also sent to another host, 0 = off
+OLLAMA_BACKEND_FAILURES = int(os.getenv("OLLAMA_BACKEND_FAILURES", "3"))  # Consecutive failures before a host is skipped
+OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "10"))  # Seconds between host health checks, 0 = off
+OLLAMA_BACKEND_COOLDOWN = float(os.getenv("OLLAMA_BACKEND_COOLDOWN", "30"))  # Seconds before a skipped host gets a trial call
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))  # Consecutive failures before using the fallback only
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))  # Seconds before probing Ollama again
+EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "4"))  # In-flight topic-index embedding calls
 DB_PATH = os.getenv("DB_PATH", "study_assistant.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))  # Idle connections kept open for reuse
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))  # How long a writer waits for the lock
+DB_CACHE_SIZE_KIB = int(os.getenv("DB_CACHE_SIZE_KIB", "16384"))  # Page cache per connection
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))  # Bytes of the file read through mmap, 0 = off
+DB_STATEMENT_CACHE = int(os.getenv("DB_STATEMENT_CACHE", "256"))  # Prepared statements kept per connection
+TEXT_COMPRESSION = os.getenv("TEXT_COMPRESSION", "true").lower() == "true"  # zlib-compress large note bodies
+TEXT_COMPRESS_MIN_BYTES = int(os.getenv("TEXT_COMPRESS_MIN_BYTES", "1024"))  # Smaller bodies are stored as plain text
 SYNC_TO_NOTION = os.getenv("SYNC_TO_NOTION", "true").lower() == "true"
+CAPTURE_MODE = os.getenv("CAPTURE_MODE", "sync").lower()  # "sync" (classify inline) or "async" (queue for workers)
+CAPTURE_QUEUE_SIZE = int(os.getenv("CAPTURE_QUEUE_SIZE", "100"))
+CAPTURE_WORKERS = int(os.getenv("CAPTURE_WORKERS", "2"))
+CAPTURE_STREAM_SYNC_WAIT = float(os.getenv("CAPTURE_STREAM_SYNC_WAIT", "20"))  # Seconds /capture/stream waits for the Notion page
+CLASSIFICATION_CACHE_ENABLED = os.getenv("CLASSIFICATION_CACHE_ENABLED", "true").lower() == "true"
+CLASSIFICATION_CACHE_SIZE = int(os.getenv("CLASSIFICATION_CACHE_SIZE", "1024"))  # In-memory LRU entries
+CLASSIFICATION_CACHE_TTL = int(os.getenv("CLASSIFICATION_CACHE_TTL", str(7 * 24 * 3600)))  # Seconds, 0 = never expire
+CAPTURE_BATCH_SIZE = int(os.getenv("CAPTURE_BATCH_SIZE", "8"))  # Texts per LLM call in /capture/batch
+CAPTURE_BATCH_TEXT_CHARS = int(os.getenv("CAPTURE_BATCH_TEXT_CHARS", "400"))  # Per-text limit so a chunk fits in num_ctx
+CAPTURE_BATCH_MAX = int(os.getenv("CAPTURE_BATCH_MAX", "500"))  # Max captures accepted per request
+TOPIC_INDEX_ENABLED = os.getenv("TOPIC_INDEX_ENABLED", "true").lower() == "true"
+OLLAMA_EMBED_MODEL = os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")  # Embedding model for the topic index
+TOPIC_INDEX_TOP_K = int(os.getenv("TOPIC_INDEX_TOP_K", "8"))  # Nearest topics included in the prompt
+TOPIC_MATCH_THRESHOLD = float(os.getenv("TOPIC_MATCH_THRESHOLD", "0.85"))  # Cosine similarity that skips the LLM
+TOPIC_INDEX_RETRY = int(os.getenv("TOPIC_INDEX_RETRY", "60"))  # Seconds to wait after an embedding failure
+TOPIC_FUZZY_MATCH = os.getenv("TOPIC_FUZZY_MATCH", "true").lower() == "true"  # Map topic name variants onto existing topics
+TOPIC_FUZZY_THRESHOLD = float(os.getenv("TOPIC_FUZZY_THRESHOLD", "0.8"))  # Trigram similarity for a fuzzy match
+KEYWORD_TABLE_PATH = os.getenv("KEYWORD_TABLE_PATH", "")  # Optional JSON keyword table for the keyword classifier
+KEYWORD_FAST_MODE = os.getenv("KEYWORD_FAST_MODE", "false").lower() == "true"  # Skip the LLM on confident keyword matches
+KEYWORD_FAST_THRESHOLD = float(os.getenv("KEYWORD_FAST_THRESHOLD", "0.8"))
+SEARCH_MAX_LIMIT = int(os.getenv("SEARCH_MAX_LIMIT", "100"))  # Largest page /search returns
+SEARCH_BACKFILL_BATCH = int(os.getenv("SEARCH_BACKFILL_BATCH", "500"))  # Notes indexed per transaction on backfill
+NOTES_MAX_LIMIT = int(os.getenv("NOTES_MAX_LIMIT", "200"))  # Largest page /notes returns
+KEYWORDS_MAX_LIMIT = int(os.getenv("KEYWORDS_MAX_LIMIT", "200"))  # Largest page /keywords endpoints return
+DEDUP_SCOPE = os.getenv("DEDUP_SCOPE", "url").lower()  # "url" (same text, same page), "global" (same text anywhere) or "off"
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "500"))  # Notes read per query while streaming /export
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))  # Notes inserted per transaction by /import
+MULTI_TENANT = os.getenv("MULTI_TENANT", "false").lower() == "true"  # Per-user databases selected by API token
+TENANTS_DB_PATH = os.getenv("TENANTS_DB_PATH", "tenants.db")  # Registry of tenants and their token hashes
+TENANT_DATA_DIR = os.getenv("TENANT_DATA_DIR", "tenants")  # Where new tenants' database files are created
+TENANT_CACHE_SIZE = int(os.getenv("TENANT_CACHE_SIZE", "32"))  # Tenant workspaces kept open (pool, caches, outbox)
+TENANT_TOKEN_CACHE_TTL = float(os.getenv("TENANT_TOKEN_CACHE_TTL", "30"))  # Seconds a checked API token is trusted
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()  # "text" for terminals, "json" for log collectors
+PENDING_TOPIC = "Unclassified"  # Holds async captures until a worker classifies them
+PENDING_SUBJECT = "General Studies"
 
-print(f"notion api key: {NOTION_API_KEY}")
-print(f"notion database id: {NOTION_DATABASE_ID}")
-print(f"ollama model: {OLLAMA_MODEL}")
+setup_logging("study_assistant", LOG_LEVEL, LOG_FORMAT)
+log = StructuredLogger("study_assistant")
+log.info("⚙️ Configuration", ollama_model=OLLAMA_MODEL, notion_database_id=NOTION_DATABASE_ID,
+         notion_api_key_set=bool(NOTION_API_KEY))
+
+# ========== METRICS ==========
+
+metrics = MetricsRegistry()
+STAGE_SECONDS = metrics.histogram(
+    "study_assistant_stage_seconds", "Time spent in each step of a capture", ["stage"]
+)
+HTTP_REQUESTS = metrics.counter(
+    "study_assistant_http_requests_total", "HTTP requests by route and status", ["method", "route", "status"]
+)
+HTTP_SECONDS = metrics.histogram(
+    "study_assistant_http_request_seconds", "Time until the response starts, by route", ["method", "route"]
+)
+NOTION_SECONDS = metrics.histogram(
+    "study_assistant_notion_request_seconds", "Notion API calls by method and status", ["method", "status"]
+)
+CLASSIFICATIONS = metrics.counter(
+    "study_assistant_classifications_total",
+    "Classifications by where the answer came from (cache, llm, topic_index, keyword, fallback)", ["source"]
+)
+LLM_FALLBACKS = metrics.counter(
+    "study_assistant_llm_fallbacks_total", "LLM classifications that fell back to keywords, by error", ["reason"]
+)
+# Read when scraped; the objects behind them are created further down
+metrics.gauge("study_assistant_capture_queue_depth", "Async captures waiting for a worker",
+              lambda: capture_queue.qsize())
+metrics.gauge("study_assistant_db_connections", "Pooled SQLite connections by state (all open tenants)",
+              lambda: {state: sum(ws.db_pool.stats()[state] for ws in open_workspaces())
+                       for state in ("idle", "in_use")}, ["state"])
+metrics.gauge("study_assistant_llm_in_flight", "LLM generations running", lambda: llm_gateway.in_flight)
+metrics.gauge("study_assistant_llm_backend_in_flight", "LLM generations running on each Ollama host",
+              lambda: {b.url: b.in_flight for b in ollama_pool.backends}, ["backend"])
+metrics.gauge("study_assistant_llm_backend_healthy", "Whether each Ollama host is taking calls (1) or skipped (0)",
+              lambda: {b.url: int(b.healthy) for b in ollama_pool.backends}, ["backend"])
+metrics.gauge("study_assistant_notion_outbox", "Notion outbox rows by status (all open tenants)",
+              lambda: {status: sum(ws.notion_outbox.stats()[status] for ws in open_workspaces())
+                       for status in ("pending", "in_flight", "failed")}
+              if SYNC_TO_NOTION else {}, ["status"])
+metrics.gauge("study_assistant_tenants_open", "Tenant workspaces currently open", lambda: len(open_workspaces()))
 
 # Request/Response Models
 class CaptureRequest(BaseModel):
@@ -59,48 +270,116 @@ class LLMResponse(BaseModel):
     create_new: bool
     keywords: str  # comma-separated
 
+    @field_validator("subject", "topic")
+    @classmethod
+    def not_blank(cls, value: str) -> str:
+        value = value.strip()
+        if not value:
+            raise ValueError("must not be empty")
+        return value
+
+    @field_validator("keywords", mode="before")
+    @classmethod
+    def join_keywords(cls, value):
+        # Some models answer with a list despite the prompt
+        return ", ".join(str(v) for v in value) if isinstance(value, list) else value
+
 
 # ========== DATABASE FUNCTIONS ==========
 
 @contextmanager
 def get_db():
-    """Context manager for database connections"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    try:
+    """Context manager for database connections (borrowed from the current tenant's pool)"""
+    with current_workspace().db_pool.connection() as conn:
         yield conn
-    finally:
-        conn.close()
 
 
 def get_all_topics() -> List[dict]:
-    """Fetch all topics from database"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, name, subject FROM topics ORDER BY name")
-        return [{"id": row[0], "name": row[1], "subject": row[2]} for row in cursor.fetchall()]
+    """All topics sorted by name (served from the in-memory registry; don't mutate the list)"""
+    with STAGE_SECONDS.time(stage="topics_fetch"):
+        return current_workspace().topics.snapshot().topics
+
+
+def get_topic_names() -> List[str]:
+    """Topic names to offer the LLM (everything but the pending topic)"""
+    with STAGE_SECONDS.time(stage="topics_fetch"):
+        return current_workspace().topics.snapshot().names
 
 
 def get_or_create_topic(topic_name: str, subject: str) -> int:
     """Get topic ID or create if doesn't exist"""
+    with STAGE_SECONDS.time(stage="topic_upsert"):
+        topic_id, created = current_workspace().topics.get_or_create(topic_name, subject)
+    if not created:
+        return topic_id
+    log.info("➕ Created new topic", topic=topic_name, subject=subject, topic_id=topic_id)
+
+    if TOPIC_INDEX_ENABLED:
+        current_workspace().topic_index.add_topic(topic_id, topic_name, subject)
+    return topic_id
+
+
+class DuplicateNoteError(Exception):
+    """The capture matches a note that is already saved"""
+
+    def __init__(self, note_id: int):
+        super().__init__(f"Duplicate of note #{note_id}")
+        self.note_id = note_id
+
+
+def normalize_source_url(url: str) -> str:
+    """Drop the fragment, trailing slash and host case so links to the same page compare equal"""
+    parts = urlsplit((url or "").strip())
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip("/"), parts.query, ""))
+
+
+def content_hash(text: str, source_url: str) -> Optional[str]:
+    """
+    Dedup key for a capture under DEDUP_SCOPE (None when dedup is off),
+    prefixed with the scope so hashes from another scope can be found and redone
+    """
+    if DEDUP_SCOPE == "off":
+        return None
+    scope = normalize_source_url(source_url) if DEDUP_SCOPE == "url" else ""
+    return f"{DEDUP_SCOPE}:" + hashlib.sha256(f"{scope}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+def find_duplicate_note(text: str, source_url: str) -> Optional[int]:
+    """ID of an already saved note with the same content (and page, with DEDUP_SCOPE=url)"""
+    digest = content_hash(text, source_url)
+    if digest is None:
+        return None
     with get_db() as conn:
-        cursor = conn.cursor()
-        
-        # Try to find existing topic
-        cursor.execute("SELECT id FROM topics WHERE name = ?", (topic_name,))
-        result = cursor.fetchone()
-        
-        if result:
-            return result[0]
-        
-        # Create new topic
-        cursor.execute(
-            "INSERT INTO topics (name, subject) VALUES (?, ?)",
-            (topic_name, subject)
-        )
-        conn.commit()
-        print(f"➕ Created new topic: {topic_name} ({subject})")
-        return cursor.lastrowid
+        row = conn.execute("SELECT id FROM summaries WHERE content_hash = ?", (digest,)).fetchone()
+        return row[0] if row else None
+
+
+def insert_note(conn, title: str, topic_id: int, keywords: str, source_url: str, original_text: str,
+                created_at: Optional[str] = None) -> tuple:
+    """
+    Insert a note in the caller's transaction; returns (note_id, created).
+
+    If a note with the same content hash exists (e.g. a double-clicked
+    capture that raced past the duplicate check), nothing is inserted and the
+    existing note's id is returned with created=False.
+    """
+    digest = content_hash(original_text, source_url)
+    stored_text = encode_text(original_text, TEXT_COMPRESS_MIN_BYTES, TEXT_COMPRESSION)
+    # summary_text stays empty: we don't summarize, and one copy of the text is enough
+    cursor = conn.execute("""
+        INSERT INTO summaries (title, topic_id, original_text, summary_text, keywords, source_url, content_hash,
+                               created_at)
+        VALUES (?, ?, ?, '', ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+        ON CONFLICT(content_hash) DO NOTHING
+    """, (title, topic_id, stored_text, keywords, source_url, digest, created_at))
+    if cursor.rowcount == 0:
+        row = conn.execute("SELECT id FROM summaries WHERE content_hash = ?", (digest,)).fetchone()
+        return row[0], False
+    if isinstance(stored_text, bytes):
+        # The search triggers skip compressed bodies; index the plain text here
+        index_note(conn, cursor.lastrowid, title, original_text, keywords)
+    set_note_keywords(conn, cursor.lastrowid, keywords)
+    return cursor.lastrowid, True
 
 
 def save_note_to_db(
@@ -110,22 +389,78 @@ def save_note_to_db(
     source_url: str,
     original_text: str
 ) -> int:
-    """Save note to database"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        
-        # Insert into summaries table (summary_text = original_text since we're not summarizing)
-        cursor.execute("""
-            INSERT INTO summaries (title, topic_id, original_text, summary_text, keywords, source_url)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (title, topic_id, original_text, original_text, keywords, source_url))
-        
+    """Save note to database; raises DuplicateNoteError if the same content is already saved"""
+    with STAGE_SECONDS.time(stage="note_insert"), get_db() as conn:
+        note_id, created = insert_note(conn, title, topic_id, keywords, source_url, original_text)
+        if not created:
+            raise DuplicateNoteError(note_id)
+
         conn.commit()
-        note_id = cursor.lastrowid
-        print(f"💾 Saved note to database (ID: {note_id})")
+        log.info("💾 Saved note to database", note_id=note_id)
         return note_id
 
 
+def save_notes_to_db(notes: List[dict]) -> List[tuple]:
+    """
+    Save several notes in a single transaction; each dict has save_note_to_db's arguments.
+    Returns (note_id, created) per note, created=False for duplicates of saved notes.
+    """
+    with STAGE_SECONDS.time(stage="note_insert_batch"), get_db() as conn:
+        results = [
+            insert_note(conn, note["title"], note["topic_id"], note["keywords"], note["source_url"],
+                        note["original_text"])
+            for note in notes
+        ]
+
+        conn.commit()
+        log.info("💾 Saved notes to database", saved=sum(created for _, created in results), notes=len(notes))
+        return results
+
+
+def backfill_content_hashes(batch_size: int = 1000, pause: float = 0.01) -> int:
+    """
+    Hash notes saved before dedup existed (or while it was off) and rehash
+    notes hashed under another DEDUP_SCOPE, in short batches so captures keep
+    writing; returns how many got a new hash
+    """
+    if DEDUP_SCOPE == "off":
+        return 0
+    # Hashes of the current scope sort in [prefix, prefix_end); skip them through the index
+    prefix = f"{DEDUP_SCOPE}:"
+    prefix_end = f"{DEDUP_SCOPE};"
+    with get_db() as conn:
+        stale = conn.execute("""
+            SELECT 1 FROM summaries WHERE content_hash IS NULL OR content_hash < ? OR content_hash >= ? LIMIT 1
+        """, (prefix, prefix_end)).fetchone()
+    if stale is None:
+        return 0
+    hashed = 0
+    last_id = 0
+    while True:
+        with get_db() as conn:
+            rows = conn.execute("""
+                SELECT id, original_text, source_url, content_hash FROM summaries
+                WHERE id > ? AND (content_hash IS NULL OR content_hash < ? OR content_hash >= ?)
+                ORDER BY id LIMIT ?
+            """, (last_id, prefix, prefix_end, batch_size)).fetchall()
+            if not rows:
+                break
+            for row in rows:
+                digest = content_hash(decode_text(row["original_text"]), row["source_url"])
+                # OR IGNORE: older duplicates of the same content keep (or get) a NULL hash
+                if conn.execute("UPDATE OR IGNORE summaries SET content_hash = ? WHERE id = ?",
+                                (digest, row["id"])).rowcount:
+                    hashed += 1
+                elif row["content_hash"] is not None:
+                    conn.execute("UPDATE summaries SET content_hash = NULL WHERE id = ?", (row["id"],))
+            conn.commit()
+        last_id = rows[-1]["id"]
+        time.sleep(pause)
+    if hashed:
+        log.info("🔁 Hashed notes for duplicate detection", notes=hashed, scope=DEDUP_SCOPE)
+    return hashed
+
+
 def get_note_details(note_id: int) -> Optional[dict]:
     """Get full note details"""
     with get_db() as conn:
@@ -133,7 +468,8 @@ def get_note_details(note_id: int) -> Optional[dict]:
         
         # Get note with topic info
         cursor.execute("""
-            SELECT s.*, t.name as topic_name, t.subject
+            SELECT s.id, s.title, s.original_text, s.keywords, s.source_url, s.created_at,
+                   t.name as topic_name, t.subject
             FROM summaries s
             JOIN topics t ON s.topic_id = t.id
             WHERE s.id = ?
@@ -143,21 +479,363 @@ def get_note_details(note_id: int) -> Optional[dict]:
         if not note_row:
             return None
         
+        text = decode_text(note_row["original_text"])
         return {
             "id": note_row["id"],
             "title": note_row["title"],
             "topic": note_row["topic_name"],
             "subject": note_row["subject"],
-            "original_text": note_row["original_text"],
-            "summary_text": note_row["summary_text"],
+            "original_text": text,
+            "summary_text": text,  # kept for API compatibility; notes aren't summarized
             "keywords": note_row["keywords"],
             "source_url": note_row["source_url"],
             "created_at": note_row["created_at"]
         }
 
 
+def get_meta(key: str) -> Optional[str]:
+    with get_db() as conn:
+        row = conn.execute("SELECT value FROM app_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+
+def set_meta(key: str, value: Optional[str]):
+    """Store a value in app_meta (None deletes the key)"""
+    with get_db() as conn:
+        if value is None:
+            conn.execute("DELETE FROM app_meta WHERE key = ?", (key,))
+        else:
+            conn.execute("INSERT OR REPLACE INTO app_meta (key, value) VALUES (?, ?)", (key, value))
+        conn.commit()
+
+
+def clear_summary_copies(batch_size: int = 500, pause: float = 0.01) -> int:
+    """
+    Empty the second copy of the text older notes kept in summary_text, in
+    short batches so captures keep writing. Runs once per database (new notes
+    never fill it). Returns how many notes were cleared.
+    """
+    if get_meta("summary_copies_cleared"):
+        return 0
+    cleared = 0
+    last_id = 0
+    while True:
+        with get_db() as conn:
+            upper = conn.execute(
+                "SELECT MAX(id) FROM (SELECT id FROM summaries WHERE id > ? ORDER BY id LIMIT ?)",
+                (last_id, batch_size)
+            ).fetchone()[0]
+            if upper is None:
+                break
+            cursor = conn.execute(
+                "UPDATE summaries SET summary_text = '' WHERE id > ? AND id <= ? AND summary_text != ''",
+                (last_id, upper)
+            )
+            conn.commit()
+        cleared += cursor.rowcount
+        last_id = upper
+        time.sleep(pause)
+    set_meta("summary_copies_cleared", "1")
+    if cleared:
+        log.info("🧹 Cleared duplicate summary_text copies", notes=cleared)
+    return cleared
+
+
+def compress_note_texts(batch_size: int = 200, pause: float = 0.01) -> int:
+    """
+    Compress large note bodies stored before compression was enabled, in
+    short batches so captures keep writing. Skipped once a pass has finished
+    with the current (or a lower) TEXT_COMPRESS_MIN_BYTES, since new notes are
+    compressed on insert. Returns how many notes were compressed.
+    """
+    if not TEXT_COMPRESSION:
+        # Notes saved from now on stay plain text, so the next start with compression on runs again
+        set_meta("compressed_min_bytes", None)
+        return 0
+    done = get_meta("compressed_min_bytes")
+    if done is not None and int(done) <= TEXT_COMPRESS_MIN_BYTES:
+        return 0
+    compressed = 0
+    last_id = 0
+    while True:
+        with get_db() as conn:
+            rows = conn.execute("""
+                SELECT id, original_text FROM summaries
+                WHERE id > ? AND typeof(original_text) = 'text'
+                  AND length(CAST(original_text AS BLOB)) >= ?
+                ORDER BY id LIMIT ?
+            """, (last_id, TEXT_COMPRESS_MIN_BYTES, batch_size)).fetchall()
+            if not rows:
+                break
+            updates = []
+            for row in rows:
+                stored = encode_text(row["original_text"], TEXT_COMPRESS_MIN_BYTES)
+                if isinstance(stored, bytes):
+                    updates.append((stored, row["id"]))
+            conn.executemany("UPDATE summaries SET original_text = ? WHERE id = ?", updates)
+            conn.commit()
+        compressed += len(updates)
+        last_id = rows[-1]["id"]
+        time.sleep(pause)
+    set_meta("compressed_min_bytes", str(TEXT_COMPRESS_MIN_BYTES))
+    if compressed:
+        log.info("🗜️ Compressed large notes", notes=compressed)
+    return compressed
+
+
+def backfill_note_data():
+    """
+    Fill note_keywords and content hashes for notes saved before they existed.
+    Runs in the background: until it finishes, /keywords may miss older notes
+    and a capture of an older note's text may not be detected as a duplicate.
+    """
+    keyword_index.migrate()
+    backfill_content_hashes()
+
+
+def compact_note_storage():
+    """
+    Background shrink of note storage: drop old summary_text copies, compress
+    large bodies, then hand freed pages back to the filesystem. Databases
+    created before incremental auto-vacuum keep the pages for reuse instead.
+    """
+    if clear_summary_copies() + compress_note_texts():
+        with get_db() as conn:
+            conn.execute("PRAGMA incremental_vacuum")
+
+
+def init_db():
+    """Bring the schema up to date (data backfills run afterwards, see backfill_note_data)"""
+    with get_db() as conn:
+        applied = migrate_schema(conn)
+    if applied:
+        log.info("🗄️ Database schema migrated", version=applied[-1])
+    pruned = current_workspace().classification_cache.prune()
+    if pruned:
+        log.info("🧹 Pruned expired classification cache entries", entries=pruned)
+
+
+def save_pending_note(text: str, source_url: str, page_title: str) -> int:
+    """
+    Store raw text under the pending topic and record a queued capture job.
+    Raises DuplicateNoteError if the same content is already saved.
+    """
+    topic_id = get_or_create_topic(PENDING_TOPIC, PENDING_SUBJECT)
+    with STAGE_SECONDS.time(stage="note_insert"), get_db() as conn:
+        cursor = conn.cursor()
+        note_id, created = insert_note(conn, page_title or PENDING_TOPIC, topic_id, "", source_url, text)
+        if not created:
+            raise DuplicateNoteError(note_id)
+        cursor.execute(
+            "INSERT INTO capture_jobs (note_id, status, page_title) VALUES (?, 'queued', ?)",
+            (note_id, page_title)
+        )
+        conn.commit()
+        log.info("💾 Saved pending note to database", note_id=note_id)
+        return note_id
+
+
+def delete_pending_note(note_id: int):
+    """Remove a pending note and its capture job"""
+    with get_db() as conn:
+        row = conn.execute("SELECT title, original_text, keywords FROM summaries WHERE id = ?", (note_id,)).fetchone()
+        if row is not None and isinstance(row["original_text"], bytes):
+            unindex_note(conn, note_id, row["title"], decode_text(row["original_text"]), row["keywords"])
+        conn.execute("DELETE FROM capture_jobs WHERE note_id = ?", (note_id,))
+        conn.execute("DELETE FROM summaries WHERE id = ?", (note_id,))
+        conn.commit()
+
+
+def update_note_classification(note_id: int, topic_id: int, title: str, keywords: str):
+    """Attach classification results to a note that was stored before classification"""
+    with get_db() as conn:
+        row = conn.execute("SELECT title, original_text, keywords FROM summaries WHERE id = ?", (note_id,)).fetchone()
+        conn.execute(
+            "UPDATE summaries SET topic_id = ?, title = ?, keywords = ? WHERE id = ?",
+            (topic_id, title, keywords, note_id)
+        )
+        if row is not None and isinstance(row["original_text"], bytes):
+            # The search triggers skip compressed bodies; re-index with the new title and keywords here
+            text = decode_text(row["original_text"])
+            if unindex_note(conn, note_id, row["title"], text, row["keywords"]):
+                index_note(conn, note_id, title, text, keywords)
+        set_note_keywords(conn, note_id, keywords)
+        conn.commit()
+
+
+def get_capture_job(note_id: int) -> Optional[dict]:
+    """Get background capture job state for a note"""
+    with get_db() as conn:
+        row = conn.execute(
+            "SELECT note_id, status, page_title, error, notion_url, updated_at FROM capture_jobs WHERE note_id = ?",
+            (note_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+
+def update_capture_job(note_id: int, status: str, error: Optional[str] = None, notion_url: Optional[str] = None):
+    """Move a capture job to a new status"""
+    with get_db() as conn:
+        conn.execute("""
+            UPDATE capture_jobs
+            SET status = ?, error = ?, notion_url = COALESCE(?, notion_url), updated_at = CURRENT_TIMESTAMP
+            WHERE note_id = ?
+        """, (status, error, notion_url, note_id))
+        conn.commit()
+
+
+def get_unfinished_capture_jobs() -> List[int]:
+    """Note IDs of jobs interrupted by a restart before classification finished"""
+    # Jobs in 'syncing' are already in the durable Notion outbox, which resumes them itself
+    with get_db() as conn:
+        rows = conn.execute(
+            "SELECT note_id FROM capture_jobs WHERE status IN ('queued', 'classifying') ORDER BY note_id"
+        ).fetchall()
+        return [row[0] for row in rows]
+
+
+keyword_classifier = KeywordClassifier.from_file(KEYWORD_TABLE_PATH) if KEYWORD_TABLE_PATH else KeywordClassifier()
+
+# Classification cache, topic index and search index are per tenant (see Workspace); these are shared
+def embed_documents(texts: List[str]) -> List[List[float]]:
+    """
+    Embed through the embeddings gateway and the Ollama pool, so a hung host costs at most
+    LLM_TIMEOUT and fails over like classification, without taking generation slots; the
+    topic index treats an error as unavailable and captures use the full topic list
+    """
+    return embed_gateway.call(ollama_pool.call, lambda client: client.embed_documents(texts), embed=True)
+
+keyword_index = KeywordIndex(get_db)
+
+
 # ========== NOTION SYNC FUNCTIONS (UPDATED FOR HIERARCHICAL ORGANIZATION) ==========
 
+def notion_configured() -> bool:
+    """Whether the current tenant has Notion credentials"""
+    workspace = current_workspace()
+    return bool(workspace.notion_api_key and workspace.notion_database_id)
+
+
+def notion_headers() -> dict:
+    return {
+        "Authorization": f"Bearer {current_workspace().notion_api_key}",
+        "Content-Type": "application/json",
+        "Notion-Version": "2022-06-28",
+    }
+
+
+# One keep-alive session shared by every Notion call; each tenant's integration has its own rate limiter
+notion_session = requests.Session()
+
+
+def notion_request(method: str, url: str, **kwargs) -> requests.Response:
+    """Rate-limited Notion API call; raises NotionRateLimitError on 429"""
+    current_workspace().notion_rate_limiter.acquire()
+    kwargs.setdefault("timeout", NOTION_HTTP_TIMEOUT)
+    started = time.perf_counter()
+    try:
+        response = notion_session.request(method, url, **kwargs)
+    except requests.RequestException:
+        NOTION_SECONDS.observe(time.perf_counter() - started, method=method, status="error")
+        raise
+    NOTION_SECONDS.observe(time.perf_counter() - started, method=method, status=response.status_code)
+    log.debug("🌐 Notion request", method=method, url=url, status=response.status_code,
+              ms=round((time.perf_counter() - started) * 1000, 1))
+    if response.status_code == 429:
+        raise NotionRateLimitError(float(response.headers.get("Retry-After", "1")))
+    return response
+
+
+def same_notion_id(a: str, b: str) -> bool:
+    """Notion IDs may be written with or without dashes"""
+    return (a or "").replace("-", "") == (b or "").replace("-", "")
+
+
+def get_cached_notion_page(parent_id: str, title: str) -> Optional[str]:
+    """Look up a category page id in memory, then in SQLite"""
+    notion_page_ids = current_workspace().notion_page_ids
+    key = (parent_id, title)
+    if key in notion_page_ids:
+        return notion_page_ids[key]
+
+    with get_db() as conn:
+        row = conn.execute(
+            "SELECT page_id FROM notion_pages WHERE parent_id = ? AND title = ?", (parent_id, title)
+        ).fetchone()
+    if row:
+        notion_page_ids[key] = row[0]
+        return row[0]
+    return None
+
+
+def cache_notion_pages(pages: List[tuple]):
+    """Remember (parent_id, title, page_id) entries; the first page seen for a title wins"""
+    with get_db() as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO notion_pages (parent_id, title, page_id) VALUES (?, ?, ?)", pages
+        )
+        conn.commit()
+    notion_page_ids = current_workspace().notion_page_ids
+    for parent_id, title, page_id in pages:
+        notion_page_ids.setdefault((parent_id, title), page_id)
+
+
+def invalidate_notion_page(parent_id: str, title: str):
+    """Forget a cached page id (e.g. the page was deleted in Notion)"""
+    current_workspace().notion_page_ids.pop((parent_id, title), None)
+    with get_db() as conn:
+        conn.execute("DELETE FROM notion_pages WHERE parent_id = ? AND title = ?", (parent_id, title))
+        conn.commit()
+
+
+def list_notion_child_pages(block_id: str) -> List[tuple]:
+    """(page_id, title) of every child page under a Notion page, following pagination"""
+    pages = []
+    cursor = None
+    while True:
+        params = {"page_size": 100}
+        if cursor:
+            params["start_cursor"] = cursor
+        response = notion_request(
+            "GET", f"{NOTION_API_URL}/blocks/{block_id}/children", params=params, headers=notion_headers()
+        )
+        response.raise_for_status()
+        body = response.json()
+        for block in body.get("results", []):
+            if block.get("type") == "child_page":
+                pages.append((block["id"], block["child_page"]["title"]))
+        if not body.get("has_more"):
+            return pages
+        cursor = body.get("next_cursor")
+
+
+def backfill_notion_page_cache():
+    """
+    One-time crawl of Database → Subject → Topic pages into the page-id cache,
+    so syncing a note under an existing category needs no search calls.
+    """
+    database_id = current_workspace().notion_database_id
+    if not notion_configured():
+        return
+    try:
+        log.info("📁 Crawling Notion category pages into the page cache...")
+        subjects = list_notion_child_pages(database_id)
+        entries = [(database_id, title, page_id) for page_id, title in subjects]
+        for subject_page_id, _ in subjects:
+            entries += [(subject_page_id, title, page_id) for page_id, title in list_notion_child_pages(subject_page_id)]
+        cache_notion_pages(entries)
+        log.info("📁 Cached Notion category pages", pages=len(entries))
+    except Exception as e:
+        log.warning("⚠️ Notion page cache backfill failed", error=str(e))
+
+
+def notion_page_cache_is_empty() -> bool:
+    with get_db() as conn:
+        return conn.execute(
+            "SELECT 1 FROM notion_pages WHERE parent_id = ? LIMIT 1", (current_workspace().notion_database_id,)
+        ).fetchone() is None
+
+
 def find_or_create_category_page(parent_id: str, title: str, is_database: bool = True) -> str:
     """
     Find or create a category page (Subject or Topic).
@@ -166,22 +844,36 @@ def find_or_create_category_page(parent_id: str, title: str, is_database: bool =
     This creates the hierarchical structure:
     - Subject pages are created in the database
     - Topic pages are created inside Subject pages
+
+    Page ids are cached per (parent, title), so Notion is only searched the
+    first time a category is seen.
     """
-    headers = {
-        "Authorization": f"Bearer {NOTION_API_KEY}",
-        "Content-Type": "application/json",
-        "Notion-Version": "2022-06-28",
-    }
-    
+    page_id = get_cached_notion_page(parent_id, title)
+    if page_id:
+        return page_id
+
+    with current_workspace().notion_category_lock:
+        # Another thread may have created it while we waited
+        page_id = get_cached_notion_page(parent_id, title)
+        if not page_id:
+            page_id = search_or_create_category_page(parent_id, title)
+            cache_notion_pages([(parent_id, title, page_id)])
+        return page_id
+
+
+def search_or_create_category_page(parent_id: str, title: str) -> str:
+    """Search Notion for a category page under parent_id, creating it if missing"""
+    headers = notion_headers()
+
     # Search for existing page with this title
-    search_url = "https://api.notion.com/v1/search"
+    search_url = f"{NOTION_API_URL}/search"
     search_payload = {
         "query": title,
         "filter": {"property": "object", "value": "page"}
     }
     
     try:
-        response = requests.post(search_url, json=search_payload, headers=headers)
+        response = notion_request("POST", search_url, json=search_payload, headers=headers)
         response.raise_for_status()
         results = response.json().get("results", [])
         
@@ -198,13 +890,14 @@ def find_or_create_category_page(parent_id: str, title: str, is_database: bool =
                 if result["title"]:
                     page_title = result["title"][0]["plain_text"]
             
-            if page_title == title:
-                print(f"📁 Found existing category: {title}")
+            parent = result.get("parent", {})
+            if page_title == title and same_notion_id(parent.get("page_id", ""), parent_id):
+                log.info("📁 Found existing category", title=title)
                 return result["id"]
         
         # Create new category page if not found
-        print(f"📁 Creating new category: {title}")
-        create_url = "https://api.notion.com/v1/pages"
+        log.info("📁 Creating new category", title=title)
+        create_url = f"{NOTION_API_URL}/pages"
         
         parent_payload = {"page_id": parent_id}
         
@@ -218,13 +911,13 @@ def find_or_create_category_page(parent_id: str, title: str, is_database: bool =
             }
         }
         
-        response = requests.post(create_url, json=create_payload, headers=headers)
+        response = notion_request("POST", create_url, json=create_payload, headers=headers)
         response.raise_for_status()
         page = response.json()
         return page["id"]
         
     except Exception as e:
-        print(f"Error finding/creating category: {e}")
+        log.error("❌ Finding/creating category failed", title=title, error=str(e))
         raise
 
 
@@ -246,27 +939,24 @@ def insert_note_to_notion(
           └─ 💡 Machine Learning (Topic page)
              └─ 📝 Your note here (Note page)
     """
-    if not NOTION_API_KEY or not NOTION_DATABASE_ID:
-        print("⚠️ Notion credentials not set, returning mock response")
+    if not notion_configured():
+        log.warning("⚠️ Notion credentials not set, returning mock response")
         return {"id": "mock-page-id", "url": "https://notion.so/mock-page"}
     
-    headers = {
-        "Authorization": f"Bearer {NOTION_API_KEY}",
-        "Content-Type": "application/json",
-        "Notion-Version": "2022-06-28",
-    }
+    database_id = current_workspace().notion_database_id
+    headers = notion_headers()
     
     try:
         # Step 1: Find or create Subject page (e.g., "Computer Science")
-        print(f"📚 Finding/creating Subject: {subject}")
+        log.debug("📚 Finding/creating Subject", subject=subject)
         subject_page_id = find_or_create_category_page(
-            parent_id=NOTION_DATABASE_ID,
+            parent_id=database_id,
             title=subject,
             is_database=True
         )
         
         # Step 2: Find or create Topic page under Subject (e.g., "Machine Learning")
-        print(f"💡 Finding/creating Topic: {topic} under {subject}")
+        log.debug("💡 Finding/creating Topic", topic=topic, subject=subject)
         topic_page_id = find_or_create_category_page(
             parent_id=subject_page_id,
             title=topic,
@@ -274,7 +964,7 @@ def insert_note_to_notion(
         )
         
         # Step 3: Create the actual note as a sub-page under Topic
-        print(f"📝 Creating note: {title}")
+        log.debug("📝 Creating note page", title=title)
         
         # Format summary as bullet points - filter out empty strings
         summary_blocks = [
@@ -318,7 +1008,7 @@ def insert_note_to_notion(
                 })
         
         # Create the note page
-        url = "https://api.notion.com/v1/pages"
+        url = f"{NOTION_API_URL}/pages"
         payload = {
             "parent": {"page_id": topic_page_id},
             "properties": {
@@ -327,11 +1017,20 @@ def insert_note_to_notion(
             "children": summary_blocks + additional_blocks
         }
         
-        response = requests.post(url, json=payload, headers=headers)
+        response = notion_request("POST", url, json=payload, headers=headers)
+        if response.status_code == 404 or (response.status_code == 400 and "archived" in response.text):
+            # A cached Subject/Topic page was deleted or archived in Notion; look both up again once
+            log.info("📁 Cached category page is gone, refreshing Notion page cache")
+            invalidate_notion_page(database_id, subject)
+            invalidate_notion_page(subject_page_id, topic)
+            subject_page_id = find_or_create_category_page(database_id, subject, is_database=True)
+            topic_page_id = find_or_create_category_page(subject_page_id, topic, is_database=False)
+            payload["parent"] = {"page_id": topic_page_id}
+            response = notion_request("POST", url, json=payload, headers=headers)
         response.raise_for_status()
         page = response.json()
         
-        print(f"✅ Created note hierarchy: {subject} → {topic} → {title}")
+        log.info("✅ Created note page", subject=subject, topic=topic, title=title)
         
         return {
             "id": page["id"],
@@ -339,241 +1038,1020 @@ def insert_note_to_notion(
         }
         
     except requests.exceptions.HTTPError as e:
-        print(f"❌ Notion API Error: {e}")
-        print(f"Response: {e.response.text}")
-        raise HTTPException(status_code=500, detail=f"Failed to save to Notion: {e.response.text}")
+        log.error("❌ Notion API error", error=str(e), response=e.response.text[:500])
+        raise
     except Exception as e:
-        print(f"Error inserting to Notion: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to save to Notion: {str(e)}")
+        log.error("❌ Notion insert failed", error=str(e))
+        raise
 
 
 def sync_note_to_notion(note_id: int) -> dict:
     """
     Sync a note to Notion for viewing/organization.
     This is optional - data is already saved in SQLite.
+
+    Called by the Notion outbox workers; errors are raised so the outbox
+    can retry with backoff.
     """
-    if not NOTION_API_KEY or not NOTION_DATABASE_ID:
-        print("⚠️ Notion sync disabled or credentials not set")
+    if not notion_configured():
+        log.warning("⚠️ Notion sync disabled or credentials not set")
         return {"id": "notion-disabled", "url": ""}
-    
+    with request_context(f"notion-{note_id}"), STAGE_SECONDS.time(stage="notion_sync"):
+        return _sync_note_to_notion(note_id)
+
+
+def _sync_note_to_notion(note_id: int) -> dict:
     # Get note data from database
     note_data = get_note_details(note_id)
     if not note_data:
         return {"id": "note-not-found", "url": ""}
     
-    try:
-        # Split original text into paragraphs for Notion blocks (or use as single item)
-        original_text = note_data["original_text"]
-        # Split by newlines and filter empty lines, or use as single block
-        text_paragraphs = [p.strip() for p in original_text.split('\n') if p.strip()]
-        if not text_paragraphs:
-            text_paragraphs = [original_text]
-        
-        # Convert comma-separated keywords string to list
-        keywords_list = [kw.strip() for kw in note_data["keywords"].split(',')] if note_data["keywords"] else []
-        
-        # Sync to Notion
-        page = insert_note_to_notion(
-            title=note_data["title"],
-            summary=text_paragraphs,  # Using original text in summary blocks
-            subject=note_data["subject"],
-            topic=note_data["topic"],
-            keywords=keywords_list,
-            source_url=note_data["source_url"]
-        )
-        
-        print(f"✅ Synced to Notion: {page['url']}")
-        return {
-            "id": page["id"],
-            "url": page["url"]
-        }
-    except Exception as e:
-        print(f"⚠️ Error syncing to Notion (data still saved locally): {e}")
-        # Don't raise - data is already saved in SQLite
-        return {"id": "notion-error", "url": ""}
+    # Split original text into paragraphs for Notion blocks (or use as single item)
+    original_text = note_data["original_text"]
+    # Split by newlines and filter empty lines, or use as single block
+    text_paragraphs = [p.strip() for p in original_text.split('\n') if p.strip()]
+    if not text_paragraphs:
+        text_paragraphs = [original_text]
+    
+    # Convert comma-separated keywords string to list
+    keywords_list = [kw.strip() for kw in note_data["keywords"].split(',')] if note_data["keywords"] else []
+    
+    # Sync to Notion
+    page = insert_note_to_notion(
+        title=note_data["title"],
+        summary=text_paragraphs,  # Using original text in summary blocks
+        subject=note_data["subject"],
+        topic=note_data["topic"],
+        keywords=keywords_list,
+        source_url=note_data["source_url"]
+    )
+    
+    log.info("✅ Synced to Notion", note_id=note_id, url=page["url"])
+    return {
+        "id": page["id"],
+        "url": page["url"]
+    }
 
 
-# ========== LLM FUNCTIONS ==========
+def on_notion_sync_finished(note_id: int, status: str, notion_url: str, error: Optional[str]):
+    """Finish the async capture job (if any) waiting on this note's Notion sync"""
+    with get_db() as conn:
+        conn.execute("""
+            UPDATE capture_jobs
+            SET status = 'done', notion_url = ?, error = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE note_id = ? AND status = 'syncing'
+        """, (notion_url, f"Notion sync failed: {error}" if error else None, note_id))
+        conn.commit()
 
-def call_llm_for_classification(text: str, existing_topics: List[str]) -> LLMResponse:
+
+# ========== TENANT WORKSPACES ==========
+
+class Workspace:
     """
-    Call Ollama LLM via LangChain to classify the highlighted text.
-    
-    Uses local open-source models like llama2, mistral, or codellama.
-    Returns subject, topic, and keywords (no summarization - text stored as-is).
+    One tenant's database pool, caches, Notion credentials and outbox.
+
+    Code reaches the workspace of the request (or job) it runs for through
+    current_workspace(); with MULTI_TENANT off there is a single default
+    workspace built from DB_PATH and the NOTION_* settings.
     """
-    
-    try:
-        # Initialize Ollama LLM with LangChain
-        print(f"🤖 Using Ollama model: {OLLAMA_MODEL}")
-        llm = OllamaLLM(
-            model=OLLAMA_MODEL,
-            base_url=OLLAMA_BASE_URL,
-            temperature=0.7
+
+    def __init__(self, tenant: Tenant):
+        self.tenant = tenant
+        self.notion_api_key = tenant.notion_api_key
+        self.notion_database_id = tenant.notion_database_id
+        self.db_pool = ConnectionPool(
+            tenant.db_path,
+            size=DB_POOL_SIZE,
+            busy_timeout_ms=DB_BUSY_TIMEOUT_MS,
+            cache_size_kib=DB_CACHE_SIZE_KIB,
+            mmap_size=DB_MMAP_SIZE,
+            statement_cache=DB_STATEMENT_CACHE,
+            on_connect=text_codec.register
         )
-        
-        # Create prompt template
-        prompt_template = ChatPromptTemplate.from_messages([
-            ("system", "You are an expert study assistant that classifies academic content. You MUST respond with ONLY valid JSON - no other text, explanations, or markdown."),
-            ("user", """Your task is to analyze the given text and determine its academic classification.
+        self.classification_cache = ClassificationCache(
+            self.get_db,
+            max_size=CLASSIFICATION_CACHE_SIZE,
+            ttl_seconds=CLASSIFICATION_CACHE_TTL,
+            enabled=CLASSIFICATION_CACHE_ENABLED
+        )
+        self.topic_index = TopicIndex(
+            self.get_db,
+            embed_documents,
+            model=OLLAMA_EMBED_MODEL,
+            retry_seconds=TOPIC_INDEX_RETRY,
+            exclude=[PENDING_TOPIC]
+        )
+        self.note_search = NoteSearch(self.get_db, backfill_batch=SEARCH_BACKFILL_BATCH)
+        self.topics = TopicRegistry(
+            self.get_db,
+            exclude=[PENDING_TOPIC],
+            fuzzy_threshold=TOPIC_FUZZY_THRESHOLD if TOPIC_FUZZY_MATCH else None
+        )
+        # (parent_id, title) -> Notion page id for Subject/Topic pages, fronting the notion_pages table
+        self.notion_page_ids: dict = {}
+        # Serialises cache misses so two captures can't both create the same category page
+        self.notion_category_lock = threading.Lock()
+        # Notion rate-limits per integration, so each tenant's credentials get their own budget
+        self.notion_rate_limiter = TokenBucket(NOTION_RATE_LIMIT)
+        self.notion_outbox = NotionOutbox(
+            self.get_db,
+            self.bind(sync_note_to_notion),
+            on_finished=self.bind(on_notion_sync_finished),
+            workers=NOTION_SYNC_WORKERS,
+            batch_size=NOTION_SYNC_BATCH,
+            max_attempts=NOTION_SYNC_MAX_ATTEMPTS
+        )
+        self.active = 0  # requests and jobs running against this workspace
+        self._active_lock = threading.Lock()
 
-STEP 1 - Identify the Subject:
-Read the text carefully and determine which academic field it belongs to. Common subjects include:
-- Environmental Science (sustainability, climate, water, pollution, ecosystems)
-- Engineering (civil, mechanical, electrical, chemical, environmental)
-- Computer Science (programming, algorithms, AI, data structures, software)
-- Mathematics (algebra, calculus, statistics, geometry)
-- Physics (mechanics, thermodynamics, electromagnetism, quantum)
-- Chemistry (organic, inorganic, biochemistry, reactions)
-- Biology (anatomy, genetics, ecology, microbiology)
-- Social Sciences (psychology, sociology, economics, political science)
-- Business (management, marketing, finance, entrepreneurship)
-- Medicine (anatomy, pharmacology, diseases, treatments)
-- Agriculture (farming, crops, soil science, livestock)
-- Architecture (building design, urban planning, structures)
-- If the text doesn't clearly fit any category, use "General Studies"
+    @contextmanager
+    def get_db(self):
+        with self.db_pool.connection() as conn:
+            yield conn
 
-STEP 2 - Identify the Specific Topic:
-Within the subject, determine the specific topic or subtopic. Examples:
-- Environmental Science → Water Conservation, Climate Change, Renewable Energy
-- Computer Science → Web Development, Machine Learning, Databases
-- Biology → Cell Biology, Genetics, Ecosystems
+    def hold(self):
+        """Count a user of this workspace, so the tenant cache won't close it; pair with release()"""
+        with self._active_lock:
+            self.active += 1
 
-STEP 3 - Check Existing Topics:
-Existing topics in the system: {existing_topics}
+    def release(self):
+        with self._active_lock:
+            self.active -= 1
 
-If a very similar topic exists (similar meaning, not exact match), set "create_new": false and use the existing topic name.
-If this is a genuinely new topic, set "create_new": true and provide a clear topic name.
+    @contextmanager
+    def activate(self):
+        """Make this the current workspace inside the block"""
+        token = _current_workspace.set(self)
+        self.hold()
+        try:
+            yield self
+        finally:
+            self.release()
+            _current_workspace.reset(token)
 
-STEP 4 - Extract Keywords:
-List 3-5 key terms that represent the main concepts in the text (comma-separated).
+    def bind(self, fn: Callable, job: Optional[str] = None) -> Callable:
+        """
+        Wrap `fn` to run with this workspace current (for background threads);
+        with `job`, its logs are tagged "<job>-<tenant id>"
+        """
+        def run(*args, **kwargs):
+            with self.activate(), (request_context(f"{job}-{self.tenant.id}") if job else nullcontext()):
+                return fn(*args, **kwargs)
+        return run
 
-Text to analyze:
-{text}
+    def start(self):
+        """Migrate the database, start the outbox and kick off the background backfills"""
+        with self.activate(), request_context(f"open-{self.tenant.id}"):
+            init_db()
+            pending = get_unfinished_capture_jobs()
+            fill_notion_cache = SYNC_TO_NOTION and notion_configured() and notion_page_cache_is_empty()
+        if SYNC_TO_NOTION:
+            self.notion_outbox.start()
+        if fill_notion_cache:
+            threading.Thread(target=self.bind(backfill_notion_page_cache, "notion-backfill"),
+                             name="notion-backfill", daemon=True).start()
+        if TOPIC_INDEX_ENABLED:
+            threading.Thread(target=self.bind(self.topic_index.load, "topic-index-load"),
+                             name="topic-index-load", daemon=True).start()
+        # Backfill data for notes saved by older versions without blocking startup
+        for name, job in (("search-backfill", self.note_search.backfill),
+                          ("note-data-backfill", backfill_note_data),
+                          ("compact-notes", compact_note_storage)):
+            threading.Thread(target=self.bind(job, name), name=name, daemon=True).start()
+        if pending:
+            # Recover jobs in a thread so a large backlog can't block startup on a full queue
+            log.info("🔁 Re-queuing unfinished capture jobs", tenant=self.tenant.id, jobs=len(pending))
+            threading.Thread(
+                target=lambda: [capture_queue.put((self.tenant.id, note_id)) for note_id in pending],
+                name="capture-recovery",
+                daemon=True
+            ).start()
 
-Respond with ONLY this JSON structure (no markdown, no code blocks, no explanations):
+    def close(self):
+        self.notion_outbox.stop()
+        self.db_pool.close_all()
+
+    def is_idle(self) -> bool:
+        """Nothing running, borrowed, queued for capture or waiting to sync (safe to close)"""
+        if self.active or self.db_pool.stats()["in_use"]:
+            return False
+        with self.get_db() as conn:
+            busy = conn.execute(
+                "SELECT 1 FROM capture_jobs WHERE status IN ('queued', 'classifying', 'syncing') LIMIT 1"
+            ).fetchone()
+        if busy:
+            return False
+        outbox = self.notion_outbox.stats()
+        return not (outbox["pending"] or outbox["in_flight"])
+
+
+_current_workspace: contextvars.ContextVar[Optional[Workspace]] = contextvars.ContextVar("workspace", default=None)
+_default_workspace: Optional[Workspace] = None
+_default_workspace_lock = threading.Lock()
+
+
+def open_workspace(tenant: Tenant) -> Workspace:
+    workspace = Workspace(tenant)
+    workspace.start()
+    log.info("🏠 Opened workspace", tenant=tenant.id, database=tenant.db_path)
+    return workspace
+
+
+def close_workspace(workspace: Workspace):
+    workspace.close()
+    log.info("🏠 Closed workspace", tenant=workspace.tenant.id)
+
+
+def open_tenant_workspace(tenant_id: str) -> Workspace:
+    tenant = tenant_registry.get(tenant_id)
+    if tenant is None:
+        raise KeyError(f"Unknown tenant: {tenant_id}")
+    return open_workspace(tenant)
+
+
+tenant_registry = TenantRegistry(TENANTS_DB_PATH, TENANT_DATA_DIR, TENANT_TOKEN_CACHE_TTL) if MULTI_TENANT else None
+tenant_workspaces: TenantCache[Workspace] = TenantCache(
+    open_tenant_workspace, close_workspace, lambda workspace: workspace.is_idle(), max_size=TENANT_CACHE_SIZE
+)
+
+
+def default_workspace() -> Workspace:
+    """The single workspace used when MULTI_TENANT is off, opened on first use"""
+    global _default_workspace
+    with _default_workspace_lock:
+        if _default_workspace is None:
+            _default_workspace = open_workspace(
+                Tenant("default", "default", DB_PATH, NOTION_API_KEY, NOTION_DATABASE_ID)
+            )
+        return _default_workspace
+
+
+def current_workspace() -> Workspace:
+    """Workspace of the tenant the running request or job belongs to"""
+    workspace = _current_workspace.get()
+    if workspace is not None:
+        return workspace
+    if MULTI_TENANT:
+        raise RuntimeError("No tenant selected; run inside Workspace.activate()")
+    return default_workspace()
+
+
+def workspace_for(tenant_id: str) -> Workspace:
+    return tenant_workspaces.get(tenant_id) if MULTI_TENANT else default_workspace()
+
+
+def open_workspaces() -> List[Workspace]:
+    if MULTI_TENANT:
+        return tenant_workspaces.values()
+    return [_default_workspace] if _default_workspace else []
+
+
+def close_workspaces():
+    global _default_workspace
+    tenant_workspaces.close_all()
+    with _default_workspace_lock:
+        if _default_workspace is not None:
+            close_workspace(_default_workspace)
+            _default_workspace = None
+
+
+# ========== LLM FUNCTIONS ==========
+
+CLASSIFICATION_SYSTEM_MESSAGE = "You are an expert study assistant that classifies academic content. You MUST respond with ONLY valid JSON - no other text, explanations, or markdown."
+
+# Steps shared by the single-text and batch prompts
+CLASSIFICATION_STEPS = """STEP 1 - Identify the Subject:
+Read the text carefully and determine which academic field it belongs to. Common subjects include:
+- Environmental Science (sustainability, climate, water, pollution, ecosystems)
+- Engineering (civil, mechanical, electrical, chemical, environmental)
+- Computer Science (programming, algorithms, AI, data structures, software)
+- Mathematics (algebra, calculus, statistics, geometry)
+- Physics (mechanics, thermodynamics, electromagnetism, quantum)
+- Chemistry (organic, inorganic, biochemistry, reactions)
+- Biology (anatomy, genetics, ecology, microbiology)
+- Social Sciences (psychology, sociology, economics, political science)
+- Business (management, marketing, finance, entrepreneurship)
+- Medicine (anatomy, pharmacology, diseases, treatments)
+- Agriculture (farming, crops, soil science, livestock)
+- Architecture (building design, urban planning, structures)
+- If the text doesn't clearly fit any category, use "General Studies"
+
+STEP 2 - Identify the Specific Topic:
+Within the subject, determine the specific topic or subtopic. Examples:
+- Environmental Science → Water Conservation, Climate Change, Renewable Energy
+- Computer Science → Web Development, Machine Learning, Databases
+- Biology → Cell Biology, Genetics, Ecosystems
+
+STEP 3 - Check Existing Topics:
+Existing topics in the system: {existing_topics}
+
+If a very similar topic exists (similar meaning, not exact match), set "create_new": false and use the existing topic name.
+If this is a genuinely new topic, set "create_new": true and provide a clear topic name.
+
+STEP 4 - Extract Keywords:
+List 3-5 key terms that represent the main concepts in the text (comma-separated)."""
+
+# Built once at import; every classification reuses the same templates
+CLASSIFICATION_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", CLASSIFICATION_SYSTEM_MESSAGE),
+    ("user", """Your task is to analyze the given text and determine its academic classification.
+
+""" + CLASSIFICATION_STEPS + """
+
+Text to analyze:
+{text}
+
+Respond with ONLY this JSON structure (no markdown, no code blocks, no explanations):
 {{
   "subject": "the academic subject",
   "topic": "the specific topic",
   "create_new": false,
   "keywords": "keyword1, keyword2, keyword3"
 }}""")
-        ])
-        
-        # Format and invoke
-        chain = prompt_template | llm
-        response = chain.invoke({
+])
+
+BATCH_CLASSIFICATION_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", CLASSIFICATION_SYSTEM_MESSAGE),
+    ("user", """Your task is to analyze each of the numbered texts below and determine its academic classification.
+Classify every text independently, following these steps for each one.
+
+""" + CLASSIFICATION_STEPS + """
+
+Texts to analyze (each starts with its number in <<<N>>>):
+{texts}
+
+Respond with ONLY a JSON array containing exactly one object per text, in the same order (no markdown, no code blocks, no explanations):
+[
+  {{
+    "index": 0,
+    "subject": "the academic subject",
+    "topic": "the specific topic",
+    "create_new": false,
+    "keywords": "keyword1, keyword2, keyword3"
+  }}
+]""")
+])
+
+
+def parse_keep_alive(value: str):
+    """Ollama accepts a duration string ("30m") or seconds (-1 keeps the model loaded forever)"""
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+class OllamaClassifier:
+    """
+    Classification chain for one Ollama host.
+
+    Holds one OllamaLLM (and therefore one pooled HTTP client to `base_url`)
+    piped into the precompiled prompt, so requests don't rebuild either, plus
+    the host's embeddings client for the topic index.
+    """
+
+    def __init__(self, base_url: str = OLLAMA_BASE_URL):
+        self.base_url = base_url
+        self.options = {
+            "temperature": OLLAMA_TEMPERATURE,
+            "num_ctx": OLLAMA_NUM_CTX,
+            "num_predict": OLLAMA_NUM_PREDICT,
+        }
+        self.llm = OllamaLLM(
+            model=OLLAMA_MODEL,
+            base_url=base_url,
+            keep_alive=parse_keep_alive(OLLAMA_KEEP_ALIVE),
+            client_kwargs={"timeout": OLLAMA_HTTP_TIMEOUT},
+            **self.options
+        )
+        self.embeddings = OllamaEmbeddings(
+            model=OLLAMA_EMBED_MODEL, base_url=base_url, client_kwargs={"timeout": LLM_TIMEOUT}
+        )
+        # JSON mode only for single classifications: Ollama's JSON grammar is an
+        # object, and the batch prompt answers with an array
+        self.chain = CLASSIFICATION_PROMPT | (self.llm.bind(format="json") if OLLAMA_JSON_MODE else self.llm)
+
+    def invoke(self, text: str, existing_topics: List[str], on_token: Optional[Callable[[str], None]] = None) -> str:
+        """
+        Run the classification prompt and return the raw model output.
+
+        In JSON mode the output is streamed and the stream closed as soon as
+        the object is complete, which stops generation (models otherwise keep
+        emitting whitespace up to num_predict). With on_token, each chunk is
+        passed to it as it's generated.
+        """
+        inputs = {
             "existing_topics": ', '.join(existing_topics) if existing_topics else "None",
             "text": text[:1000]  # Limit text length for faster processing
-        })
-        
-        print(f"📝 LLM Response: {response[:200]}...")
-        
-        # Try to extract JSON from response
-        # Some models might add extra text, so we look for JSON block
-        llm_output = response.strip()
-        
-        # If response contains markdown code blocks, extract JSON
-        if "```json" in llm_output:
-            llm_output = llm_output.split("```json")[1].split("```")[0].strip()
-        elif "```" in llm_output:
-            llm_output = llm_output.split("```")[1].split("```")[0].strip()
-        
-        # Find JSON object in the response
-        start_idx = llm_output.find('{')
-        end_idx = llm_output.rfind('}') + 1
-        if start_idx != -1 and end_idx > start_idx:
-            llm_output = llm_output[start_idx:end_idx]
-        
-        # Parse JSON response
-        parsed = json.loads(llm_output)
-        return LLMResponse(**parsed)
+        }
+        if on_token is None and not OLLAMA_JSON_MODE:
+            return self.chain.invoke(inputs)
+        chunks = []
+        for chunk in self.chain.stream(inputs):
+            chunks.append(chunk)
+            if on_token:
+                on_token(chunk)
+            if OLLAMA_JSON_MODE and json_object_end("".join(chunks)) != -1:
+                break
+        return "".join(chunks)
+
+    def invoke_batch(self, texts: List[str], existing_topics: List[str]) -> str:
+        """Classify several texts with one generation; returns the raw model output (a JSON array)"""
+        numbered = "\n\n".join(
+            f"<<<{i}>>>\n{text[:CAPTURE_BATCH_TEXT_CHARS]}" for i, text in enumerate(texts)
+        )
+        prompt = BATCH_CLASSIFICATION_PROMPT.format_prompt(
+            existing_topics=', '.join(existing_topics) if existing_topics else "None",
+            texts=numbered
+        )
+        # Allow enough output for one JSON object per text; num_ctx stays fixed so Ollama doesn't reload
+        options = {**self.options, "num_predict": OLLAMA_NUM_PREDICT * len(texts)}
+        return self.llm.invoke(prompt, options=options)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def warm_up(self):
+        """Load the model into Ollama's memory with a one-token generation"""
+        try:
+            log.info("🔥 Warming up Ollama model", model=OLLAMA_MODEL, backend=self.base_url)
+            # Same num_ctx/temperature as real calls, or Ollama reloads the model on the first one
+            self.llm.invoke("Hello", options={**self.options, "num_predict": 1})
+            log.info("🔥 Ollama model loaded", backend=self.base_url)
+        except Exception as e:
+            log.warning("⚠️ Ollama warm-up failed (will retry on first capture)", backend=self.base_url, error=str(e))
+
+
+def ollama_backends() -> List[OllamaBackend]:
+    """OLLAMA_BACKENDS, or just OLLAMA_BASE_URL with LLM_MAX_CONCURRENCY slots"""
+    if OLLAMA_BACKENDS.strip():
+        return parse_backends(OLLAMA_BACKENDS, LLM_MAX_CONCURRENCY)
+    return [OllamaBackend(OLLAMA_BASE_URL, 1.0, LLM_MAX_CONCURRENCY)]
+
+
+# One classifier (HTTP client) per host; OllamaLLM doesn't connect until the first call
+ollama_pool = OllamaPool(
+    ollama_backends(), OllamaClassifier,
+    hedge_after=OLLAMA_HEDGE_AFTER,
+    failure_threshold=OLLAMA_BACKEND_FAILURES,
+    health_interval=OLLAMA_HEALTH_INTERVAL,
+    timeout=LLM_TIMEOUT,
+    cooldown=OLLAMA_BACKEND_COOLDOWN,
+    log=log.warning
+)
+
+# The gateway's cap is the pool's total, so the pool only queues while a hedge holds an extra slot
+llm_gateway = LLMGateway(
+    max_concurrency=ollama_pool.max_concurrency,
+    timeout=LLM_TIMEOUT,
+    failure_threshold=LLM_BREAKER_FAILURES,
+    reset_timeout=LLM_BREAKER_RESET
+)
+
+# Embeddings get their own slots and breaker, so a missing embedding model can't stop classification
+embed_gateway = LLMGateway(
+    max_concurrency=EMBED_MAX_CONCURRENCY,
+    timeout=LLM_TIMEOUT,
+    failure_threshold=LLM_BREAKER_FAILURES,
+    reset_timeout=LLM_BREAKER_RESET,
+    name="embeddings"
+)
+
+
+def extract_json(llm_output: str, opener: str = "{", closer: str = "}") -> str:
+    """Pull the JSON object/array out of model output that may be wrapped in prose or markdown"""
+    llm_output = llm_output.strip()
+
+    # If response contains markdown code blocks, extract JSON
+    if "```json" in llm_output:
+        llm_output = llm_output.split("```json")[1].split("```")[0].strip()
+    elif "```" in llm_output:
+        llm_output = llm_output.split("```")[1].split("```")[0].strip()
+
+    # Find JSON value in the response
+    start_idx = llm_output.find(opener)
+    end_idx = llm_output.rfind(closer) + 1
+    if start_idx != -1 and end_idx > start_idx:
+        llm_output = llm_output[start_idx:end_idx]
+    return llm_output
+
+
+def json_object_end(text: str) -> int:
+    """Index just past the first complete top-level JSON object in text, or -1 if it isn't closed yet"""
+    depth = 0
+    in_string = escaped = False
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = depth > 0
+        elif char == "{":
+            depth += 1
+        elif char == "}" and depth > 0:
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return -1
+
+
+def parse_json_array_items(llm_output: str) -> list:
+    """
+    Items of the first JSON array in the output, keeping the complete items
+    of an array that was cut short (e.g. by the context window)
+    """
+    start = llm_output.find("[")
+    if start == -1:
+        raise ValueError("No JSON array in LLM output")
+    decoder = json.JSONDecoder()
+    items = []
+    position = start + 1
+    while True:
+        while position < len(llm_output) and llm_output[position] in " \t\r\n,":
+            position += 1
+        if position >= len(llm_output) or llm_output[position] == "]":
+            return items
+        try:
+            item, position = decoder.raw_decode(llm_output, position)
+        except ValueError:
+            return items
+        items.append(item)
+
+
+def parse_classification(llm_output: str) -> LLMResponse:
+    """Validate model output into an LLMResponse; raises ValueError if it's malformed"""
+    end = json_object_end(llm_output) if OLLAMA_JSON_MODE else -1
+    if end != -1:
+        return LLMResponse.model_validate_json(llm_output[llm_output.index("{"):end])
+    # Free-form output may wrap the JSON in prose or markdown
+    return LLMResponse.model_validate_json(extract_json(llm_output))
+
+
+def call_llm_for_classification(text: str, existing_topics: List[str],
+                                on_token: Optional[Callable[[str], None]] = None) -> LLMResponse:
+    """
+    Call Ollama LLM via LangChain to classify the highlighted text.
+    
+    Uses local open-source models like llama2, mistral, or codellama.
+    Returns subject, topic, and keywords (no summarization - text stored as-is).
+    Successful LLM results are cached; fallback results are not.
+    on_token receives the raw output as it streams (not called on cache hits).
+    """
+    
+    cache_key = make_cache_key(text, OLLAMA_MODEL, topic_set_version(existing_topics))
+    cached = current_workspace().classification_cache.get(cache_key)
+    if cached:
+        log.info("⚡ Classification cache hit")
+        CLASSIFICATIONS.inc(source="cache")
+        return LLMResponse(**cached)
+
+    try:
+        log.info("🤖 Calling LLM", model=OLLAMA_MODEL, topics=len(existing_topics))
+        with STAGE_SECONDS.time(stage="llm"):
+            # Streamed tokens must come from one host: streaming calls are never hedged,
+            # and only fail over to another host if nothing was streamed yet
+            streamed = []
+
+            def relay(chunk: str):
+                streamed.append(chunk)
+                on_token(chunk)
+
+            response = llm_gateway.call(
+                ollama_pool.call,
+                lambda client: client.invoke(text, existing_topics, on_token=relay if on_token else None),
+                hedge=on_token is None,
+                can_retry=lambda: not streamed
+            )
+        log.debug("📝 LLM response", output=response[:200])
+
+        result = parse_classification(response)
+        current_workspace().classification_cache.put(cache_key, result.model_dump())
+        CLASSIFICATIONS.inc(source="llm")
+        return result
         
     except Exception as e:
-        print(f"⚠️ LLM Error: {e}")
-        print("📋 Falling back to simple analysis...")
-        
-        # Fallback: Simple keyword-based classification
-        text_lower = text.lower()
-        
-        # Detect subject based on keywords (expanded list)
-        subject = "General Studies"
-        topic = "Study Notes"
-        
-        # Environmental Science & Sustainability
-        if any(word in text_lower for word in ['water', 'harvesting', 'rainwater', 'conservation', 'sustainability', 'climate', 'environment', 'ecosystem', 'pollution', 'renewable', 'solar', 'wind']):
-            subject = "Environmental Science"
-            if any(word in text_lower for word in ['water', 'harvesting', 'rainwater']):
-                topic = "Water Conservation"
-            elif any(word in text_lower for word in ['climate', 'warming', 'carbon']):
-                topic = "Climate Change"
-            elif any(word in text_lower for word in ['solar', 'wind', 'renewable']):
-                topic = "Renewable Energy"
-            else:
-                topic = "Sustainability"
-        
-        # Engineering
-        elif any(word in text_lower for word in ['engineering', 'design', 'structure', 'construction', 'circuit', 'mechanical', 'electrical']):
-            subject = "Engineering"
-            topic = "General Engineering"
-        
-        # Computer Science
-        elif any(word in text_lower for word in ['algorithm', 'code', 'programming', 'software', 'computer', 'database', 'javascript', 'python', 'api']):
-            subject = "Computer Science"
-            if any(word in text_lower for word in ['web', 'html', 'css', 'frontend', 'backend']):
-                topic = "Web Development"
-            elif any(word in text_lower for word in ['machine learning', 'ai', 'neural', 'model']):
-                topic = "Machine Learning"
-            else:
-                topic = "Programming"
-        
-        # Mathematics
-        elif any(word in text_lower for word in ['math', 'equation', 'theorem', 'calculate', 'algebra', 'calculus', 'geometry']):
-            subject = "Mathematics"
-            topic = "General Math"
-        
-        # Physics
-        elif any(word in text_lower for word in ['physics', 'force', 'energy', 'quantum', 'velocity', 'momentum']):
-            subject = "Physics"
-            topic = "General Physics"
-        
-        # Chemistry
-        elif any(word in text_lower for word in ['chemistry', 'molecule', 'reaction', 'atom', 'compound', 'element']):
-            subject = "Chemistry"
-            topic = "General Chemistry"
-        
-        # Biology
-        elif any(word in text_lower for word in ['biology', 'cell', 'dna', 'organism', 'genetics', 'protein']):
-            subject = "Biology"
-            topic = "General Biology"
-        
-        # Agriculture
-        elif any(word in text_lower for word in ['agriculture', 'farming', 'crop', 'soil', 'harvest', 'livestock', 'irrigation']):
-            subject = "Agriculture"
-            topic = "Farming & Crops"
-        
-        # Business
-        elif any(word in text_lower for word in ['business', 'marketing', 'management', 'finance', 'entrepreneur', 'startup']):
-            subject = "Business"
-            topic = "General Business"
-        
-        # Medicine/Health
-        elif any(word in text_lower for word in ['medicine', 'health', 'disease', 'treatment', 'patient', 'medical', 'anatomy']):
-            subject = "Medicine"
-            topic = "General Medicine"
-        
-        # Extract simple keywords (first few meaningful words)
-        words = text.split()
-        keywords = [w.strip('.,!?') for w in words[:10] if len(w) > 4][:5]
-        keywords_str = ', '.join(keywords) if keywords else "study, notes"
-        
-        return LLMResponse(
-            subject=subject,
-            topic=existing_topics[0] if existing_topics else topic,
-            create_new=False,
-            keywords=keywords_str
+        log.warning("⚠️ LLM classification failed, falling back to keywords", error=str(e), reason=type(e).__name__)
+        CLASSIFICATIONS.inc(source="fallback")
+        LLM_FALLBACKS.inc(reason=type(e).__name__)
+        return fallback_classification(text, existing_topics)
+
+
+def fallback_classification(text: str, existing_topics: List[str], match: Optional[KeywordMatch] = None) -> LLMResponse:
+    """Keyword-based classification used when the LLM fails (or in fast mode)"""
+    match = match or keyword_classifier.classify(text)
+
+    # Reuse the existing spelling of the topic if it is already in the database
+    existing = {name.lower(): name for name in existing_topics}
+    topic = existing.get(match.topic.lower(), match.topic)
+
+    return LLMResponse(
+        subject=match.subject,
+        topic=topic,
+        create_new=topic not in existing_topics,
+        keywords=', '.join(match.keywords[:5]) if match.keywords else extract_simple_keywords(text)
+    )
+
+
+def extract_simple_keywords(text: str) -> str:
+    """First few meaningful words as comma-separated keywords (no LLM needed)"""
+    words = text.split()
+    keywords = [w.strip('.,!?') for w in words[:10] if len(w) > 4][:5]
+    return ', '.join(keywords) if keywords else "study, notes"
+
+
+def fast_classification(text: str, existing_topics: List[str]) -> Optional[LLMResponse]:
+    """Keyword classification when fast mode is on and the match is confident enough, else None"""
+    if not KEYWORD_FAST_MODE:
+        return None
+    match = keyword_classifier.classify(text)
+    if match.confidence < KEYWORD_FAST_THRESHOLD:
+        return None
+    log.info("⚡ Keyword fast mode match, skipping LLM", subject=match.subject, topic=match.topic,
+             confidence=round(match.confidence, 2))
+    CLASSIFICATIONS.inc(source="keyword")
+    return fallback_classification(text, existing_topics, match)
+
+
+def canonical_topic(result: LLMResponse) -> LLMResponse:
+    """Replace a variant topic name ("ML", "Machine Learning Basics") with the existing topic it names"""
+    resolved = current_workspace().topics.resolve(result.topic, result.subject)
+    if not resolved or resolved[1] == "exact":
+        return result
+    topic, how = resolved
+    log.info("🔗 Mapped topic onto existing topic", topic=result.topic, canonical=topic["name"], match=how)
+    return result.model_copy(update={"topic": topic["name"], "subject": topic["subject"], "create_new": False})
+
+
+def classify_text(text: str, on_token: Optional[Callable[[str], None]] = None) -> LLMResponse:
+    """Classify text and map the topic onto an existing one when it's a variant of it"""
+    return canonical_topic(_classify_text(text, on_token))
+
+
+def _classify_text(text: str, on_token: Optional[Callable[[str], None]] = None) -> LLMResponse:
+    """
+    Classify text against the topics currently in the database.
+
+    Confident keyword matches skip the LLM in fast mode. With the topic index,
+    only the nearest topics go into the prompt, and a close enough match is
+    used directly without calling the LLM. on_token receives streamed LLM output.
+    """
+    if KEYWORD_FAST_MODE:
+        fast_result = fast_classification(text, get_topic_names())
+        if fast_result:
+            return fast_result
+
+    if TOPIC_INDEX_ENABLED:
+        with STAGE_SECONDS.time(stage="topic_index"):
+            nearest = current_workspace().topic_index.nearest(text[:1000], TOPIC_INDEX_TOP_K)
+        if nearest is not None:
+            if nearest and nearest[0]["score"] >= TOPIC_MATCH_THRESHOLD:
+                best = nearest[0]
+                log.info("🧭 Topic index match, skipping LLM", topic=best["name"], score=round(best["score"], 2))
+                CLASSIFICATIONS.inc(source="topic_index")
+                return LLMResponse(
+                    subject=best["subject"],
+                    topic=best["name"],
+                    create_new=False,
+                    keywords=extract_simple_keywords(text)
+                )
+
+            topic_names = [t["name"] for t in nearest]
+            log.debug("🧭 Using nearest topics in the prompt", topics=len(topic_names))
+            llm_result = call_llm_for_classification(text, topic_names, on_token)
+            log.info("🏷️ Classified", subject=llm_result.subject, topic=llm_result.topic)
+            return llm_result
+
+    llm_result = call_llm_for_classification(text, get_topic_names(), on_token)
+    log.info("🏷️ Classified", subject=llm_result.subject, topic=llm_result.topic)
+    return llm_result
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for prompt budgeting (about 3 characters per token, erring high)"""
+    return len(text) // 3 + 1
+
+
+# The batch prompt without topics or texts
+BATCH_PROMPT_TOKENS = estimate_tokens(BATCH_CLASSIFICATION_PROMPT.format(existing_topics="", texts=""))
+
+
+def batch_fits(batch_texts: List[str], topics: List[str]) -> bool:
+    """Whether a batch prompt plus one answer per text fits in OLLAMA_NUM_CTX (Ollama truncates silently)"""
+    needed = (BATCH_PROMPT_TOKENS + estimate_tokens(", ".join(topics))
+              + sum(estimate_tokens(text[:CAPTURE_BATCH_TEXT_CHARS]) + 4 for text in batch_texts)
+              + OLLAMA_NUM_PREDICT * len(batch_texts))
+    return needed <= OLLAMA_NUM_CTX
+
+
+def classify_texts_batch(texts: List[str]) -> List[LLMResponse]:
+    """
+    Classify many texts with one LLM call per chunk of up to CAPTURE_BATCH_SIZE.
+
+    Cached texts skip the LLM. With the topic index, a chunk's prompt lists
+    only its texts' nearest topics. Chunks are cut so prompt plus answers fit
+    in OLLAMA_NUM_CTX; anything the batch answer doesn't cover (including a
+    text that doesn't fit even alone) is classified individually (which still
+    falls back to keywords on failure).
+    """
+    topic_names = get_topic_names()
+    version = topic_set_version(topic_names)
+
+    keys = [make_cache_key(text, OLLAMA_MODEL, version) for text in texts]
+    results: List[Optional[LLMResponse]] = [None] * len(texts)
+    pending = []
+    for i, key in enumerate(keys):
+        cached = current_workspace().classification_cache.get(key)
+        if cached:
+            results[i] = LLMResponse(**cached)
+            CLASSIFICATIONS.inc(source="cache")
+        else:
+            results[i] = fast_classification(texts[i], topic_names)
+            if results[i] is None:
+                pending.append(i)
+    log.info("⚡ Batch texts served without the LLM", served=len(texts) - len(pending), texts=len(texts))
+
+    neighbours = None
+    if TOPIC_INDEX_ENABLED and pending:
+        with STAGE_SECONDS.time(stage="topic_index"):
+            nearest = current_workspace().topic_index.nearest_many(
+                [texts[i][:1000] for i in pending], TOPIC_INDEX_TOP_K
+            )
+        if nearest is not None:
+            neighbours = {i: [t["name"] for t in found] for i, found in zip(pending, nearest)}
+
+    def chunk_topics(chunk: List[int]) -> List[str]:
+        if neighbours is None:
+            return topic_names
+        return list(dict.fromkeys(name for i in chunk for name in neighbours[i]))
+
+    def fits(chunk: List[int]) -> bool:
+        return batch_fits([texts[i] for i in chunk], chunk_topics(chunk))
+
+    chunks: List[List[int]] = []
+    chunk: List[int] = []
+    for i in pending:
+        if len(chunk) < CAPTURE_BATCH_SIZE and fits(chunk + [i]):
+            chunk.append(i)
+            continue
+        if chunk:
+            chunks.append(chunk)
+        chunk = [i] if fits([i]) else []
+    if chunk:
+        chunks.append(chunk)
+
+    for chunk in chunks:
+        topics = chunk_topics(chunk)
+        try:
+            log.info("🤖 Classifying batch with one LLM call", texts=len(chunk), topics=len(topics))
+            # A batch generates one answer per text, so it gets a proportionally longer deadline;
+            # it's never hedged, since OLLAMA_HEDGE_AFTER is sized for single classifications
+            batch_texts = [texts[i] for i in chunk]
+            with STAGE_SECONDS.time(stage="llm_batch"):
+                response = llm_gateway.call(
+                    ollama_pool.call,
+                    lambda client: client.invoke_batch(batch_texts, topics),
+                    hedge=False,
+                    timeout=LLM_TIMEOUT * len(chunk)
+                )
+            parsed = parse_json_array_items(response)
+        except Exception as e:
+            log.warning("⚠️ Batch LLM call failed", error=str(e), texts=len(chunk))
+            continue
+        if len(parsed) < len(chunk):
+            log.warning("⚠️ Batch answer is short, classifying the rest one by one",
+                        answered=len(parsed), texts=len(chunk))
+
+        for position, item in enumerate(parsed):
+            try:
+                index = int(item.get("index", position))
+                if 0 <= index < len(chunk) and results[chunk[index]] is None:
+                    result = LLMResponse(**item)
+                    results[chunk[index]] = result
+                    current_workspace().classification_cache.put(keys[chunk[index]], result.model_dump())
+                    CLASSIFICATIONS.inc(source="llm")
+            except Exception as e:
+                log.warning("⚠️ Skipping malformed batch item", position=position, error=str(e))
+
+    for i, result in enumerate(results):
+        if result is None:
+            results[i] = call_llm_for_classification(texts[i], neighbours[i] if neighbours else topic_names)
+    return [canonical_topic(result) for result in results]
+
+
+# ========== BACKGROUND CAPTURE WORKERS ==========
+
+# (tenant id, note id) items; the workers serve every tenant
+capture_queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=CAPTURE_QUEUE_SIZE)
+capture_workers: List[threading.Thread] = []
+
+
+def process_capture_job(note_id: int, on_event: Optional[Callable[..., None]] = None,
+                        on_token: Optional[Callable[[str], None]] = None) -> Optional[LLMResponse]:
+    """
+    Classify a pending note, move it to its topic and sync it to Notion.
+
+    on_event(stage, **data) is told about each stage and on_token receives
+    streamed LLM output (both used by /capture/stream). Returns the
+    classification, or None if the job failed.
+    """
+    emit = on_event or (lambda stage, **data: None)
+    job = get_capture_job(note_id)
+    note = get_note_details(note_id)
+    if not job or not note:
+        log.warning("⚠️ Capture job not found, skipping", note_id=note_id)
+        return None
+
+    try:
+        update_capture_job(note_id, "classifying")
+        emit("classifying")
+        llm_result = classify_text(note["original_text"], on_token=on_token)
+        topic_id = get_or_create_topic(llm_result.topic, llm_result.subject)
+        title = job["page_title"] or f"{llm_result.subject} - {llm_result.topic}"
+        update_note_classification(note_id, topic_id, title, llm_result.keywords)
+        emit("classified", subject=llm_result.subject, topic=llm_result.topic, keywords=llm_result.keywords)
+
+        if SYNC_TO_NOTION:
+            # The Notion outbox marks the job done once the page exists
+            update_capture_job(note_id, "syncing")
+            log.info("📤 Queued Notion sync", note_id=note_id)
+            current_workspace().notion_outbox.enqueue([note_id])
+            emit("syncing")
+        else:
+            update_capture_job(note_id, "done")
+        log.info("✅ Background capture classified", note_id=note_id)
+        return llm_result
+    except Exception as e:
+        log.exception("❌ Background capture failed", note_id=note_id, error=str(e))
+        update_capture_job(note_id, "failed", error=str(e))
+        emit("failed", error=str(e))
+        return None
+
+
+def capture_worker():
+    """Worker thread: process queued capture jobs until a stop sentinel arrives"""
+    while True:
+        item = capture_queue.get()
+        try:
+            if item is None:
+                return
+            tenant_id, note_id = item
+            with workspace_for(tenant_id).activate(), request_context(f"capture-{note_id}"):
+                process_capture_job(note_id)
+        except Exception as e:
+            log.exception("❌ Capture worker error", item=item, error=str(e))
+        finally:
+            capture_queue.task_done()
+
+
+def start_capture_workers():
+    """Start worker threads (each workspace re-queues its unfinished jobs when it opens)"""
+    for i in range(CAPTURE_WORKERS):
+        worker = threading.Thread(target=capture_worker, name=f"capture-worker-{i}", daemon=True)
+        worker.start()
+        capture_workers.append(worker)
+
+
+def stop_capture_workers(timeout: float = 5.0):
+    """Ask worker threads to exit after their current job"""
+    for _ in capture_workers:
+        capture_queue.put(None)
+    for worker in capture_workers:
+        worker.join(timeout=timeout)
+    capture_workers.clear()
+
+
+def enqueue_capture(request: CaptureRequest) -> int:
+    """Store raw text immediately and queue it for background classification"""
+    note_id = save_pending_note(request.text, request.url or "", request.pageTitle or "")
+    try:
+        capture_queue.put_nowait((current_workspace().tenant.id, note_id))
+    except queue.Full:
+        # Drop the note so the client's retry doesn't leave a duplicate behind
+        delete_pending_note(note_id)
+        raise HTTPException(status_code=503, detail="Capture queue is full, please retry shortly")
+    return note_id
+
+
+
+# ========== BULK EXPORT / IMPORT ==========
+
+def export_notes_ndjson():
+    """
+    Yield every note as one JSON line, oldest first.
+
+    Notes are read in keyset-paginated chunks, each on a briefly borrowed
+    connection, so memory stays constant and no read transaction is held
+    open while a slow client downloads.
+    """
+    with get_db() as conn:
+        max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM summaries").fetchone()[0]
+    last_id = 0
+    while last_id < max_id:
+        with get_db() as conn:
+            rows = conn.execute("""
+                SELECT s.id, s.title, s.original_text, s.keywords, s.source_url, s.created_at,
+                       t.name AS topic, t.subject
+                FROM summaries s
+                JOIN topics t ON t.id = s.topic_id
+                WHERE s.id > ? AND s.id <= ?
+                ORDER BY s.id
+                LIMIT ?
+            """, (last_id, max_id, EXPORT_CHUNK_SIZE)).fetchall()
+        if not rows:
+            break
+        yield "".join(
+            json.dumps({
+                "id": row["id"],
+                "title": row["title"],
+                "subject": row["subject"],
+                "topic": row["topic"],
+                "keywords": row["keywords"] or "",
+                "source_url": row["source_url"] or "",
+                "original_text": decode_text(row["original_text"]),
+                "created_at": row["created_at"]
+            }, ensure_ascii=False) + "\n"
+            for row in rows
         )
+        last_id = rows[-1]["id"]
+
+
+def parse_import_record(line: bytes) -> dict:
+    """
+    One /import line as a record with string fields (keywords given as a list
+    are joined); raises ValueError for lines the batch insert can't take
+    """
+    record = json.loads(line)
+    if not isinstance(record, dict):
+        raise ValueError("line is not a JSON object")
+    record["original_text"] = record.get("original_text") or record.get("text")
+    if not isinstance(record["original_text"], str) or not record["original_text"].strip():
+        raise ValueError("missing original_text")
+    keywords = record.get("keywords")
+    if isinstance(keywords, list):
+        if not all(isinstance(keyword, str) for keyword in keywords):
+            raise ValueError("keywords must be a string or a list of strings")
+        record["keywords"] = ", ".join(keywords)
+    for field in ("title", "subject", "topic", "keywords", "source_url", "created_at"):
+        if record.get(field) is not None and not isinstance(record[field], str):
+            raise ValueError(f"{field} must be a string")
+    return record
+
+
+def import_notes_batch(records: List[dict], reclassify: bool, sync: bool) -> dict:
+    """
+    Insert one batch of exported notes in a single transaction.
+
+    Subject/topic/keywords come from the record unless `reclassify` is set
+    (or the record has none), in which case the batch is classified with
+    classify_texts_batch. Notes matching an existing note's content hash are
+    counted as duplicates and skipped.
+    """
+    to_classify = [i for i, record in enumerate(records)
+                   if reclassify or not (record.get("subject") and record.get("topic"))]
+    classified = {}
+    if to_classify:
+        classified = dict(zip(to_classify, classify_texts_batch([records[i]["original_text"] for i in to_classify])))
 
+    rows = []
+    for i, record in enumerate(records):
+        if i in classified:
+            result = classified[i]
+            rows.append((record, result.subject, result.topic, result.keywords))
+        else:
+            rows.append((record, record["subject"], record["topic"], record.get("keywords") or ""))
+
+    # Topics are created through their own connection, so before the insert transaction takes the write lock
+    topic_ids = {}
+    for _, subject, topic, _ in rows:
+        if topic not in topic_ids:
+            topic_ids[topic] = get_or_create_topic(topic, subject)
+
+    imported = []
+    duplicates = 0
+    with get_db() as conn:
+        for record, subject, topic, keywords in rows:
+            note_id, created = insert_note(
+                conn,
+                title=record.get("title") or f"{subject} - {topic}",
+                topic_id=topic_ids[topic],
+                keywords=keywords,
+                source_url=record.get("source_url") or "",
+                original_text=record["original_text"],
+                created_at=record.get("created_at")
+            )
+            if created:
+                imported.append(note_id)
+            else:
+                duplicates += 1
+        conn.commit()
+
+    if sync and SYNC_TO_NOTION:
+        current_workspace().notion_outbox.enqueue(imported)
+    return {"imported": len(imported), "duplicates": duplicates}
 
 
 # ========== API ENDPOINTS ==========
@@ -584,48 +2062,135 @@ def root():
     with get_db() as db:
         topics_count = db.execute("SELECT COUNT(*) as count FROM topics").fetchone()["count"]
         notes_count = db.execute("SELECT COUNT(*) as count FROM summaries").fetchone()["count"]
+        schema_version = get_schema_version(db)
+    workspace = current_workspace()
     
     return {
         "status": "running",
         "message": "AI Study Assistant API",
         "version": "2.0.0",
-        "database": DB_PATH,
+        "tenant": workspace.tenant.id,
+        "database": workspace.tenant.db_path,
+        "schema_version": schema_version,
+        "db_pool": workspace.db_pool.stats(),
         "topics_count": topics_count,
         "notes_count": notes_count,
-        "notion_sync": SYNC_TO_NOTION
+        "notion_sync": SYNC_TO_NOTION,
+        "classification_cache": workspace.classification_cache.stats(),
+        "topic_index": workspace.topic_index.stats() if TOPIC_INDEX_ENABLED else {"enabled": False},
+        "llm_gateway": llm_gateway.stats(),
+        "embed_gateway": embed_gateway.stats(),
+        "ollama_pool": ollama_pool.stats(),
+        "search_index": workspace.note_search.stats(),
+        "topic_registry": workspace.topics.stats(),
+        **({"tenant_workspaces": tenant_workspaces.stats()} if MULTI_TENANT else {})
     }
 
 
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus metrics: per-stage and HTTP latency histograms, classification counters, queue gauges"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match lists `etag` (weak or strong) or is `*`"""
+    header = request.headers.get("If-None-Match", "")
+    candidates = [value.strip().removeprefix("W/") for value in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
 @app.get("/topics")
-def get_topics_endpoint():
-    """Get all existing topics from database"""
-    topics = get_all_topics()
-    return {"topics": topics}
+def get_topics_endpoint(request: Request):
+    """Get all existing topics; answers 304 when If-None-Match carries the current ETag"""
+    snapshot = current_workspace().topics.snapshot()
+    etag = f'"{snapshot.etag}"'
+    # Clients may revalidate every time; the list is per tenant in multi-tenant mode
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Authorization, X-API-Token"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse({"topics": snapshot.topics}, headers=headers)
+
+
+def parse_notes_cursor(after: str) -> tuple:
+    """Split an `after` cursor ("<created_at>,<id>") into its parts"""
+    created_at, _, note_id = after.rpartition(",")
+    if not created_at or not note_id.isdigit():
+        raise HTTPException(status_code=400, detail="Invalid cursor, expected after=<created_at>,<id>")
+    return created_at, int(note_id)
 
 
 @app.get("/notes")
-def get_notes(limit: int = 50, offset: int = 0):
-    """Get all notes from database"""
+def get_notes(limit: int = 50, offset: int = 0, after: Optional[str] = None,
+              topic: Optional[str] = None, subject: Optional[str] = None):
+    """
+    Get notes newest first.
+
+    Pass the previous page's `next_cursor` as `after` to page with an index
+    seek instead of OFFSET, which keeps deep pages as fast as the first one.
+    """
+    limit = max(1, min(limit, NOTES_MAX_LIMIT))
+    where, params = [], []
+    if after:
+        where.append("(s.created_at, s.id) < (?, ?)")
+        params += parse_notes_cursor(after)
+    if topic:
+        where.append("s.topic_id = (SELECT id FROM topics WHERE name = ?)")
+        params.append(topic)
+    if subject:
+        where.append("s.topic_id IN (SELECT id FROM topics WHERE subject = ?)")
+        params.append(subject)
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+
     with get_db() as db:
-        cursor = db.execute("""
+        cursor = db.execute(f"""
             SELECT s.id, s.title, s.created_at, t.name as topic, t.subject
             FROM summaries s
             JOIN topics t ON s.topic_id = t.id
-            ORDER BY s.created_at DESC
+            {where_sql}
+            ORDER BY s.created_at DESC, s.id DESC
             LIMIT ? OFFSET ?
-        """, (limit, offset))
-        
-        notes = []
-        for row in cursor.fetchall():
-            notes.append({
-                "id": row["id"],
-                "title": row["title"],
-                "topic": row["topic"],
-                "subject": row["subject"],
-                "created_at": row["created_at"]
-            })
-        
-        return {"notes": notes, "limit": limit, "offset": offset}
+        """, (*params, limit + 1, 0 if after else offset))
+        rows = cursor.fetchall()
+
+    notes = []
+    for row in rows[:limit]:
+        notes.append({
+            "id": row["id"],
+            "title": row["title"],
+            "topic": row["topic"],
+            "subject": row["subject"],
+            "created_at": row["created_at"]
+        })
+
+    # One extra row was fetched to tell whether another page exists
+    next_cursor = f"{notes[-1]['created_at']},{notes[-1]['id']}" if len(rows) > limit else None
+    return {"notes": notes, "limit": limit, "offset": offset, "next_cursor": next_cursor}
+
+
+@app.get("/search")
+def search_notes(q: str, subject: Optional[str] = None, topic: Optional[str] = None,
+                 limit: int = 20, offset: int = 0):
+    """Full-text search over note titles, text and keywords, best matches first"""
+    limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+    results = current_workspace().note_search.search(q, subject=subject, topic=topic, limit=limit, offset=max(0, offset))
+    return {"query": q, "results": results, "limit": limit, "offset": offset}
+
+
+@app.get("/keywords")
+def get_keywords(subject: Optional[str] = None, topic: Optional[str] = None,
+                 prefix: Optional[str] = None, limit: int = 50):
+    """Most used keywords with note counts, optionally within a subject/topic or starting with a prefix"""
+    limit = max(1, min(limit, KEYWORDS_MAX_LIMIT))
+    return {"keywords": keyword_index.counts(subject=subject, topic=topic, prefix=prefix, limit=limit)}
+
+
+@app.get("/keywords/{keyword}")
+def get_keyword_notes(keyword: str, subject: Optional[str] = None, topic: Optional[str] = None,
+                      limit: int = 50, offset: int = 0):
+    """Notes tagged with a keyword, with per-subject and per-topic counts for faceting"""
+    limit = max(1, min(limit, KEYWORDS_MAX_LIMIT))
+    return keyword_index.notes(keyword, subject=subject, topic=topic, limit=limit, offset=max(0, offset))
 
 
 @app.get("/notes/{note_id}")
@@ -637,8 +2202,172 @@ def get_note(note_id: int):
     return note
 
 
+@app.get("/sync/status")
+def sync_status():
+    """Notion outbox queue depth by state"""
+    return {
+        "enabled": SYNC_TO_NOTION,
+        "rate_limit_per_second": NOTION_RATE_LIMIT,
+        **current_workspace().notion_outbox.stats()
+    }
+
+
+@app.post("/sync/retry")
+def sync_retry():
+    """Re-queue notes whose Notion sync failed permanently"""
+    return {"success": True, "requeued": current_workspace().notion_outbox.retry_failed()}
+
+
+@app.post("/notion/backfill")
+def notion_backfill_endpoint():
+    """Re-crawl Notion Subject/Topic pages into the page-id cache"""
+    if not notion_configured():
+        raise HTTPException(status_code=400, detail="Notion credentials not set")
+    backfill_notion_page_cache()
+    with get_db() as db:
+        cached = db.execute("SELECT COUNT(*) FROM notion_pages").fetchone()[0]
+    return {"success": True, "cached_pages": cached}
+
+
+@app.get("/notes/{note_id}/status")
+def get_note_status(note_id: int):
+    """Get background classification/sync progress of a captured note"""
+    note = get_note_details(note_id)
+    if not note:
+        raise HTTPException(status_code=404, detail="Note not found")
+
+    outbox_row = current_workspace().notion_outbox.get(note_id)
+    notion_sync = {
+        "status": outbox_row["status"] if outbox_row else "not_queued",
+        "attempts": outbox_row["attempts"] if outbox_row else 0,
+        "error": outbox_row["last_error"] if outbox_row else None,
+        "notion_url": (outbox_row["notion_url"] or "") if outbox_row else ""
+    }
+
+    job = get_capture_job(note_id)
+    if not job:
+        # Captured synchronously, so it was classified before the response
+        return {
+            "note_id": note_id,
+            "status": "done",
+            "subject": note["subject"],
+            "topic": note["topic"],
+            "notion_sync": notion_sync
+        }
+
+    return {
+        "note_id": note_id,
+        "status": job["status"],
+        "subject": note["subject"] if job["status"] in ("syncing", "done") else None,
+        "topic": note["topic"] if job["status"] in ("syncing", "done") else None,
+        "notion_url": job["notion_url"] or "",
+        "error": job["error"],
+        "updated_at": job["updated_at"],
+        "notion_sync": notion_sync
+    }
+
+
+def duplicate_note_data(note_id: int) -> dict:
+    """Response data for a capture that matched an already saved note"""
+    note = get_note_details(note_id) or {}
+    job = get_capture_job(note_id)
+    sync = current_workspace().notion_outbox.get(note_id) if SYNC_TO_NOTION else None
+    return {
+        "note_id": note_id,
+        "duplicate": True,
+        "status": job["status"] if job else "done",
+        "subject": note.get("subject"),
+        "topic": note.get("topic"),
+        "keywords": note.get("keywords"),
+        "notion_url": (sync or {}).get("notion_url") or "",
+        "notion_sync": sync["status"] if sync else ("not_synced" if SYNC_TO_NOTION else "disabled"),
+        "status_url": f"/notes/{note_id}/status"
+    }
+
+
+def duplicate_capture_response(note_id: int) -> dict:
+    log.info("🔁 Duplicate capture, returning saved note", note_id=note_id)
+    return {
+        "success": True,
+        "message": "Note already saved",
+        "data": {**duplicate_note_data(note_id), "saved_to_db": True}
+    }
+
+
+@app.post("/capture/batch")
+def capture_batch(captures: List[CaptureRequest]):
+    """
+    Capture many highlights at once (offline queue flush, imports).
+
+    Texts are classified with a few chunked LLM calls and all notes are
+    inserted in one transaction.
+    """
+    if not captures:
+        return {"success": True, "message": "No notes to save", "data": []}
+    if len(captures) > CAPTURE_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {CAPTURE_BATCH_MAX} captures)")
+
+    try:
+        # Already saved captures (and repeats within the batch) skip classification
+        data: List[Optional[dict]] = [None] * len(captures)
+        first_in_batch = {}
+        new_indexes = []
+        for i, capture in enumerate(captures):
+            existing_id = find_duplicate_note(capture.text, capture.url or "")
+            if existing_id is not None:
+                data[i] = duplicate_note_data(existing_id)
+                continue
+            digest = content_hash(capture.text, capture.url or "")
+            if digest is not None and digest in first_in_batch:
+                continue  # filled in from the first occurrence once it's saved
+            if digest is not None:
+                first_in_batch[digest] = i
+            new_indexes.append(i)
+
+        llm_results = classify_texts_batch([captures[i].text for i in new_indexes])
+
+        topic_ids = {}
+        notes = []
+        for i, llm_result in zip(new_indexes, llm_results):
+            capture = captures[i]
+            if llm_result.topic not in topic_ids:
+                topic_ids[llm_result.topic] = get_or_create_topic(llm_result.topic, llm_result.subject)
+            notes.append({
+                "title": capture.pageTitle or f"{llm_result.subject} - {llm_result.topic}",
+                "topic_id": topic_ids[llm_result.topic],
+                "keywords": llm_result.keywords,
+                "source_url": capture.url or "",
+                "original_text": capture.text
+            })
+        results = save_notes_to_db(notes)
+
+        if SYNC_TO_NOTION:
+            current_workspace().notion_outbox.enqueue([note_id for note_id, created in results if created])
+
+        for i, llm_result, (note_id, created) in zip(new_indexes, llm_results, results):
+            data[i] = {
+                "note_id": note_id,
+                "subject": llm_result.subject,
+                "topic": llm_result.topic,
+                "keywords": llm_result.keywords,
+                "notion_sync": "pending" if SYNC_TO_NOTION else "disabled"
+            } if created else duplicate_note_data(note_id)
+        for i, capture in enumerate(captures):
+            if data[i] is None:
+                first = data[first_in_batch[content_hash(capture.text, capture.url or "")]]
+                data[i] = {**first, "duplicate": True}
+
+        saved = sum(created for _, created in results)
+        log.info("✅ Batch capture saved", saved=saved, captures=len(captures))
+        return {"success": True, "message": f"Saved {saved} notes", "data": data}
+
+    except Exception as e:
+        log.exception("❌ Capture failed", error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/capture")
-def capture_text(request: CaptureRequest):
+def capture_text(request: CaptureRequest, mode: Optional[str] = None):
     """
     Main endpoint: Capture highlighted text and save to database.
     
@@ -647,25 +2376,42 @@ def capture_text(request: CaptureRequest):
     2. Call LLM to classify the text (determine subject and topic)
     3. Save original text to SQLite database (no summarization)
     4. Optionally sync to Notion with hierarchical organization
+
+    With mode=async (or CAPTURE_MODE=async) the text is stored right away and
+    steps 1, 2 and 4 run on a background worker; poll /notes/{id}/status.
     """
     
+    # Same text already saved (e.g. a double-clicked Capture button): return it without classifying or syncing
+    existing_id = find_duplicate_note(request.text, request.url or "")
+    if existing_id is not None:
+        return duplicate_capture_response(existing_id)
+
+    if (mode or CAPTURE_MODE) == "async":
+        try:
+            note_id = enqueue_capture(request)
+        except DuplicateNoteError as e:
+            return duplicate_capture_response(e.note_id)
+        return JSONResponse(status_code=202, content={
+            "success": True,
+            "message": "Note saved, classification queued",
+            "data": {
+                "note_id": note_id,
+                "status": "queued",
+                "status_url": f"/notes/{note_id}/status",
+                "topic": PENDING_TOPIC,
+                "saved_to_db": True,
+                "synced_to_notion": False
+            }
+        })
+
     try:
-        # Step 1: Fetch existing topics from database
-        print("📚 Fetching existing topics from database...")
-        existing_topics = get_all_topics()
-        topic_names = [t["name"] for t in existing_topics]
-        print(f"Found {len(existing_topics)} existing topics")
-        
-        # Step 2: Call LLM for classification
-        print("🤖 Calling LLM for text analysis...")
-        llm_result = call_llm_for_classification(request.text, topic_names)
-        print(f"LLM Result: {llm_result}")
+        # Steps 1-2: Classify against existing topics
+        llm_result = classify_text(request.text)
         
         # Step 3: Get or create topic in database
         topic_id = get_or_create_topic(llm_result.topic, llm_result.subject)
         
         # Step 4: Save to SQLite database (original text stored as-is)
-        print("💾 Saving to SQLite database...")
         title = request.pageTitle or f"{llm_result.subject} - {llm_result.topic}"
         
         note_id = save_note_to_db(
@@ -676,14 +2422,11 @@ def capture_text(request: CaptureRequest):
             original_text=request.text
         )
         
-        # Step 5: Optionally sync to Notion
-        notion_url = ""
+        # Step 5: Optionally sync to Notion (queued; the outbox worker pushes it)
         if SYNC_TO_NOTION:
-            print("📤 Syncing to Notion...")
-            notion_result = sync_note_to_notion(note_id)
-            notion_url = notion_result.get("url", "")
+            current_workspace().notion_outbox.enqueue([note_id])
         
-        print(f"✅ Successfully saved note #{note_id}")
+        log.info("✅ Capture saved", note_id=note_id, subject=llm_result.subject, topic=llm_result.topic)
         
         # Return success response
         return {
@@ -694,19 +2437,198 @@ def capture_text(request: CaptureRequest):
                 "subject": llm_result.subject,
                 "topic": llm_result.topic,
                 "keywords": llm_result.keywords,
-                "notion_url": notion_url,
+                "notion_url": "",
                 "saved_to_db": True,
-                "synced_to_notion": SYNC_TO_NOTION and notion_url != ""
+                "synced_to_notion": False,
+                "notion_sync": "pending" if SYNC_TO_NOTION else "disabled",
+                "status_url": f"/notes/{note_id}/status"
             }
         }
-        
+
+    except DuplicateNoteError as e:
+        # A concurrent capture of the same text was saved first
+        return duplicate_capture_response(e.note_id)
     except Exception as e:
-        print(f"❌ Error: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("❌ Capture failed", error=str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# "subject"/"topic" string values, found in partial LLM output once their closing quote has arrived
+_PARTIAL_FIELD_RE = {
+    field: re.compile(rf'"{field}"\s*:\s*"((?:[^"\\]|\\.)*)"') for field in ("subject", "topic")
+}
+
+
+def capture_stream_events(request: CaptureRequest):
+    """
+    Run a capture on its own thread and yield its progress as NDJSON lines.
+
+    Events: stored, classifying, token (raw LLM output as it's generated),
+    partial (subject/topic parsed before the model finishes), classified,
+    syncing, synced / sync_failed / sync_pending, then done with the same
+    data /capture returns. duplicate and failed end the stream early.
+    """
+    events: "queue.Queue[Optional[dict]]" = queue.Queue()
+    classified = threading.Event()
+
+    def emit(event: str, **data):
+        if event == "classified":
+            classified.set()
+        events.put({"event": event, **data})
+
+    def run():
+        try:
+            existing_id = find_duplicate_note(request.text, request.url or "")
+            if existing_id is None:
+                try:
+                    note_id = save_pending_note(request.text, request.url or "", request.pageTitle or "")
+                except DuplicateNoteError as e:
+                    existing_id = e.note_id
+            if existing_id is not None:
+                log.info("🔁 Duplicate capture, returning saved note", note_id=existing_id)
+                emit("duplicate", data={**duplicate_note_data(existing_id), "saved_to_db": True})
+                return
+            emit("stored", note_id=note_id)
+
+            output = []
+            partial = {}
+
+            def on_token(chunk: str):
+                # A timed-out LLM call keeps streaming after the fallback result is used
+                if classified.is_set() or not chunk:
+                    return
+                emit("token", text=chunk)
+                if len(partial) == len(_PARTIAL_FIELD_RE):
+                    return
+                output.append(chunk)
+                text = "".join(output)
+                for field, pattern in _PARTIAL_FIELD_RE.items():
+                    match = pattern.search(text)
+                    if match and field not in partial:
+                        partial[field] = json.loads(f'"{match.group(1)}"')
+                if len(partial) == len(_PARTIAL_FIELD_RE):
+                    emit("partial", **partial)
+
+            llm_result = process_capture_job(note_id, on_event=emit, on_token=on_token)
+            if llm_result is None:
+                return
+
+            sync = None
+            if SYNC_TO_NOTION:
+                deadline = time.monotonic() + CAPTURE_STREAM_SYNC_WAIT
+                while time.monotonic() < deadline:
+                    sync = current_workspace().notion_outbox.get(note_id)
+                    if sync and sync["status"] in ("done", "failed"):
+                        break
+                    time.sleep(0.25)
+                if sync and sync["status"] == "done":
+                    emit("synced", notion_url=sync["notion_url"] or "")
+                elif sync and sync["status"] == "failed":
+                    emit("sync_failed", error=sync["last_error"])
+                else:
+                    emit("sync_pending", status_url=f"/notes/{note_id}/status")
+
+            emit("done", data={
+                "note_id": note_id,
+                "subject": llm_result.subject,
+                "topic": llm_result.topic,
+                "keywords": llm_result.keywords,
+                "notion_url": (sync or {}).get("notion_url") or "",
+                "saved_to_db": True,
+                "synced_to_notion": bool(sync and sync["status"] == "done"),
+                "notion_sync": sync["status"] if sync else ("pending" if SYNC_TO_NOTION else "disabled"),
+                "status_url": f"/notes/{note_id}/status"
+            })
+        except Exception as e:
+            log.exception("❌ Streaming capture failed", error=str(e))
+            emit("failed", error=str(e))
+        finally:
+            events.put(None)
+
+    # The capture finishes even if the client disconnects; only the events are dropped
+    # copy_context keeps the request id on the capture's log lines
+    threading.Thread(target=contextvars.copy_context().run, args=(run,), name="capture-stream", daemon=True).start()
+    while True:
+        event = events.get()
+        if event is None:
+            return
+        yield json.dumps(event) + "\n"
+
+
+@app.post("/capture/stream")
+def capture_stream(request: CaptureRequest):
+    """
+    Capture like /capture, streaming progress as NDJSON (one JSON event per line).
+
+    The note is stored before classification starts, so a dropped connection
+    leaves a capture job that the workers pick up again on restart.
+    """
+    return StreamingResponse(
+        capture_stream_events(request),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/export")
+def export_notes():
+    """Stream every note (with subject, topic and keywords) as NDJSON"""
+    filename = f"study-notes-{datetime.now().strftime('%Y%m%d-%H%M%S')}.ndjson"
+    return StreamingResponse(
+        export_notes_ndjson(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@app.post("/import")
+async def import_notes(request: Request, reclassify: bool = False, sync: bool = False):
+    """
+    Import notes from a JSONL/NDJSON body (the /export format; only
+    `original_text`, or `text`, is required per line).
+
+    The body is read as a stream and inserted in transactions of
+    IMPORT_BATCH_SIZE notes. With reclassify=true notes are classified again
+    instead of keeping their subject/topic; with sync=true imported notes
+    are queued for Notion.
+    """
+    totals = {"lines": 0, "imported": 0, "duplicates": 0, "errors": 0}
+    errors = []
+    batch: List[dict] = []
+
+    def add_line(line: bytes):
+        if not line.strip():
+            return
+        totals["lines"] += 1
+        try:
+            batch.append(parse_import_record(line))
+        except ValueError as e:
+            totals["errors"] += 1
+            if len(errors) < 100:
+                errors.append({"line": totals["lines"], "error": str(e)})
+
+    async def flush():
+        if batch:
+            result = await run_in_threadpool(import_notes_batch, list(batch), reclassify, sync)
+            totals["imported"] += result["imported"]
+            totals["duplicates"] += result["duplicates"]
+            batch.clear()
+
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            add_line(line)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                await flush()
+    add_line(buffer)
+    await flush()
+
+    log.info("📥 Import finished", imported=totals["imported"], duplicates=totals["duplicates"], errors=totals["errors"])
+    return {"success": True, **totals, "error_details": errors}
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
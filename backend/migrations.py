@@ -0,0 +1,334 @@
+"""
+Versioned schema migrations for the Study Assistant backend.
+
+The schema version lives in SQLite's `PRAGMA user_version`. On startup every
+migration newer than the database is applied in order, each inside its own
+transaction together with the version bump, so a failed migration leaves the
+database at the previous version. A database newer than this code is refused
+rather than used with a schema the code doesn't understand.
+
+Migrations only change the schema and must stay fast (new tables, indexes,
+triggers, FTS tables). Filling them from existing rows is done afterwards by
+batched online backfills (see note_search.py and note_keywords.py), so
+startup never waits on a long data rewrite.
+
+To change the schema, append a migration with the next version number; never
+edit one that has shipped. `CREATE ... IF NOT EXISTS` is used throughout
+because databases created before versioning (user_version 0) may already
+have some of these objects.
+"""
+
+import sqlite3
+from typing import Callable, List, NamedTuple, Union
+
+from instrumentation import StructuredLogger
+
+log = StructuredLogger("study_assistant.migrations")
+
+
+class SchemaVersionError(RuntimeError):
+    """The database was migrated by a newer version of the app"""
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    # SQL statements run in order, or a callable taking the connection
+    steps: Union[List[str], Callable[[sqlite3.Connection], None]]
+
+
+def _add_content_hash(conn: sqlite3.Connection):
+    # schema.sql already has the column, so only add it where it's missing
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(summaries)")]
+    if "content_hash" not in columns:
+        conn.execute("ALTER TABLE summaries ADD COLUMN content_hash TEXT")
+    # NULL (dedup off, or an older duplicate) never conflicts
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_summaries_content_hash ON summaries(content_hash)")
+
+
+# Search triggers use only built-in SQL, so any writer (sqlite3 CLI, scripts,
+# restores) can change `summaries`. A compressed body (BLOB) can't be read in
+# SQL: the insert trigger indexes it as '' and the app fills in the text (see
+# main.insert_note); the search backfill also decodes it. Compressing a body in
+# place leaves its indexed text alone.
+_FTS_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS summaries_fts_insert",
+    "DROP TRIGGER IF EXISTS summaries_fts_update",
+    """
+    CREATE TRIGGER summaries_fts_insert AFTER INSERT ON summaries BEGIN
+        INSERT INTO notes_fts (rowid, title, original_text, keywords)
+        VALUES (new.id, new.title,
+                CASE WHEN typeof(new.original_text) = 'text' THEN new.original_text ELSE '' END,
+                COALESCE(new.keywords, ''));
+    END
+    """,
+    """
+    CREATE TRIGGER summaries_fts_update AFTER UPDATE OF title, original_text, keywords ON summaries
+    WHEN old.title IS NOT new.title OR old.keywords IS NOT new.keywords
+        OR (typeof(new.original_text) = 'text' AND old.original_text IS NOT new.original_text)
+    BEGIN
+        UPDATE notes_fts SET
+            title = new.title,
+            original_text = CASE WHEN typeof(new.original_text) = 'text'
+                                 THEN new.original_text ELSE original_text END,
+            keywords = COALESCE(new.keywords, '')
+        WHERE rowid = old.id;
+    END
+    """,
+]
+
+# notes_fts without its own copy of every body (content=''). A contentless row
+# can only be removed by replaying the values it was indexed with, so the
+# triggers handle notes whose bodies are plain text before and after the
+# change, and only rows that are already indexed (the search backfill adds the
+# rest). Compressed bodies are indexed and unindexed by the app (see
+# note_search.index_note); compressing a body in place leaves its row alone.
+# Other clients changing a compressed note leave its row stale, never an error.
+_CONTENTLESS_FTS = [
+    "DROP TRIGGER IF EXISTS summaries_fts_insert",
+    "DROP TRIGGER IF EXISTS summaries_fts_update",
+    "DROP TRIGGER IF EXISTS summaries_fts_delete",
+    "DROP TABLE IF EXISTS notes_fts",
+    """
+    CREATE VIRTUAL TABLE notes_fts USING fts5(
+        title, original_text, keywords,
+        content = '',
+        tokenize = 'porter unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER summaries_fts_insert AFTER INSERT ON summaries
+    WHEN typeof(new.original_text) = 'text'
+    BEGIN
+        INSERT INTO notes_fts (rowid, title, original_text, keywords)
+        VALUES (new.id, new.title, new.original_text, COALESCE(new.keywords, ''));
+    END
+    """,
+    """
+    CREATE TRIGGER summaries_fts_delete AFTER DELETE ON summaries
+    WHEN typeof(old.original_text) = 'text' AND EXISTS (SELECT 1 FROM notes_fts WHERE rowid = old.id)
+    BEGIN
+        INSERT INTO notes_fts (notes_fts, rowid, title, original_text, keywords)
+        VALUES ('delete', old.id, old.title, old.original_text, COALESCE(old.keywords, ''));
+    END
+    """,
+    """
+    CREATE TRIGGER summaries_fts_update AFTER UPDATE OF title, original_text, keywords ON summaries
+    WHEN typeof(old.original_text) = 'text' AND typeof(new.original_text) = 'text'
+        AND (old.title IS NOT new.title OR old.keywords IS NOT new.keywords
+             OR old.original_text IS NOT new.original_text)
+        AND EXISTS (SELECT 1 FROM notes_fts WHERE rowid = old.id)
+    BEGIN
+        INSERT INTO notes_fts (notes_fts, rowid, title, original_text, keywords)
+        VALUES ('delete', old.id, old.title, old.original_text, COALESCE(old.keywords, ''));
+        INSERT INTO notes_fts (rowid, title, original_text, keywords)
+        VALUES (new.id, new.title, new.original_text, COALESCE(new.keywords, ''));
+    END
+    """,
+]
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "base topics and summaries tables", [
+        """
+        CREATE TABLE IF NOT EXISTS topics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            subject TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS summaries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            topic_id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            original_text TEXT NOT NULL,
+            summary_text TEXT NOT NULL,
+            keywords TEXT,          -- comma-separated for simplicity
+            source_url TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (topic_id) REFERENCES topics(id)
+        )
+        """,
+    ]),
+    Migration(2, "capture_jobs for async captures", [
+        """
+        CREATE TABLE IF NOT EXISTS capture_jobs (
+            note_id INTEGER PRIMARY KEY,
+            status TEXT NOT NULL DEFAULT 'queued',  -- queued, classifying, syncing, done, failed
+            page_title TEXT,
+            error TEXT,
+            notion_url TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (note_id) REFERENCES summaries(id)
+        )
+        """,
+    ]),
+    Migration(3, "classification_cache", [
+        """
+        CREATE TABLE IF NOT EXISTS classification_cache (
+            cache_key TEXT PRIMARY KEY,  -- sha256 of model + topic-set version + normalised text
+            result TEXT NOT NULL,        -- LLMResponse as JSON
+            created_at REAL NOT NULL     -- unix time, for TTL expiry
+        )
+        """,
+    ]),
+    Migration(4, "topic_embeddings for the topic index", [
+        """
+        CREATE TABLE IF NOT EXISTS topic_embeddings (
+            topic_id INTEGER PRIMARY KEY,
+            model TEXT NOT NULL,         -- embedding model that produced the vector
+            embedding BLOB NOT NULL,     -- L2-normalised float32 array
+            FOREIGN KEY (topic_id) REFERENCES topics(id)
+        )
+        """,
+    ]),
+    Migration(5, "notion_pages cache of category page ids", [
+        """
+        CREATE TABLE IF NOT EXISTS notion_pages (
+            parent_id TEXT NOT NULL,     -- Notion database/page the category lives under
+            title TEXT NOT NULL,         -- Subject or Topic name
+            page_id TEXT NOT NULL,
+            PRIMARY KEY (parent_id, title)
+        )
+        """,
+    ]),
+    Migration(6, "notion_outbox for durable Notion sync", [
+        """
+        CREATE TABLE IF NOT EXISTS notion_outbox (
+            note_id INTEGER PRIMARY KEY,
+            status TEXT NOT NULL DEFAULT 'pending',  -- pending, in_flight, done, failed
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL DEFAULT 0,  -- unix time the row is next due
+            last_error TEXT,
+            notion_page_id TEXT,
+            notion_url TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (note_id) REFERENCES summaries(id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_notion_outbox_due ON notion_outbox(status, next_attempt_at)",
+    ]),
+    Migration(7, "notes_fts full-text index and its sync triggers", [
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+            title, original_text, keywords,
+            tokenize = 'porter unicode61 remove_diacritics 2'
+        )
+        """,
+        # Keep the search index in step with summaries (rowid = summaries.id)
+        """
+        CREATE TRIGGER IF NOT EXISTS summaries_fts_insert AFTER INSERT ON summaries BEGIN
+            INSERT INTO notes_fts (rowid, title, original_text, keywords)
+            VALUES (new.id, new.title, new.original_text, COALESCE(new.keywords, ''));
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS summaries_fts_delete AFTER DELETE ON summaries BEGIN
+            DELETE FROM notes_fts WHERE rowid = old.id;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS summaries_fts_update AFTER UPDATE OF title, original_text, keywords ON summaries BEGIN
+            DELETE FROM notes_fts WHERE rowid = old.id;
+            INSERT INTO notes_fts (rowid, title, original_text, keywords)
+            VALUES (new.id, new.title, new.original_text, COALESCE(new.keywords, ''));
+        END
+        """,
+    ]),
+    Migration(8, "note_keywords normalised keyword table", [
+        """
+        CREATE TABLE IF NOT EXISTS note_keywords (
+            keyword TEXT NOT NULL,       -- lowercase, trimmed; one row per distinct keyword of a note
+            note_id INTEGER NOT NULL,
+            PRIMARY KEY (keyword, note_id),
+            FOREIGN KEY (note_id) REFERENCES summaries(id)
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_note_keywords_note ON note_keywords(note_id, keyword)",
+        """
+        CREATE TRIGGER IF NOT EXISTS summaries_keywords_delete AFTER DELETE ON summaries BEGIN
+            DELETE FROM note_keywords WHERE note_id = old.id;
+        END
+        """,
+    ]),
+    Migration(9, "indexes for /notes keyset pagination and filters", [
+        # Newest-first scan (covering for the page columns) and per-topic pages / topic joins
+        "CREATE INDEX IF NOT EXISTS idx_summaries_created ON summaries(created_at, id, topic_id, title)",
+        "CREATE INDEX IF NOT EXISTS idx_summaries_topic ON summaries(topic_id, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_topics_subject ON topics(subject)",
+    ]),
+    Migration(10, "content_hash unique index for capture dedup", _add_content_hash),
+    # summary_text is no longer written; old copies are emptied by a background job (main.compact_note_storage)
+    Migration(11, "compression-aware search triggers", _FTS_TRIGGERS),
+    Migration(12, "topic_aliases mapping topic name variants to canonical topics", [
+        """
+        CREATE TABLE IF NOT EXISTS topic_aliases (
+            alias TEXT PRIMARY KEY,      -- normalised name (see topic_canonicalizer.topic_key)
+            topic_id INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (topic_id) REFERENCES topics(id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_topic_aliases_topic ON topic_aliases(topic_id)",
+    ]),
+    # Databases that ran an earlier migration 11 have triggers calling the app-only note_text()
+    Migration(13, "search triggers without app-only SQL functions", _FTS_TRIGGERS),
+    # The search backfill re-indexes every note afterwards, in the background
+    Migration(14, "contentless notes_fts", _CONTENTLESS_FTS),
+    Migration(15, "app_meta for background job bookkeeping", [
+        """
+        CREATE TABLE IF NOT EXISTS app_meta (
+            key TEXT PRIMARY KEY,        -- e.g. which one-off storage passes have finished
+            value TEXT NOT NULL
+        )
+        """,
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> List[int]:
+    """
+    Apply pending migrations; returns the versions applied.
+
+    Raises SchemaVersionError if the database is newer than LATEST_VERSION.
+    """
+    version = get_schema_version(conn)
+    if version > LATEST_VERSION:
+        raise SchemaVersionError(
+            f"Database schema is version {version} but this app only knows up to {LATEST_VERSION}; "
+            f"upgrade the app instead of running it against this database"
+        )
+
+    applied = []
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        # IMMEDIATE takes the write lock up front; re-check the version under it
+        # in case another process migrated while we were waiting
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if get_schema_version(conn) >= migration.version:
+                conn.rollback()
+                continue
+            if callable(migration.steps):
+                migration.steps(conn)
+            else:
+                for statement in migration.steps:
+                    conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {int(migration.version)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        log.info("🗄️ Applied migration", version=migration.version, description=migration.description)
+        applied.append(migration.version)
+    return applied
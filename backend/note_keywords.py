@@ -0,0 +1,159 @@
+"""
+Keyword index for the Study Assistant backend.
+
+`summaries.keywords` keeps the comma-separated string the LLM produced (it is
+what the API and Notion show), and every note's keywords are also stored one
+row per keyword in `note_keywords`, normalised and deduplicated. Its primary
+key (keyword, note_id) makes "notes with keyword X" an index range scan and
+keyword counts an index-only GROUP BY.
+"""
+
+import re
+import sqlite3
+import time
+from typing import Callable, List, Optional
+
+from instrumentation import StructuredLogger
+
+log = StructuredLogger("study_assistant.note_keywords")
+
+MAX_KEYWORD_LENGTH = 64
+
+
+def normalize_keywords(keywords: Optional[str]) -> List[str]:
+    """Split a comma-separated string into lowercase, trimmed, unique keywords (first occurrence wins)"""
+    result: List[str] = []
+    for raw in (keywords or "").split(","):
+        keyword = re.sub(r"\s+", " ", raw).strip(" \t\"'.;:!?()[]{}").lower()
+        if keyword and len(keyword) <= MAX_KEYWORD_LENGTH and keyword not in result:
+            result.append(keyword)
+    return result
+
+
+def set_note_keywords(conn: sqlite3.Connection, note_id: int, keywords: Optional[str]):
+    """Replace a note's keyword rows; runs in the caller's transaction"""
+    conn.execute("DELETE FROM note_keywords WHERE note_id = ?", (note_id,))
+    conn.executemany(
+        "INSERT OR IGNORE INTO note_keywords (keyword, note_id) VALUES (?, ?)",
+        [(keyword, note_id) for keyword in normalize_keywords(keywords)]
+    )
+
+
+def _topic_filters(subject: Optional[str], topic: Optional[str]) -> tuple:
+    sql, params = "", []
+    if subject:
+        sql += " AND t.subject = ?"
+        params.append(subject)
+    if topic:
+        sql += " AND t.name = ?"
+        params.append(topic)
+    return sql, params
+
+
+class KeywordIndex:
+    """Keyword counts and keyword → notes lookups over `note_keywords`"""
+
+    def __init__(self, get_db: Callable, migrate_batch: int = 1000):
+        self.get_db = get_db
+        self.migrate_batch = migrate_batch
+
+    def migrate(self, pause: float = 0.01) -> int:
+        """
+        Fill `note_keywords` from `summaries.keywords` for notes that have no
+        keyword rows yet, in short batches so captures keep writing (run it in
+        the background). Safe to re-run; returns notes migrated.
+        """
+        migrated = 0
+        last_id = 0
+        while True:
+            with self.get_db() as conn:
+                rows = conn.execute("""
+                    SELECT s.id, s.keywords FROM summaries s
+                    WHERE s.id > ? AND COALESCE(s.keywords, '') != ''
+                      AND NOT EXISTS (SELECT 1 FROM note_keywords nk WHERE nk.note_id = s.id)
+                    ORDER BY s.id
+                    LIMIT ?
+                """, (last_id, self.migrate_batch)).fetchall()
+                if not rows:
+                    break
+                for note_id, keywords in rows:
+                    set_note_keywords(conn, note_id, keywords)
+                conn.commit()
+            migrated += len(rows)
+            last_id = rows[-1][0]
+            time.sleep(pause)
+        if migrated:
+            log.info("🏷️ Migrated keywords into note_keywords", notes=migrated)
+        return migrated
+
+    def counts(self, subject: Optional[str] = None, topic: Optional[str] = None,
+               prefix: Optional[str] = None, limit: int = 50) -> List[dict]:
+        """Most used keywords with their note counts, optionally within a subject/topic or by prefix"""
+        prefix_sql, params = "", []
+        if prefix:
+            # Range on the primary key instead of LIKE so the index is used
+            prefix = prefix.strip().lower()
+            prefix_sql = " AND nk.keyword >= ? AND nk.keyword < ?"
+            params += [prefix, prefix + "\U0010ffff"]
+
+        with self.get_db() as conn:
+            if subject or topic:
+                filters, filter_params = _topic_filters(subject, topic)
+                rows = conn.execute(f"""
+                    SELECT nk.keyword, COUNT(*) AS count
+                    FROM topics t
+                    JOIN summaries s ON s.topic_id = t.id
+                    JOIN note_keywords nk ON nk.note_id = s.id
+                    WHERE 1 = 1{filters}{prefix_sql}
+                    GROUP BY nk.keyword
+                    ORDER BY count DESC, nk.keyword
+                    LIMIT ?
+                """, [*filter_params, *params, limit]).fetchall()
+            else:
+                rows = conn.execute(f"""
+                    SELECT nk.keyword, COUNT(*) AS count
+                    FROM note_keywords nk
+                    WHERE 1 = 1{prefix_sql}
+                    GROUP BY nk.keyword
+                    ORDER BY count DESC, nk.keyword
+                    LIMIT ?
+                """, [*params, limit]).fetchall()
+        return [{"keyword": row["keyword"], "count": row["count"]} for row in rows]
+
+    def notes(self, keyword: str, subject: Optional[str] = None, topic: Optional[str] = None,
+              limit: int = 50, offset: int = 0) -> dict:
+        """Notes tagged with `keyword` (newest first) plus their per-subject and per-topic counts"""
+        keyword = (normalize_keywords(keyword) or [""])[0]
+        filters, filter_params = _topic_filters(subject, topic)
+        with self.get_db() as conn:
+            rows = conn.execute(f"""
+                SELECT s.id, s.title, s.created_at, t.name AS topic, t.subject
+                FROM note_keywords nk
+                JOIN summaries s ON s.id = nk.note_id
+                JOIN topics t ON t.id = s.topic_id
+                WHERE nk.keyword = ?{filters}
+                ORDER BY nk.note_id DESC
+                LIMIT ? OFFSET ?
+            """, [keyword, *filter_params, limit, offset]).fetchall()
+            facets = conn.execute("""
+                SELECT t.subject, t.name AS topic, COUNT(*) AS count
+                FROM note_keywords nk
+                JOIN summaries s ON s.id = nk.note_id
+                JOIN topics t ON t.id = s.topic_id
+                WHERE nk.keyword = ?
+                GROUP BY t.id
+            """, (keyword,)).fetchall()
+
+        subjects: dict = {}
+        for row in facets:
+            subjects[row["subject"]] = subjects.get(row["subject"], 0) + row["count"]
+        return {
+            "keyword": keyword,
+            "total": sum(row["count"] for row in facets),
+            "subjects": [{"subject": s, "count": c} for s, c in sorted(subjects.items(), key=lambda i: -i[1])],
+            "topics": sorted(
+                ({"subject": row["subject"], "topic": row["topic"], "count": row["count"]} for row in facets),
+                key=lambda f: -f["count"]
+            ),
+            "notes": [dict(row) for row in rows],
+        }
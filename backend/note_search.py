@@ -0,0 +1,238 @@
+"""
+Full-text search over notes for the Study Assistant backend.
+
+Note titles, text and keywords are indexed in the `notes_fts` FTS5 table.
+It is contentless: it keeps only the index, not another copy of every body,
+so compressed notes stay small on disk. Results are ranked with bm25 (title
+and keyword hits weigh more than body hits) and come with a highlighted
+snippet built here from the decoded body.
+
+Removing a row from a contentless index needs the exact values it was
+indexed with. Triggers on `summaries` do that for plain-text bodies; for
+compressed bodies (which SQL can't decode) the app calls index_note() and
+unindex_note() itself.
+"""
+
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Callable, List, Optional
+
+from instrumentation import StructuredLogger
+from text_codec import decode_text
+
+log = StructuredLogger("study_assistant.note_search")
+
+# bm25 column weights for (title, original_text, keywords)
+BM25_WEIGHTS = (10.0, 1.0, 5.0)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def build_match_query(q: str) -> str:
+    """
+    Turn free text into a safe FTS5 query.
+
+    Every word must match (implicit AND) and the last word also matches as a
+    prefix, so partial input like "photosyn" finds "photosynthesis". FTS5
+    operators in the input are treated as plain words.
+    """
+    tokens = _TOKEN_RE.findall(q)
+    if not tokens:
+        return ""
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def index_note(conn: sqlite3.Connection, note_id: int, title: str, text: str, keywords: Optional[str]):
+    """Add a note to `notes_fts` with its decoded body; runs in the caller's transaction"""
+    conn.execute(
+        "INSERT INTO notes_fts (rowid, title, original_text, keywords) VALUES (?, ?, ?, ?)",
+        (note_id, title, text, keywords or "")
+    )
+
+
+def unindex_note(conn: sqlite3.Connection, note_id: int, title: str, text: str, keywords: Optional[str]) -> bool:
+    """
+    Remove a note from `notes_fts`, given the values it was indexed with;
+    returns False if it wasn't indexed (e.g. the backfill hasn't reached it)
+    """
+    if conn.execute("SELECT 1 FROM notes_fts WHERE rowid = ?", (note_id,)).fetchone() is None:
+        return False
+    conn.execute(
+        "INSERT INTO notes_fts (notes_fts, rowid, title, original_text, keywords) VALUES ('delete', ?, ?, ?, ?)",
+        (note_id, title, text, keywords or "")
+    )
+    return True
+
+
+def _fold(word: str) -> str:
+    """Lowercase without diacritics, like the unicode61 tokenizer"""
+    return "".join(c for c in unicodedata.normalize("NFKD", word) if not unicodedata.combining(c)).lower()
+
+
+_SUFFIXES = ("ational", "ations", "ation", "ings", "ing", "ies", "ied", "es", "ed", "ly", "s", "y", "e")
+
+
+def _stem(word: str) -> str:
+    """Rough stand-in for the porter stemmer, only used to pick words to highlight"""
+    for _ in range(2):  # "studying" -> "study" -> "stud", like "studies"
+        for suffix in _SUFFIXES:
+            if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+                word = word[:-len(suffix)]
+                break
+    return word
+
+
+def make_snippet(text: str, q: str, size: int = 16) -> str:
+    """
+    About `size` words of `text` around the densest cluster of query matches,
+    matches wrapped in <mark> (the start of the text if the body didn't match)
+    """
+    words = list(_TOKEN_RE.finditer(text or ""))
+    if not words:
+        return ""
+    terms = [_fold(token) for token in _TOKEN_RE.findall(q)]
+    stems = [_stem(term) for term in terms]
+
+    def matches(word: str) -> bool:
+        folded = _fold(word)
+        stem = _stem(folded)
+        if terms and folded.startswith(terms[-1]):  # the last word is a prefix query
+            return True
+        return any(stem == s or (len(s) >= 3 and stem.startswith(s) and len(stem) - len(s) <= 2) for s in stems)
+
+    hits = [i for i, word in enumerate(words) if matches(word.group())]
+    start = 0
+    if hits:
+        best = -1
+        for hit in hits:
+            candidate = max(0, min(hit - 2, len(words) - size))
+            count = sum(candidate <= h < candidate + size for h in hits)
+            if count > best:
+                start, best = candidate, count
+    end = min(len(words), start + size)
+
+    hit_set = set(hits)
+    parts = ["…"] if start > 0 else []
+    position = words[start].start()
+    for i in range(start, end):
+        word = words[i]
+        parts.append(text[position:word.start()])
+        parts.append(f"<mark>{word.group()}</mark>" if i in hit_set else word.group())
+        position = word.end()
+    if end < len(words):
+        parts.append("…")
+    return "".join(parts)
+
+
+class NoteSearch:
+    """Searches `notes_fts` and backfills it for notes created before the index existed"""
+
+    def __init__(self, get_db: Callable, backfill_batch: int = 500):
+        self.get_db = get_db
+        self.backfill_batch = backfill_batch
+        self.backfill_running = False
+        self.backfilled = 0
+        self._backfill_lock = threading.Lock()
+
+    def search(self, q: str, subject: Optional[str] = None, topic: Optional[str] = None,
+               limit: int = 20, offset: int = 0) -> List[dict]:
+        """Best-ranked notes matching `q`, optionally restricted to a subject and/or topic"""
+        match = build_match_query(q)
+        if not match:
+            return []
+
+        filters = ""
+        params: list = [*BM25_WEIGHTS, match]
+        if subject:
+            filters += " AND t.subject = ?"
+            params.append(subject)
+        if topic:
+            filters += " AND t.name = ?"
+            params.append(topic)
+        params += [limit, offset]
+
+        with self.get_db() as conn:
+            rows = conn.execute(f"""
+                SELECT s.id, s.title, s.original_text, s.source_url, s.created_at, t.name AS topic, t.subject,
+                       bm25(notes_fts, ?, ?, ?) AS score
+                FROM notes_fts
+                JOIN summaries s ON s.id = notes_fts.rowid
+                JOIN topics t ON t.id = s.topic_id
+                WHERE notes_fts MATCH ?{filters}
+                ORDER BY score
+                LIMIT ? OFFSET ?
+            """, params).fetchall()
+
+        return [
+            {
+                "id": row["id"],
+                "title": row["title"],
+                "subject": row["subject"],
+                "topic": row["topic"],
+                "snippet": make_snippet(decode_text(row["original_text"]), q),
+                "score": round(-row["score"], 6),  # bm25 is lower-is-better; flip so higher is better
+                "source_url": row["source_url"],
+                "created_at": row["created_at"],
+            }
+            for row in rows
+        ]
+
+    def needs_backfill(self) -> bool:
+        # Not a count comparison: deleting a compressed note outside the app leaves its index row behind
+        with self.get_db() as conn:
+            return conn.execute("""
+                SELECT 1 FROM summaries s
+                WHERE NOT EXISTS (SELECT 1 FROM notes_fts f WHERE f.rowid = s.id)
+                LIMIT 1
+            """).fetchone() is not None
+
+    def backfill(self, pause: float = 0.01) -> int:
+        """
+        Index notes missing from `notes_fts` in small batches.
+
+        Each batch is its own short transaction, so captures keep writing
+        while an existing database is indexed. Safe to re-run; returns how
+        many notes were added.
+        """
+        if not self._backfill_lock.acquire(blocking=False):
+            return 0
+        self.backfill_running = True
+        self.backfilled = 0
+        try:
+            if not self.needs_backfill():
+                return 0
+            log.info("🔎 Building search index for existing notes")
+            last_id = 0
+            while True:
+                with self.get_db() as conn:
+                    upper = conn.execute(
+                        "SELECT MAX(id) FROM (SELECT id FROM summaries WHERE id > ? ORDER BY id LIMIT ?)",
+                        (last_id, self.backfill_batch)
+                    ).fetchone()[0]
+                    if upper is None:
+                        break
+                    # Notes written meanwhile were indexed by the triggers; skip them
+                    cursor = conn.execute("""
+                        INSERT INTO notes_fts (rowid, title, original_text, keywords)
+                        SELECT s.id, s.title, note_text(s.original_text), COALESCE(s.keywords, '')
+                        FROM summaries s
+                        WHERE s.id > ? AND s.id <= ?
+                          AND NOT EXISTS (SELECT 1 FROM notes_fts f WHERE f.rowid = s.id)
+                    """, (last_id, upper))
+                    conn.commit()
+                self.backfilled += cursor.rowcount
+                last_id = upper
+                time.sleep(pause)  # let waiting writers in between batches
+            log.info("🔎 Search index ready", notes=self.backfilled)
+            return self.backfilled
+        finally:
+            self.backfill_running = False
+            self._backfill_lock.release()
+
+    def stats(self) -> dict:
+        return {"backfill_running": self.backfill_running, "backfilled": self.backfilled}
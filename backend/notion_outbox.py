@@ -0,0 +1,252 @@
+"""
+Durable outbox for Notion sync in the Study Assistant backend.
+
+Captures only record a row in `notion_outbox`; background workers drain it
+in small batches, staying under Notion's rate limit with a token bucket and
+retrying failures with exponential backoff (honouring Retry-After on 429s).
+Rows survive restarts, so a note is never lost just because Notion was slow
+or down when it was captured.
+
+Row states: pending → in_flight → done, or back to pending with a later
+next_attempt_at, or failed after the last attempt / a permanent error.
+"""
+
+import random
+import threading
+import time
+from typing import Callable, List, Optional
+
+import requests
+
+from instrumentation import StructuredLogger, request_context
+
+log = StructuredLogger("study_assistant.notion_outbox")
+
+
+class NotionRateLimitError(Exception):
+    """Notion answered 429; retry_after is the delay it asked for in seconds"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Notion rate limited, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average with bursts up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def is_permanent_error(error: Exception) -> bool:
+    """Client errors (bad payload, missing access) won't succeed on retry; 409 conflicts might"""
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        return 400 <= status < 500 and status not in (409, 429)
+    return False
+
+
+class NotionOutbox:
+    """
+    Drains `notion_outbox` with `workers` threads.
+
+    `sync_note` pushes one note to Notion and returns {"id", "url"}; it should
+    raise on failure. `on_finished(note_id, status, url, error)` is called when
+    a row reaches done or failed.
+    """
+
+    def __init__(self, get_db: Callable, sync_note: Callable[[int], dict],
+                 on_finished: Optional[Callable] = None, workers: int = 1, batch_size: int = 10,
+                 max_attempts: int = 8, base_backoff: float = 2.0, max_backoff: float = 600.0):
+        self.get_db = get_db
+        self.sync_note = sync_note
+        self.on_finished = on_finished
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._claim_lock = threading.Lock()
+
+    def enqueue(self, note_ids: List[int]):
+        """Record notes as pending sync and wake a worker"""
+        if not note_ids:
+            return
+        with self.get_db() as conn:
+            conn.executemany("""
+                INSERT INTO notion_outbox (note_id, status, next_attempt_at)
+                VALUES (?, 'pending', 0)
+                ON CONFLICT(note_id) DO UPDATE SET status = 'pending', attempts = 0, next_attempt_at = 0,
+                    last_error = NULL, updated_at = CURRENT_TIMESTAMP
+            """, [(note_id,) for note_id in note_ids])
+            conn.commit()
+        self._wake.set()
+
+    def _claim_batch(self) -> List[int]:
+        """Atomically move up to batch_size due rows to in_flight"""
+        with self._claim_lock, self.get_db() as conn:
+            rows = conn.execute("""
+                SELECT note_id FROM notion_outbox
+                WHERE status = 'pending' AND next_attempt_at <= ?
+                ORDER BY next_attempt_at, note_id
+                LIMIT ?
+            """, (time.time(), self.batch_size)).fetchall()
+            note_ids = [row[0] for row in rows]
+            conn.executemany(
+                "UPDATE notion_outbox SET status = 'in_flight', updated_at = CURRENT_TIMESTAMP WHERE note_id = ?",
+                [(note_id,) for note_id in note_ids]
+            )
+            conn.commit()
+            return note_ids
+
+    def _backoff(self, attempts: int, error: Exception) -> float:
+        delay = min(self.max_backoff, self.base_backoff * (2 ** (attempts - 1)))
+        delay *= random.uniform(0.8, 1.2)  # jitter so retries don't bunch up
+        if isinstance(error, NotionRateLimitError):
+            delay = max(delay, error.retry_after)
+        return delay
+
+    def _process(self, note_id: int):
+        with request_context(f"notion-{note_id}"):
+            self._sync(note_id)
+
+    def _sync(self, note_id: int):
+        try:
+            page = self.sync_note(note_id)
+        except Exception as e:
+            with self.get_db() as conn:
+                attempts = conn.execute(
+                    "SELECT attempts FROM notion_outbox WHERE note_id = ?", (note_id,)
+                ).fetchone()[0] + 1
+                if attempts >= self.max_attempts or is_permanent_error(e):
+                    conn.execute("""
+                        UPDATE notion_outbox SET status = 'failed', attempts = ?, last_error = ?,
+                            updated_at = CURRENT_TIMESTAMP
+                        WHERE note_id = ?
+                    """, (attempts, str(e), note_id))
+                    conn.commit()
+                    log.error("❌ Notion sync failed", note_id=note_id, attempts=attempts, error=str(e))
+                    if self.on_finished:
+                        self.on_finished(note_id, "failed", "", str(e))
+                    return
+                delay = self._backoff(attempts, e)
+                conn.execute("""
+                    UPDATE notion_outbox SET status = 'pending', attempts = ?, last_error = ?, next_attempt_at = ?,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE note_id = ?
+                """, (attempts, str(e), time.time() + delay, note_id))
+                conn.commit()
+            log.warning("⚠️ Notion sync failed, retrying", note_id=note_id, attempts=attempts,
+                        delay=round(delay, 1), error=str(e))
+            return
+
+        with self.get_db() as conn:
+            conn.execute("""
+                UPDATE notion_outbox SET status = 'done', attempts = attempts + 1, last_error = NULL,
+                    notion_page_id = ?, notion_url = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE note_id = ?
+            """, (page.get("id", ""), page.get("url", ""), note_id))
+            conn.commit()
+        if self.on_finished:
+            self.on_finished(note_id, "done", page.get("url", ""), None)
+
+    def _next_due_in(self) -> float:
+        """Seconds until the earliest pending row is due (capped so new work is noticed)"""
+        with self.get_db() as conn:
+            row = conn.execute(
+                "SELECT MIN(next_attempt_at) FROM notion_outbox WHERE status = 'pending'"
+            ).fetchone()
+        if row[0] is None:
+            return 5.0
+        return min(5.0, max(0.0, row[0] - time.time()))
+
+    def _worker(self):
+        while not self._stopping.is_set():
+            try:
+                note_ids = self._claim_batch()
+                for note_id in note_ids:
+                    if self._stopping.is_set():
+                        break
+                    self._process(note_id)
+                if not note_ids:
+                    self._wake.wait(timeout=self._next_due_in())
+                    self._wake.clear()
+            except Exception as e:
+                log.exception("❌ Notion outbox worker error", error=str(e))
+                time.sleep(1)
+
+    def start(self):
+        """Requeue rows interrupted by a restart and start the workers"""
+        with self.get_db() as conn:
+            conn.execute("UPDATE notion_outbox SET status = 'pending' WHERE status = 'in_flight'")
+            conn.commit()
+        self._stopping.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"notion-outbox-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads.clear()
+
+    def retry_failed(self) -> int:
+        """Move failed rows back to pending; returns how many"""
+        with self.get_db() as conn:
+            cursor = conn.execute("""
+                UPDATE notion_outbox SET status = 'pending', attempts = 0, next_attempt_at = 0,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE status = 'failed'
+            """)
+            conn.commit()
+        self._wake.set()
+        return cursor.rowcount
+
+    def get(self, note_id: int) -> Optional[dict]:
+        with self.get_db() as conn:
+            row = conn.execute("""
+                SELECT note_id, status, attempts, last_error, notion_url, updated_at
+                FROM notion_outbox WHERE note_id = ?
+            """, (note_id,)).fetchone()
+            return dict(row) if row else None
+
+    def stats(self) -> dict:
+        """Queue depth by state plus the oldest pending row's age"""
+        with self.get_db() as conn:
+            counts = dict(conn.execute(
+                "SELECT status, COUNT(*) FROM notion_outbox GROUP BY status"
+            ).fetchall())
+            oldest = conn.execute(
+                "SELECT MIN(created_at) FROM notion_outbox WHERE status IN ('pending', 'in_flight')"
+            ).fetchone()[0]
+        return {
+            "pending": counts.get("pending", 0),
+            "in_flight": counts.get("in_flight", 0),
+            "done": counts.get("done", 0),
+            "failed": counts.get("failed", 0),
+            "oldest_pending_since": oldest,
+            "workers": self.workers,
+        }
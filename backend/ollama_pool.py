@@ -0,0 +1,313 @@
+"""
+Pool of Ollama hosts for the Study Assistant backend.
+
+Classification throughput used to be capped by the single OLLAMA_BASE_URL.
+The pool spreads generations over several hosts:
+- each host has a weight and its own concurrency limit,
+- a call goes to the healthy host with the lowest in-flight/weight load
+  (ties broken by recent latency), waiting if every host is full,
+- a host failing `failure_threshold` calls in a row is taken out until a
+  background health check (GET /api/version) sees it answer again, or until
+  a trial call after `cooldown` seconds succeeds (so hosts come back even
+  with health checks off),
+- a failed call is retried once on each other host before giving up,
+- optionally, a call still running after `hedge_after` seconds is also
+  sent to a second host with a free slot; the first answer wins.
+
+Embedding calls (embed=True) run on Ollama's separate embedding model, so
+they don't take generation slots, and their failures are counted apart: a
+host missing the embedding model stays healthy for classification.
+
+A hedged loser can't be cancelled mid-generation; it keeps its host slot
+until Ollama finishes.
+"""
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from typing import Any, Callable, List, Optional
+
+import requests
+
+from llm_gateway import LLMTimeoutError
+
+
+class OllamaBackend:
+    def __init__(self, url: str, weight: float = 1.0, max_concurrency: int = 2):
+        self.url = url.rstrip("/")
+        self.weight = weight
+        self.max_concurrency = max_concurrency
+        self.client: Any = None  # per-host classifier, created by the pool
+        self.in_flight = 0
+        self.healthy = True
+        self.unhealthy_since = 0.0  # monotonic time it was last marked unhealthy (or failed a trial)
+        self.probing = False  # a trial call is running on this unhealthy host
+        self.consecutive_failures = 0
+        self.last_error: Optional[str] = None
+        self.latency_ewma: Optional[float] = None
+        self.calls = 0
+        self.failures = 0
+        self.hedges_won = 0
+        self.embed_in_flight = 0
+        self.embed_calls = 0
+        self.embed_failures = 0
+        self.embed_consecutive_failures = 0
+
+    def load(self) -> float:
+        return (self.in_flight + 1) / self.weight
+
+
+def parse_backends(spec: str, default_concurrency: int) -> List[OllamaBackend]:
+    """
+    "url[|weight[|max_concurrency]],..." → backends, e.g.
+    "http://gpu:11434|3|6,http://cpu1:11434,http://cpu2:11434|1|1"
+    """
+    backends = []
+    for entry in spec.split(","):
+        if not entry.strip():
+            continue
+        parts = [part.strip() for part in entry.split("|")]
+        weight = float(parts[1]) if len(parts) > 1 and parts[1] else 1.0
+        concurrency = int(parts[2]) if len(parts) > 2 and parts[2] else default_concurrency
+        if weight <= 0 or concurrency <= 0:
+            raise ValueError(f"Ollama backend weight and concurrency must be positive: {entry!r}")
+        backends.append(OllamaBackend(parts[0], weight, concurrency))
+    if not backends:
+        raise ValueError("No Ollama backends configured")
+    return backends
+
+
+class OllamaPool:
+    """Least-loaded routing, failover, health checks and hedging over several Ollama hosts"""
+
+    def __init__(self, backends: List[OllamaBackend], make_client: Callable[[str], Any],
+                 hedge_after: float = 0.0, failure_threshold: int = 3, health_interval: float = 10.0,
+                 timeout: float = 30.0, cooldown: float = 30.0, log: Optional[Callable[..., None]] = None):
+        self.backends = backends
+        self.make_client = make_client
+        self.hedge_after = hedge_after
+        self.failure_threshold = failure_threshold
+        self.health_interval = health_interval
+        self.timeout = timeout
+        self.cooldown = cooldown
+        self.log = log or (lambda msg, **fields: None)
+        for backend in backends:
+            backend.client = make_client(backend.url)
+        self._cond = threading.Condition()
+        # One thread per host slot is enough: every running task holds a slot
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="ollama")
+        self._stop = threading.Event()
+        self._health_thread: Optional[threading.Thread] = None
+        self.hedges = 0
+        self.failovers = 0
+
+    @property
+    def max_concurrency(self) -> int:
+        return sum(backend.max_concurrency for backend in self.backends)
+
+    # ---------- routing ----------
+
+    def _pick(self, exclude: List[OllamaBackend], embed: bool = False) -> Optional[OllamaBackend]:
+        candidates = [b for b in self.backends if b not in exclude]
+        if embed:
+            # No slot limit; prefer hosts whose embedding calls have been working
+            usable = [b for b in candidates
+                      if b.healthy and b.embed_consecutive_failures < self.failure_threshold] \
+                or [b for b in candidates if b.healthy] or candidates
+            return min(usable, key=lambda b: (b.embed_in_flight + 1) / b.weight) if usable else None
+        # Unhealthy hosts get one trial call per cooldown, and are otherwise only
+        # tried when no healthy one is left
+        now = time.monotonic()
+        usable = [b for b in candidates if b.healthy or self._trial_due(b, now)] or candidates
+        free = [b for b in usable if b.in_flight < b.max_concurrency]
+        if not free:
+            return None
+        return min(free, key=lambda b: (b.load(), b.latency_ewma or 0.0))
+
+    def _trial_due(self, backend: OllamaBackend, now: float) -> bool:
+        return not backend.probing and now - backend.unhealthy_since >= self.cooldown
+
+    def _mark_unhealthy(self, backend: OllamaBackend):
+        backend.healthy = False
+        backend.unhealthy_since = time.monotonic()
+
+    def _acquire(self, exclude: List[OllamaBackend], deadline: float, embed: bool = False) -> Optional[OllamaBackend]:
+        """Reserve a slot on the best host, waiting until `deadline` (monotonic) for one to free up"""
+        with self._cond:
+            while True:
+                backend = self._pick(exclude, embed)
+                if backend is not None:
+                    if embed:
+                        backend.embed_in_flight += 1
+                    else:
+                        backend.in_flight += 1
+                        backend.probing = backend.probing or not backend.healthy
+                    return backend
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or len(exclude) >= len(self.backends):
+                    return None
+                self._cond.wait(remaining)
+
+    def _release(self, backend: OllamaBackend, elapsed: float, error: Optional[Exception], embed: bool = False):
+        with self._cond:
+            if embed:
+                backend.embed_in_flight -= 1
+                backend.embed_calls += 1
+                if error is None:
+                    backend.embed_consecutive_failures = 0
+                else:
+                    backend.embed_failures += 1
+                    backend.embed_consecutive_failures += 1
+                return
+            backend.in_flight -= 1
+            backend.calls += 1
+            backend.probing = False
+            if error is None:
+                if not backend.healthy:
+                    self.log("🩺 Ollama host is back", backend=backend.url)
+                backend.consecutive_failures = 0
+                backend.healthy = True
+                backend.latency_ewma = elapsed if backend.latency_ewma is None else \
+                    0.8 * backend.latency_ewma + 0.2 * elapsed
+            else:
+                backend.failures += 1
+                backend.consecutive_failures += 1
+                backend.last_error = str(error)[:200]
+                if not backend.healthy:
+                    backend.unhealthy_since = time.monotonic()  # failed trial: wait another cooldown
+                elif backend.consecutive_failures >= self.failure_threshold:
+                    self._mark_unhealthy(backend)
+                    self.log("🩺 Ollama host marked unhealthy", backend=backend.url, error=backend.last_error)
+            self._cond.notify_all()
+
+    def _run(self, backend: OllamaBackend, fn: Callable[[Any], Any], embed: bool = False):
+        started = time.monotonic()
+        try:
+            result = fn(backend.client)
+        except Exception as e:
+            self._release(backend, time.monotonic() - started, e, embed)
+            raise
+        self._release(backend, time.monotonic() - started, None, embed)
+        return result
+
+    def call(self, fn: Callable[[Any], Any], hedge: bool = True, timeout: Optional[float] = None,
+             can_retry: Optional[Callable[[], bool]] = None, embed: bool = False) -> Any:
+        """
+        fn(client) on the least-loaded host, failing over to the others on error
+        (unless `can_retry` returns False, e.g. once output was streamed).
+        With embed=True the call skips host slots and health accounting (never hedged).
+
+        Raises LLMTimeoutError if no host has a free slot within `timeout`,
+        or the last host's error once every host has failed.
+        """
+        deadline = time.monotonic() + (timeout or self.timeout)
+        tried: List[OllamaBackend] = []
+        while True:
+            backend = self._acquire(tried, deadline, embed)
+            if backend is None:
+                raise LLMTimeoutError(f"No Ollama host had a free slot within {timeout or self.timeout:.1f}s")
+            tried.append(backend)
+            try:
+                if hedge and not embed and self.hedge_after > 0 and len(self.backends) > 1:
+                    return self._call_hedged(backend, fn, tried)
+                return self._run(backend, fn, embed)
+            except Exception as e:
+                if len(tried) >= len(self.backends) or (can_retry and not can_retry()):
+                    raise
+                with self._cond:
+                    self.failovers += 1
+                self.log("🔀 Ollama host failed, trying another", backend=backend.url, error=str(e)[:200])
+
+    def _call_hedged(self, primary: OllamaBackend, fn: Callable[[Any], Any], tried: List[OllamaBackend]):
+        first = self._executor.submit(self._run, primary, fn)
+        try:
+            return first.result(timeout=self.hedge_after)
+        except FutureTimeoutError:
+            pass
+
+        # Only hedge onto a host that's free right now; otherwise keep waiting for the first
+        second_backend = self._acquire(tried, time.monotonic())
+        if second_backend is None:
+            return first.result()
+        tried.append(second_backend)
+        with self._cond:
+            self.hedges += 1
+        self.log("🏁 Hedging slow Ollama call", slow=primary.url, backend=second_backend.url)
+        second = self._executor.submit(self._run, second_backend, fn)
+
+        pending = {first, second}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        with self._cond:
+                            second_backend.hedges_won += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    # ---------- health checks ----------
+
+    def check(self, backend: OllamaBackend):
+        try:
+            response = requests.get(f"{backend.url}/api/version", timeout=min(5.0, self.health_interval or 5.0))
+            response.raise_for_status()
+        except requests.RequestException as e:
+            with self._cond:
+                backend.last_error = str(e)[:200]
+                if backend.healthy:
+                    self._mark_unhealthy(backend)
+                    self.log("🩺 Ollama host failed its health check", backend=backend.url, error=backend.last_error)
+            return
+        with self._cond:
+            if not backend.healthy:
+                self.log("🩺 Ollama host is back", backend=backend.url)
+            backend.healthy = True
+            backend.consecutive_failures = 0
+            self._cond.notify_all()
+
+    def _health_loop(self):
+        while not self._stop.wait(self.health_interval):
+            for backend in self.backends:
+                self.check(backend)
+
+    def start(self):
+        """Start background health checks (no-op with health_interval 0)"""
+        if self.health_interval <= 0 or (self._health_thread and self._health_thread.is_alive()):
+            return
+        self._stop.clear()
+        self._health_thread = threading.Thread(target=self._health_loop, name="ollama-health", daemon=True)
+        self._health_thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._health_thread:
+            self._health_thread.join(timeout=5)
+            self._health_thread = None
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "hedge_after_seconds": self.hedge_after,
+                "hedges": self.hedges,
+                "failovers": self.failovers,
+                "backends": [
+                    {
+                        "url": b.url,
+                        "weight": b.weight,
+                        "max_concurrency": b.max_concurrency,
+                        "healthy": b.healthy,
+                        "in_flight": b.in_flight,
+                        "calls": b.calls,
+                        "failures": b.failures,
+                        "hedges_won": b.hedges_won,
+                        "embed_calls": b.embed_calls,
+                        "embed_failures": b.embed_failures,
+                        "latency_ewma": round(b.latency_ewma, 4) if b.latency_ewma is not None else None,
+                        "last_error": b.last_error,
+                    }
+                    for b in self.backends
+                ],
+            }
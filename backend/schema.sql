@@ -1,3 +1,6 @@
+-- Reference copy of the latest schema (version 15). The server creates and
+-- upgrades the database itself from migrations.py; keep this file in sync.
+
 CREATE TABLE topics (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     name TEXT UNIQUE NOT NULL,
@@ -9,10 +12,135 @@ CREATE TABLE summaries (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     topic_id INTEGER NOT NULL,
     title TEXT NOT NULL,
-    original_text TEXT NOT NULL,
-    summary_text TEXT NOT NULL,
+    original_text TEXT NOT NULL,  -- plain TEXT, or a zlib-compressed BLOB for large bodies
+    summary_text TEXT NOT NULL,   -- unused, always '' (the text is stored once, in original_text)
     keywords TEXT,          -- comma-separated for simplicity
     source_url TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    content_hash TEXT,      -- sha256 of normalised text (+ page URL with DEDUP_SCOPE=url)
     FOREIGN KEY (topic_id) REFERENCES topics(id)
 );
+
+-- Newest-first listing (covers the /notes page columns) and per-topic listing / topic joins
+CREATE INDEX idx_summaries_created ON summaries(created_at, id, topic_id, title);
+CREATE INDEX idx_summaries_topic ON summaries(topic_id, created_at, id);
+CREATE INDEX idx_topics_subject ON topics(subject);
+
+-- One note per content hash; NULL (dedup off, older duplicates) never conflicts
+CREATE UNIQUE INDEX idx_summaries_content_hash ON summaries(content_hash);
+
+-- Background classification/sync state for captures made with mode=async
+CREATE TABLE capture_jobs (
+    note_id INTEGER PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'queued',  -- queued, classifying, syncing, done, failed
+    page_title TEXT,
+    error TEXT,
+    notion_url TEXT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (note_id) REFERENCES summaries(id)
+);
+
+-- Cached LLM classifications, keyed by model + topic-set version + normalised text
+CREATE TABLE classification_cache (
+    cache_key TEXT PRIMARY KEY,
+    result TEXT NOT NULL,        -- LLMResponse as JSON
+    created_at REAL NOT NULL     -- unix time, for TTL expiry
+);
+
+-- Topic name variants (normalised) resolved to a canonical topic
+CREATE TABLE topic_aliases (
+    alias TEXT PRIMARY KEY,
+    topic_id INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (topic_id) REFERENCES topics(id)
+);
+
+CREATE INDEX idx_topic_aliases_topic ON topic_aliases(topic_id);
+
+-- Topic name embeddings for nearest-topic lookup (L2-normalised float32 blobs)
+CREATE TABLE topic_embeddings (
+    topic_id INTEGER PRIMARY KEY,
+    model TEXT NOT NULL,
+    embedding BLOB NOT NULL,
+    FOREIGN KEY (topic_id) REFERENCES topics(id)
+);
+
+-- Notion page ids of Subject/Topic category pages, so syncs skip /v1/search
+CREATE TABLE notion_pages (
+    parent_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    page_id TEXT NOT NULL,
+    PRIMARY KEY (parent_id, title)
+);
+
+-- Durable queue of notes waiting to be pushed to Notion
+CREATE TABLE notion_outbox (
+    note_id INTEGER PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'pending',  -- pending, in_flight, done, failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0, -- unix time the row is next due
+    last_error TEXT,
+    notion_page_id TEXT,
+    notion_url TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (note_id) REFERENCES summaries(id)
+);
+
+CREATE INDEX idx_notion_outbox_due ON notion_outbox(status, next_attempt_at);
+
+-- Full-text index over notes (rowid = summaries.id). Contentless: it keeps
+-- no copy of the bodies, and removing a row replays the indexed values.
+CREATE VIRTUAL TABLE notes_fts USING fts5(
+    title, original_text, keywords,
+    content = '',
+    tokenize = 'porter unicode61 remove_diacritics 2'
+);
+
+-- Built-in SQL only, so any client can write notes. They keep the index in
+-- step for plain-text bodies; the app indexes compressed bodies (BLOBs).
+CREATE TRIGGER summaries_fts_insert AFTER INSERT ON summaries
+WHEN typeof(new.original_text) = 'text'
+BEGIN
+    INSERT INTO notes_fts (rowid, title, original_text, keywords)
+    VALUES (new.id, new.title, new.original_text, COALESCE(new.keywords, ''));
+END;
+
+CREATE TRIGGER summaries_fts_delete AFTER DELETE ON summaries
+WHEN typeof(old.original_text) = 'text' AND EXISTS (SELECT 1 FROM notes_fts WHERE rowid = old.id)
+BEGIN
+    INSERT INTO notes_fts (notes_fts, rowid, title, original_text, keywords)
+    VALUES ('delete', old.id, old.title, old.original_text, COALESCE(old.keywords, ''));
+END;
+
+CREATE TRIGGER summaries_fts_update AFTER UPDATE OF title, original_text, keywords ON summaries
+WHEN typeof(old.original_text) = 'text' AND typeof(new.original_text) = 'text'
+    AND (old.title IS NOT new.title OR old.keywords IS NOT new.keywords
+         OR old.original_text IS NOT new.original_text)
+    AND EXISTS (SELECT 1 FROM notes_fts WHERE rowid = old.id)
+BEGIN
+    INSERT INTO notes_fts (notes_fts, rowid, title, original_text, keywords)
+    VALUES ('delete', old.id, old.title, old.original_text, COALESCE(old.keywords, ''));
+    INSERT INTO notes_fts (rowid, title, original_text, keywords)
+    VALUES (new.id, new.title, new.original_text, COALESCE(new.keywords, ''));
+END;
+
+-- One row per normalised keyword of a note (summaries.keywords keeps the display string)
+CREATE TABLE note_keywords (
+    keyword TEXT NOT NULL,
+    note_id INTEGER NOT NULL,
+    PRIMARY KEY (keyword, note_id),
+    FOREIGN KEY (note_id) REFERENCES summaries(id)
+) WITHOUT ROWID;
+
+CREATE INDEX idx_note_keywords_note ON note_keywords(note_id, keyword);
+
+CREATE TRIGGER summaries_keywords_delete AFTER DELETE ON summaries BEGIN
+    DELETE FROM note_keywords WHERE note_id = old.id;
+END;
+
+-- Small key/value state, e.g. which one-off background storage passes have finished
+CREATE TABLE app_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
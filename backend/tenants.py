@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Tenants for running one Study Assistant backend for many users.
+
+Each tenant has its own SQLite database file, its own Notion credentials
+and an API token the extension sends with every request. The registry of
+tenants lives in a separate small SQLite file; only a SHA-256 hash of each
+token is stored, so the plaintext is shown once when the tenant is created
+(or the token rotated).
+
+TenantCache keeps the most recently used tenants open (connection pool,
+caches, outbox workers) and closes idle ones beyond its size.
+
+Usage:
+    python tenants.py create <name> [notion_api_key] [notion_database_id]
+    python tenants.py list
+    python tenants.py rotate <tenant_id>
+"""
+
+import hashlib
+import os
+import re
+import secrets
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, Generic, List, NamedTuple, Optional, TypeVar
+
+from dotenv import load_dotenv
+
+TOKEN_PREFIX = "sat_"
+
+
+class Tenant(NamedTuple):
+    id: str
+    name: str
+    db_path: str
+    notion_api_key: Optional[str]
+    notion_database_id: Optional[str]
+
+
+def hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def new_token() -> str:
+    return TOKEN_PREFIX + secrets.token_urlsafe(32)
+
+
+def tenant_slug(name: str) -> str:
+    """Filesystem-safe id derived from a display name"""
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")[:40] or "tenant"
+
+
+class TenantRegistry:
+    """
+    Tenants and their token hashes, stored in `path`.
+
+    Authenticated tokens are remembered for `cache_ttl` seconds, so a token
+    rotated from the CLI stops working on a running server within that time.
+    """
+
+    def __init__(self, path: str, data_dir: str, cache_ttl: float = 30.0):
+        self.path = path
+        self.data_dir = data_dir
+        self.cache_ttl = cache_ttl
+        self._lock = threading.Lock()
+        self._by_hash: dict = {}  # token hash -> (Tenant, expiry), so most requests need no query
+        os.makedirs(data_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tenants (
+                    id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    token_hash TEXT NOT NULL UNIQUE,
+                    db_path TEXT NOT NULL,
+                    notion_api_key TEXT,
+                    notion_database_id TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _tenant(row: sqlite3.Row) -> Tenant:
+        return Tenant(row["id"], row["name"], row["db_path"], row["notion_api_key"], row["notion_database_id"])
+
+    def create(self, name: str, notion_api_key: Optional[str] = None,
+               notion_database_id: Optional[str] = None) -> tuple:
+        """Register a tenant with its own database file; returns (tenant, plaintext token)"""
+        token = new_token()
+        base = tenant_slug(name)
+        with self._lock, self._connect() as conn:
+            tenant_id, n = base, 1
+            while conn.execute("SELECT 1 FROM tenants WHERE id = ?", (tenant_id,)).fetchone():
+                n += 1
+                tenant_id = f"{base}-{n}"
+            db_path = os.path.join(self.data_dir, f"{tenant_id}.db")
+            conn.execute(
+                "INSERT INTO tenants (id, name, token_hash, db_path, notion_api_key, notion_database_id) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (tenant_id, name, hash_token(token), db_path, notion_api_key or None, notion_database_id or None)
+            )
+        return Tenant(tenant_id, name, db_path, notion_api_key or None, notion_database_id or None), token
+
+    def rotate_token(self, tenant_id: str) -> Optional[str]:
+        """Replace a tenant's token; the old one stops working (see cache_ttl for other processes)"""
+        token = new_token()
+        with self._lock, self._connect() as conn:
+            cursor = conn.execute("UPDATE tenants SET token_hash = ? WHERE id = ?", (hash_token(token), tenant_id))
+            self._by_hash = {h: entry for h, entry in self._by_hash.items() if entry[0].id != tenant_id}
+        return token if cursor.rowcount else None
+
+    def authenticate(self, token: str) -> Optional[Tenant]:
+        """The tenant owning `token`, or None"""
+        if not token:
+            return None
+        token_hash = hash_token(token)
+        cached = self._by_hash.get(token_hash)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM tenants WHERE token_hash = ?", (token_hash,)).fetchone()
+        if row is None:
+            return None
+        tenant = self._tenant(row)
+        with self._lock:
+            self._by_hash[token_hash] = (tenant, time.monotonic() + self.cache_ttl)
+        return tenant
+
+    def get(self, tenant_id: str) -> Optional[Tenant]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM tenants WHERE id = ?", (tenant_id,)).fetchone()
+        return self._tenant(row) if row else None
+
+    def list(self) -> List[dict]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, name, db_path, notion_database_id, created_at FROM tenants ORDER BY created_at"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+
+T = TypeVar("T")
+
+
+class TenantCache(Generic[T]):
+    """
+    LRU of open tenant workspaces.
+
+    `open(tenant_id)` builds a workspace on a miss. Past `max_size`, the least
+    recently used workspaces for which `is_idle` holds are closed; busy ones
+    stay open (the cache can grow past its size) until they go idle.
+
+    Opening (migrations, backfills) and the idle checks run outside the
+    cache-wide lock, so a cold tenant never holds up requests for the others;
+    concurrent requests for the same cold tenant wait for one shared open.
+    """
+
+    def __init__(self, open: Callable[[str], T], close: Callable[[T], None],
+                 is_idle: Callable[[T], bool], max_size: int = 32):
+        self.open = open
+        self.close = close
+        self.is_idle = is_idle
+        self.max_size = max_size
+        self._items: "OrderedDict[str, T]" = OrderedDict()
+        self._opening: Dict[str, Future] = {}
+        self._uses: Dict[str, int] = {}  # bumped on every get, so an eviction can tell it raced a request
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.evicted = 0
+
+    def get(self, tenant_id: str) -> T:
+        with self._lock:
+            item = self._items.get(tenant_id)
+            if item is not None:
+                self._items.move_to_end(tenant_id)
+                self._uses[tenant_id] += 1
+                return item
+            opening = self._opening.get(tenant_id)
+            owner = opening is None
+            if owner:
+                opening = self._opening[tenant_id] = Future()
+        if not owner:
+            return opening.result()
+
+        try:
+            item = self.open(tenant_id)
+        except BaseException as e:
+            with self._lock:
+                del self._opening[tenant_id]
+            opening.set_exception(e)
+            raise
+        with self._lock:
+            self._items[tenant_id] = item
+            self._uses[tenant_id] = 1
+            del self._opening[tenant_id]
+            self.opened += 1
+        opening.set_result(item)
+        self._evict()
+        return item
+
+    def _evict(self):
+        with self._lock:
+            excess = len(self._items) - self.max_size
+            candidates = [(tenant_id, item, self._uses[tenant_id])
+                          for tenant_id, item in list(self._items.items())[:-1]]
+        for tenant_id, item, uses in candidates:
+            if excess <= 0:
+                break
+            if not self.is_idle(item):
+                continue
+            with self._lock:
+                # Skip it if a request fetched it while we were checking
+                if self._items.get(tenant_id) is not item or self._uses[tenant_id] != uses:
+                    continue
+                del self._items[tenant_id]
+                del self._uses[tenant_id]
+                self.evicted += 1
+            excess -= 1
+            self.close(item)
+
+    def values(self) -> List[T]:
+        with self._lock:
+            return list(self._items.values())
+
+    def close_all(self):
+        with self._lock:
+            items = list(self._items.values())
+            self._items.clear()
+            self._uses.clear()
+        for item in items:
+            self.close(item)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"open": len(self._items), "max_size": self.max_size,
+                    "opened": self.opened, "evicted": self.evicted}
+
+
+def main():
+    load_dotenv()
+    registry = TenantRegistry(
+        os.getenv("TENANTS_DB_PATH", "tenants.db"), os.getenv("TENANT_DATA_DIR", "tenants")
+    )
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    command = sys.argv[1]
+    if command == "create":
+        if len(sys.argv) < 3:
+            print("❌ Please provide a tenant name")
+            sys.exit(1)
+        tenant, token = registry.create(*sys.argv[2:5])
+        print(f"✅ Created tenant {tenant.id} (database: {tenant.db_path})")
+        print(f"🔑 API token (shown once): {token}")
+    elif command == "list":
+        for tenant in registry.list():
+            print(f"{tenant['id']} | {tenant['name']} | {tenant['db_path']} | "
+                  f"notion: {tenant['notion_database_id'] or '-'} | {tenant['created_at']}")
+    elif command == "rotate":
+        if len(sys.argv) < 3:
+            print("❌ Please provide a tenant id")
+            sys.exit(1)
+        token = registry.rotate_token(sys.argv[2])
+        if token is None:
+            print(f"❌ Unknown tenant: {sys.argv[2]}")
+            sys.exit(1)
+        print(f"🔑 New API token (shown once): {token}")
+    else:
+        print(f"❌ Unknown command: {command}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
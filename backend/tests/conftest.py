@@ -0,0 +1,20 @@
+"""
+Shared test setup: main reads its configuration at import, so point it at a
+throwaway database with Notion and Ollama background work off before any test
+imports it. Run from backend/: python -m pytest tests
+"""
+
+import os
+import sys
+import tempfile
+
+_workdir = tempfile.mkdtemp(prefix="study-assistant-test-")
+os.environ.update({
+    "DB_PATH": os.path.join(_workdir, "test.db"),
+    "SYNC_TO_NOTION": "false",
+    "OLLAMA_WARMUP": "false",
+    "OLLAMA_HEALTH_INTERVAL": "0",
+    "TOPIC_INDEX_ENABLED": "false",
+    "MULTI_TENANT": "false",
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
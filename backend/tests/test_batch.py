@@ -0,0 +1,62 @@
+"""/capture/batch classification tests (LLM calls are faked). Run from backend/: python -m pytest tests"""
+
+import json
+
+import main
+
+
+class FakeClient:
+    """Answers a batch with one item per text, or only the first `answer` items, cut mid-object"""
+
+    def __init__(self, answer=None):
+        self.answer = answer
+        self.batches = []
+
+    def invoke_batch(self, texts, topics):
+        self.batches.append((len(texts), len(topics)))
+        items = [
+            {"index": i, "subject": "Biology", "topic": f"Batch topic {i}", "create_new": True, "keywords": "a, b"}
+            for i in range(len(texts) if self.answer is None else self.answer)
+        ]
+        output = json.dumps(items)
+        return output if self.answer is None else output[:-1] + ', {"index": 9, "subj'
+
+
+def fake_llm(monkeypatch, client):
+    monkeypatch.setattr(main.llm_gateway, "call", lambda pool_call, fn, **kwargs: fn(client))
+    singles = []
+
+    def classify_single(text, topics, on_token=None):
+        singles.append(text)
+        return main.LLMResponse(subject="Biology", topic="Single", create_new=True, keywords="x")
+
+    monkeypatch.setattr(main, "call_llm_for_classification", classify_single)
+    return singles
+
+
+def test_batch_chunks_fit_the_context_window(monkeypatch):
+    client = FakeClient()
+    singles = fake_llm(monkeypatch, client)
+    monkeypatch.setattr(main, "get_topic_names", lambda: [f"Existing topic number {i}" for i in range(40)])
+    texts = [f"Batch fit text {i} " + "lorem ipsum " * 40 for i in range(8)]
+
+    results = main.classify_texts_batch(texts)
+
+    assert len(results) == 8 and not singles
+    assert sum(size for size, _ in client.batches) == 8
+    assert len(client.batches) > 1  # eight texts plus 40 topics don't fit in the default 2048 tokens
+    for size, topics in client.batches:
+        assert main.batch_fits(["x" * main.CAPTURE_BATCH_TEXT_CHARS] * size, ["Existing topic number 10"] * topics)
+
+
+def test_short_batch_answer_falls_back_per_item(monkeypatch):
+    client = FakeClient(answer=1)
+    singles = fake_llm(monkeypatch, client)
+    monkeypatch.setattr(main, "get_topic_names", lambda: ["Cells"])
+    texts = [f"Short answer text {i}" for i in range(3)]
+
+    results = main.classify_texts_batch(texts)
+
+    assert results[0].topic == "Batch topic 0"
+    assert [result.topic for result in results[1:]] == ["Single", "Single"]
+    assert singles == texts[1:]
@@ -0,0 +1,43 @@
+"""Duplicate detection tests. Run from backend/: python -m pytest tests"""
+
+import pytest
+
+import main
+
+
+def test_duplicate_capture_of_same_page_is_rejected(monkeypatch):
+    monkeypatch.setattr(main, "DEDUP_SCOPE", "url")
+    topic_id = main.get_or_create_topic("Dedup", "Testing")
+    note_id = main.save_note_to_db("t", topic_id, "", "https://example.com/page#intro", "The  Krebs cycle")
+
+    with pytest.raises(main.DuplicateNoteError) as error:
+        main.save_note_to_db("t", topic_id, "", "https://EXAMPLE.com/page/", "the krebs CYCLE")
+    assert error.value.note_id == note_id
+    assert main.find_duplicate_note("The Krebs cycle", "https://example.com/other") is None
+
+
+def test_scope_change_rehashes_existing_notes(monkeypatch):
+    monkeypatch.setattr(main, "DEDUP_SCOPE", "url")
+    topic_id = main.get_or_create_topic("Dedup", "Testing")
+    first = main.save_note_to_db("t", topic_id, "", "https://a.example/1", "Glycolysis splits glucose")
+    main.save_note_to_db("t", topic_id, "", "https://b.example/2", "Glycolysis splits glucose")
+
+    monkeypatch.setattr(main, "DEDUP_SCOPE", "global")
+    assert main.find_duplicate_note("Glycolysis splits glucose", "https://c.example/3") is None
+    assert main.backfill_content_hashes(pause=0) >= 1
+    assert main.find_duplicate_note("Glycolysis splits glucose", "https://c.example/3") == first
+
+    with main.get_db() as conn:
+        stale = conn.execute(
+            "SELECT COUNT(*) FROM summaries WHERE content_hash IS NOT NULL AND content_hash NOT LIKE 'global:%'"
+        ).fetchone()[0]
+    assert stale == 0
+    assert main.backfill_content_hashes(pause=0) == 0
+
+
+def test_dedup_off_saves_everything(monkeypatch):
+    monkeypatch.setattr(main, "DEDUP_SCOPE", "off")
+    topic_id = main.get_or_create_topic("Dedup", "Testing")
+    main.save_note_to_db("t", topic_id, "", "", "Osmosis moves water")
+    main.save_note_to_db("t", topic_id, "", "", "Osmosis moves water")
+    assert main.find_duplicate_note("Osmosis moves water", "") is None
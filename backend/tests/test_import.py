@@ -0,0 +1,58 @@
+"""
+/import regression tests. Run from backend/: python -m pytest tests
+"""
+
+import json
+
+from fastapi.testclient import TestClient
+
+import main
+
+
+def test_import_creates_several_new_topics():
+    records = [
+        {"original_text": f"Note number {i} about {topic}", "subject": subject, "topic": topic, "keywords": "a, b"}
+        for i, (subject, topic) in enumerate([
+            ("Biology", "Photosynthesis"),
+            ("Physics", "Thermodynamics"),
+            ("Mathematics", "Linear Algebra"),
+            ("Biology", "Photosynthesis"),
+            ("History", "World War II"),
+        ])
+    ]
+    body = "\n".join(json.dumps(record) for record in records)
+
+    with TestClient(main.app) as client:
+        response = client.post("/import", content=body, headers={"Content-Type": "application/x-ndjson"})
+        assert response.status_code == 200, response.text
+        assert response.json()["imported"] == 5
+        assert response.json()["duplicates"] == 0
+
+        names = {topic["name"] for topic in client.get("/topics").json()["topics"]}
+        assert {"Photosynthesis", "Thermodynamics", "Linear Algebra", "World War II"} <= names
+
+
+def test_import_reports_badly_typed_lines():
+    records = [
+        {"original_text": "Mitochondria make ATP", "subject": "Biology", "topic": "Cell Biology",
+         "keywords": ["mitochondria", "ATP"]},
+        {"original_text": "Newton's second law", "subject": 1, "topic": "Mechanics"},
+        {"original_text": "Ohm's law relates voltage and current", "subject": "Physics", "topic": "Circuits",
+         "keywords": [1, 2]},
+        ["not", "an", "object"],
+        {"original_text": "Supply and demand", "subject": "Economics", "topic": "Markets", "source_url": None},
+    ]
+    body = "\n".join(json.dumps(record) for record in records)
+
+    with TestClient(main.app) as client:
+        response = client.post("/import", content=body, headers={"Content-Type": "application/x-ndjson"})
+        assert response.status_code == 200, response.text
+        result = response.json()
+        assert result["imported"] == 2
+        assert result["errors"] == 3
+        assert [error["line"] for error in result["error_details"]] == [2, 3, 4]
+        assert "subject" in result["error_details"][0]["error"]
+
+        notes = client.get("/notes", params={"topic": "Cell Biology"}).json()["notes"]
+        assert len(notes) == 1
+        assert client.get(f"/notes/{notes[0]['id']}").json()["keywords"] == "mitochondria, ATP"
@@ -0,0 +1,46 @@
+"""Keyword classifier tests. Run from backend/: python -m pytest tests"""
+
+import json
+
+from keyword_classifier import DEFAULT_SUBJECT, DEFAULT_TOPIC, KeywordClassifier
+
+
+def test_picks_subject_and_topic_with_confidence():
+    result = KeywordClassifier().classify("Training a neural model with machine learning algorithms in Python")
+    assert (result.subject, result.topic) == ("Computer Science", "Machine Learning")
+    assert result.confidence == 1.0
+    assert result.keywords[0] == "neural"
+
+
+def test_matches_whole_words_and_plurals_only():
+    classifier = KeywordClassifier()
+    assert classifier.classify("Rain fell on the terrain").keywords == []
+    assert classifier.classify("Sorting algorithms").keywords == ["algorithm"]
+
+
+def test_no_keywords_gives_default_with_zero_confidence():
+    result = KeywordClassifier().classify("Nothing relevant here at all")
+    assert (result.subject, result.topic, result.confidence) == (DEFAULT_SUBJECT, DEFAULT_TOPIC, 0.0)
+
+
+def test_single_stray_keyword_is_not_confident():
+    result = KeywordClassifier().classify("We took a photo of the atom sculpture")
+    assert result.subject == "Chemistry"
+    assert result.topic == "General Chemistry"
+    assert result.confidence < 0.5
+
+
+def test_ties_go_to_the_earlier_subject():
+    # "energy" is a Physics keyword, "solar" supports Environmental Science, listed first
+    assert KeywordClassifier().classify("solar energy").subject == "Environmental Science"
+
+
+def test_loads_a_custom_table(tmp_path):
+    path = tmp_path / "keywords.json"
+    path.write_text(json.dumps([
+        {"subject": "Music", "keywords": ["melody", "harmony"], "topics": {"Jazz": ["swing", "bebop"]},
+         "default_topic": "Music Theory"}
+    ]))
+    classifier = KeywordClassifier.from_file(str(path))
+    assert classifier.classify("Bebop melody lines swing hard").topic == "Jazz"
+    assert classifier.classify("A simple melody").topic == "Music Theory"
@@ -0,0 +1,59 @@
+"""LLMGateway deadline, concurrency and circuit breaker tests. Run from backend/: python -m pytest tests"""
+
+import threading
+import time
+
+import pytest
+
+from llm_gateway import CircuitOpenError, LLMGateway, LLMTimeoutError
+
+
+def fail():
+    raise ConnectionError("Ollama is down")
+
+
+def test_slow_call_times_out_at_the_deadline():
+    gateway = LLMGateway(max_concurrency=1, timeout=0.1)
+    started = time.monotonic()
+    with pytest.raises(LLMTimeoutError):
+        gateway.call(time.sleep, 1)
+    assert time.monotonic() - started < 0.5
+    assert gateway.stats()["timeouts"] == 1
+
+
+def test_calls_wait_for_a_free_slot_within_the_deadline():
+    gateway = LLMGateway(max_concurrency=1, timeout=0.2)
+    release = threading.Event()
+    holder = threading.Thread(target=gateway.call, args=(release.wait, 5), kwargs={"timeout": 5})
+    holder.start()
+    time.sleep(0.05)
+    with pytest.raises(LLMTimeoutError, match="slot"):
+        gateway.call(lambda: "late")
+    release.set()
+    holder.join()
+    assert gateway.call(lambda: "ok") == "ok"
+
+
+def test_breaker_opens_then_recovers_after_a_trial_call():
+    gateway = LLMGateway(failure_threshold=2, reset_timeout=0.1)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            gateway.call(fail)
+    with pytest.raises(CircuitOpenError):
+        gateway.call(lambda: "skipped")
+    assert gateway.stats()["circuit_state"] == "open"
+
+    time.sleep(0.15)
+    assert gateway.call(lambda: "ok") == "ok"
+    assert gateway.stats()["circuit_state"] == "closed"
+
+
+def test_failed_trial_call_reopens_the_breaker():
+    gateway = LLMGateway(failure_threshold=1, reset_timeout=0.1)
+    with pytest.raises(ConnectionError):
+        gateway.call(fail)
+    time.sleep(0.15)
+    with pytest.raises(ConnectionError):
+        gateway.call(fail)
+    with pytest.raises(CircuitOpenError):
+        gateway.call(lambda: "skipped")
@@ -0,0 +1,76 @@
+"""Schema migration tests. Run from backend/: python -m pytest tests"""
+
+import sqlite3
+import zlib
+
+import pytest
+
+from migrations import LATEST_VERSION, MIGRATIONS, SchemaVersionError, get_schema_version, migrate
+
+
+def connect():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def test_fresh_database_reaches_latest_version_once():
+    conn = connect()
+    assert migrate(conn) == [m.version for m in MIGRATIONS]
+    assert get_schema_version(conn) == LATEST_VERSION
+    assert migrate(conn) == []
+
+
+def test_newer_database_is_refused():
+    conn = connect()
+    conn.execute(f"PRAGMA user_version = {LATEST_VERSION + 1}")
+    with pytest.raises(SchemaVersionError):
+        migrate(conn)
+
+
+def test_unversioned_database_keeps_its_notes():
+    conn = connect()
+    conn.executescript("""
+        CREATE TABLE topics (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE NOT NULL,
+                             subject TEXT NOT NULL, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+        CREATE TABLE summaries (id INTEGER PRIMARY KEY AUTOINCREMENT, topic_id INTEGER NOT NULL,
+                                title TEXT NOT NULL, original_text TEXT NOT NULL, summary_text TEXT NOT NULL,
+                                keywords TEXT, source_url TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+        INSERT INTO topics (name, subject) VALUES ('Cells', 'Biology');
+        INSERT INTO summaries (topic_id, title, original_text, summary_text) VALUES (1, 'Old', 'old text', 'old text');
+    """)
+    migrate(conn)
+    assert get_schema_version(conn) == LATEST_VERSION
+    assert conn.execute("SELECT title FROM summaries").fetchone()[0] == "Old"
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(summaries)")]
+    assert "content_hash" in columns
+
+
+def search(conn, query):
+    return [row[0] for row in conn.execute("SELECT rowid FROM notes_fts WHERE notes_fts MATCH ? ORDER BY rowid",
+                                           (query,))]
+
+
+def test_search_triggers_work_without_app_functions():
+    # A plain connection (no note_text()) can write notes, compressed ones included
+    conn = connect()
+    migrate(conn)
+    conn.execute("INSERT INTO topics (name, subject) VALUES ('Cells', 'Biology')")
+    plain = conn.execute(
+        "INSERT INTO summaries (topic_id, title, original_text, summary_text, keywords) "
+        "VALUES (1, 'Mitosis', 'cells divide', '', 'division')"
+    ).lastrowid
+    conn.execute(
+        "INSERT INTO summaries (topic_id, title, original_text, summary_text) VALUES (1, 'Packed', ?, '')",
+        (zlib.compress(b"meiosis " * 200),)
+    )
+    assert search(conn, "divide") == [plain]
+
+    conn.execute("UPDATE summaries SET title = 'Cell division', original_text = 'chromosomes split' WHERE id = ?",
+                 (plain,))
+    assert search(conn, "divide") == []
+    assert search(conn, "chromosomes") == [plain]
+
+    conn.execute("DELETE FROM summaries")
+    assert search(conn, "chromosomes") == []
+    conn.execute("INSERT INTO notes_fts (notes_fts) VALUES ('integrity-check')")
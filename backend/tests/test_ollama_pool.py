@@ -0,0 +1,58 @@
+"""OllamaPool routing and failover tests (hosts are faked). Run from backend/: python -m pytest tests"""
+
+import time
+
+from ollama_pool import OllamaBackend, OllamaPool
+
+
+class FakeHost:
+    def __init__(self, url):
+        self.url = url
+        self.down = False
+        self.calls = 0
+
+    def generate(self):
+        self.calls += 1
+        if self.down:
+            raise ConnectionError(f"{self.url} is down")
+        return self.url
+
+
+def make_pool(**kwargs):
+    return OllamaPool([OllamaBackend("a"), OllamaBackend("b")], FakeHost, health_interval=0,
+                      failure_threshold=1, **kwargs)
+
+
+def test_failed_host_fails_over_and_is_skipped():
+    pool = make_pool(cooldown=60)
+    a = pool.backends[0].client
+    a.down = True
+    assert pool.call(lambda client: client.generate(), hedge=False) == "b"
+    assert not pool.backends[0].healthy
+    for _ in range(5):
+        assert pool.call(lambda client: client.generate(), hedge=False) == "b"
+    assert a.calls == 1
+
+
+def test_unhealthy_host_gets_a_trial_call_after_cooldown():
+    pool = make_pool(cooldown=0.2)
+    a = pool.backends[0].client
+    a.down = True
+    pool.call(lambda client: client.generate(), hedge=False)
+    assert not pool.backends[0].healthy
+
+    a.down = False
+    time.sleep(0.25)
+    answers = {pool.call(lambda client: client.generate(), hedge=False) for _ in range(4)}
+    assert pool.backends[0].healthy
+    assert answers == {"a", "b"}
+
+
+def test_embedding_failures_leave_host_healthy():
+    pool = make_pool()
+    a = pool.backends[0].client
+    a.down = True
+    for _ in range(3):
+        assert pool.call(lambda client: client.generate(), embed=True) == "b"
+    assert pool.backends[0].healthy
+    assert pool.stats()["backends"][0]["embed_failures"] >= 1
@@ -0,0 +1,42 @@
+"""TenantCache tests. Run from backend/: python -m pytest tests"""
+
+import threading
+import time
+
+from tenants import TenantCache
+
+
+def test_cold_tenant_does_not_block_others():
+    opened = []
+    release = threading.Event()
+
+    def open_workspace(tenant_id):
+        opened.append(tenant_id)
+        if tenant_id == "slow":
+            release.wait(5)
+        return {"id": tenant_id}
+
+    cache = TenantCache(open_workspace, lambda item: None, lambda item: True, max_size=8)
+    slow = [threading.Thread(target=cache.get, args=("slow",)) for _ in range(3)]
+    for thread in slow:
+        thread.start()
+    time.sleep(0.1)
+
+    started = time.monotonic()
+    assert cache.get("fast") == {"id": "fast"}
+    assert time.monotonic() - started < 1
+
+    release.set()
+    for thread in slow:
+        thread.join()
+    assert opened.count("slow") == 1
+
+
+def test_evicts_idle_workspaces_only():
+    closed = []
+    busy = {"a"}
+    cache = TenantCache(lambda tenant_id: tenant_id, closed.append, lambda item: item not in busy, max_size=2)
+    for tenant_id in ("a", "b", "c"):
+        cache.get(tenant_id)
+    assert closed == ["b"]
+    assert sorted(cache.values()) == ["a", "c"]
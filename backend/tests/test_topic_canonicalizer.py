@@ -0,0 +1,101 @@
+"""Topic canonicalisation and offline merge tests. Run from backend/: python -m pytest tests"""
+
+import sqlite3
+
+from migrations import migrate
+from topic_canonicalizer import TopicCanonicalizer, apply_merge, plan_merge, topic_key
+
+
+def make_canonicalizer():
+    canonicalizer = TopicCanonicalizer(threshold=0.8)
+    canonicalizer.add(1, "Data Structures", "Computer Science")
+    canonicalizer.add(2, "ML", "Computer Science")
+    canonicalizer.add(3, "Cell Biology", "Biology")
+    canonicalizer.add(4, "Organic Chemistry", "Chemistry")
+    return canonicalizer
+
+
+def test_key_ignores_case_filler_and_plurals():
+    assert topic_key("Introduction to Neural Networks") == topic_key("neural network basics") == "neural network"
+
+
+def test_acronyms_match_within_the_subject_only():
+    canonicalizer = make_canonicalizer()
+    assert canonicalizer.match("DS", "Computer Science") == (1, "acronym", 1.0)
+    assert canonicalizer.match("Machine Learning", "Computer Science") == (2, "acronym", 1.0)
+    assert canonicalizer.match("DS", "Mathematics") is None
+    # Two spelled-out names sharing initials are different topics
+    assert canonicalizer.match("Data Science", "Computer Science") is None
+
+
+def test_ambiguous_acronym_matches_nothing():
+    canonicalizer = make_canonicalizer()
+    canonicalizer.add(5, "Distributed Systems", "Computer Science")
+    assert canonicalizer.match("DS", "Computer Science") is None
+
+
+def test_key_matches_cross_subjects_but_fuzzy_matches_do_not():
+    canonicalizer = make_canonicalizer()
+    # Topic names are unique across subjects, so the same name is the same topic whatever the subject
+    assert canonicalizer.match("Intro to Data Structures", "Mathematics") == (1, "key", 1.0)
+    assert canonicalizer.match("Cell Biolgy", "Biology").topic_id == 3
+    assert canonicalizer.match("Cell Biolgy", "Medicine") is None
+
+
+def test_fuzzy_match_rejects_different_words():
+    assert make_canonicalizer().match("Inorganic Chemistry", "Chemistry") is None
+
+
+def make_db():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    migrate(conn)
+    topics = [
+        ("Machine Learning", "Computer Science", 3),
+        ("machine learning basics", "Computer Science", 1),
+        ("ML", "Computer Science", 1),
+        ("Organic Chemistry", "Chemistry", 1),
+        ("Inorganic Chemistry", "Chemistry", 1),
+        ("Unclassified", "General Studies", 1),
+    ]
+    for name, subject, notes in topics:
+        topic_id = conn.execute("INSERT INTO topics (name, subject) VALUES (?, ?)", (name, subject)).lastrowid
+        for i in range(notes):
+            conn.execute(
+                "INSERT INTO summaries (topic_id, title, original_text, summary_text) VALUES (?, ?, ?, '')",
+                (topic_id, f"{name} {i}", f"Note {i} about {name}")
+            )
+    conn.commit()
+    return conn
+
+
+def topic_ids(conn):
+    return {row["name"]: row["id"] for row in conn.execute("SELECT id, name FROM topics")}
+
+
+def test_plan_merge_is_a_dry_run():
+    conn = make_db()
+    before = topic_ids(conn)
+
+    groups = plan_merge(conn, 0.8, exclude=["Unclassified"])
+
+    ids = topic_ids(conn)
+    assert ids == before
+    assert {canonical: sorted(row["name"] for row in rows) for canonical, rows in groups.items()} == {
+        ids["Machine Learning"]: ["ML", "machine learning basics"]
+    }
+
+
+def test_apply_merge_moves_notes_and_keeps_aliases():
+    conn = make_db()
+    ids = topic_ids(conn)
+
+    merged = apply_merge(conn, plan_merge(conn, 0.8, exclude=["Unclassified"]))
+
+    assert merged == 2
+    assert set(topic_ids(conn)) == {"Machine Learning", "Organic Chemistry", "Inorganic Chemistry", "Unclassified"}
+    notes = conn.execute("SELECT COUNT(*) FROM summaries WHERE topic_id = ?", (ids["Machine Learning"],)).fetchone()[0]
+    assert notes == 5
+    aliases = dict(conn.execute("SELECT alias, topic_id FROM topic_aliases").fetchall())
+    assert aliases == {"ml": ids["Machine Learning"], "machine learning": ids["Machine Learning"]}
+    assert plan_merge(conn, 0.8, exclude=["Unclassified"]) == {}
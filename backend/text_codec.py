@@ -0,0 +1,37 @@
+"""
+Note text storage codec for the Study Assistant backend.
+
+Short notes are stored as plain TEXT. Bodies at or above a size threshold are
+zlib-compressed and stored as a BLOB, so the storage class alone tells the
+two apart. Every read path goes through decode_text() (or the `note_text()`
+SQL function registered on each app connection, used by the search
+backfill), so callers always see plain text. Schema triggers must not call
+note_text(): other SQLite clients don't have it.
+"""
+
+import sqlite3
+import zlib
+from typing import Optional, Union
+
+
+def encode_text(text: str, min_bytes: int = 1024, enabled: bool = True) -> Union[str, bytes]:
+    """Compress text of at least min_bytes UTF-8 bytes, unless that saves less than 10%"""
+    if not enabled or text is None:
+        return text
+    raw = text.encode("utf-8")
+    if len(raw) < min_bytes:
+        return text
+    compressed = zlib.compress(raw, 6)
+    return compressed if len(compressed) < len(raw) * 0.9 else text
+
+
+def decode_text(value: Optional[Union[str, bytes]]) -> Optional[str]:
+    """Plain text for a stored value, compressed or not"""
+    if isinstance(value, (bytes, memoryview)):
+        return zlib.decompress(value).decode("utf-8")
+    return value
+
+
+def register(conn: sqlite3.Connection):
+    """Make note_text(value) available to SQL on this connection"""
+    conn.create_function("note_text", 1, decode_text, deterministic=True)
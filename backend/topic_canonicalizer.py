@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Topic canonicalisation for the Study Assistant backend.
+
+The LLM names the same topic in many ways ("Machine Learning", "machine
+learning basics", "ML"), and every variant used to become a new row in
+`topics`, which then lengthens every prompt. New names are matched against
+the existing topics, cheapest check first:
+
+1. Normalised key: lowercase words without punctuation, stop words or
+   filler ("basics", "introduction"), with plurals stemmed.
+2. Aliases: variants resolved before, stored in `topic_aliases`.
+3. Acronyms: "ML" ↔ "Machine Learning" within the same subject.
+4. Fuzzy: character-trigram similarity over the keys (candidates come from
+   a trigram → topic index, not a scan), confirmed word by word with edit
+   distance so "Organic" never merges into "Inorganic", within the same
+   subject.
+
+Run as a script to merge duplicates that already exist:
+    python topic_canonicalizer.py merge [db_path]           # show what would be merged
+    python topic_canonicalizer.py merge [db_path] --apply   # merge them
+"""
+
+import os
+import re
+import sqlite3
+import sys
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+STOP_WORDS = {"a", "an", "and", "for", "in", "of", "on", "the", "to", "with"}
+FILLER_WORDS = {
+    "101", "basic", "basics", "concept", "concepts", "essentials", "fundamental", "fundamentals",
+    "intro", "introduction", "overview", "principle", "principles",
+}
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_CASED_WORD_RE = re.compile(r"[A-Za-z0-9]+")
+
+
+class TopicMatch(NamedTuple):
+    topic_id: int
+    how: str  # "key", "alias", "acronym" or "fuzzy"
+    score: float
+
+
+def stem(word: str) -> str:
+    """Strip common English plural endings ("networks" → "network", "theories" → "theory")"""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("sses", "ches", "shes", "xes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def topic_key(name: str) -> str:
+    """Normalised form two names must share to be the same topic"""
+    words = _WORD_RE.findall(name.lower())
+    core = [stem(w) for w in words if w not in STOP_WORDS and w not in FILLER_WORDS]
+    return " ".join(core or [stem(w) for w in words])
+
+
+def acronym_of(name: str) -> Optional[str]:
+    """"ml" for a name that is a 2-5 letter acronym apart from filler ("ML", "NLP Basics"), else None"""
+    words = [w for w in _CASED_WORD_RE.findall(name) if w.lower() not in STOP_WORDS | FILLER_WORDS]
+    if len(words) == 1 and 2 <= len(words[0]) <= 5 and words[0].isalpha() and words[0].isupper():
+        return words[0].lower()
+    return None
+
+
+def initials(key: str) -> str:
+    words = key.split()
+    return "".join(w[0] for w in words) if len(words) >= 2 else ""
+
+
+def trigrams(key: str) -> Set[str]:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def words_match(a: str, b: str) -> bool:
+    """Same number of words, each equal or a small typo apart (short words must be equal)"""
+    words_a, words_b = a.split(), b.split()
+    if len(words_a) != len(words_b):
+        return False
+    for wa, wb in zip(words_a, words_b):
+        if wa == wb:
+            continue
+        shortest = min(len(wa), len(wb))
+        allowed = 2 if shortest >= 10 else 1 if shortest >= 5 else 0
+        if abs(len(wa) - len(wb)) > allowed or edit_distance(wa, wb) > allowed:
+            return False
+    return True
+
+
+class TopicCanonicalizer:
+    """Indexes of existing topics for mapping a new topic name onto one of them"""
+
+    def __init__(self, threshold: float = 0.8):
+        self.threshold = threshold
+        self._by_key: Dict[str, int] = {}
+        self._aliases: Dict[str, int] = {}
+        self._keys: Dict[int, str] = {}
+        self._subjects: Dict[int, str] = {}
+        self._by_acronym: Dict[str, List[int]] = defaultdict(list)
+        self._by_trigram: Dict[str, Set[int]] = defaultdict(set)
+
+    def add(self, topic_id: int, name: str, subject: str):
+        key = topic_key(name)
+        self._by_key.setdefault(key, topic_id)  # with existing duplicates, the first (oldest) wins
+        self._keys[topic_id] = key
+        self._subjects[topic_id] = subject.strip().lower()
+        for acronym in {acronym_of(name), initials(key)} - {None, ""}:
+            self._by_acronym[acronym].append(topic_id)
+        for gram in trigrams(key):
+            self._by_trigram[gram].add(topic_id)
+
+    def add_alias(self, alias_key: str, topic_id: int):
+        self._aliases[alias_key] = topic_id
+
+    def match(self, name: str, subject: str) -> Optional[TopicMatch]:
+        """The existing topic `name` is a variant of, or None if it's new"""
+        key = topic_key(name)
+        if not key:
+            return None
+        if key in self._by_key:
+            return TopicMatch(self._by_key[key], "key", 1.0)
+        if key in self._aliases:
+            return TopicMatch(self._aliases[key], "alias", 1.0)
+
+        subject = subject.strip().lower()
+        acronym = acronym_of(name) or initials(key)
+        if acronym:
+            # "ML" finds "Machine Learning" and "Machine Learning" finds "ML"; ambiguous acronyms match nothing
+            candidates = {
+                topic_id for topic_id in self._by_acronym.get(acronym, ())
+                if self._subjects[topic_id] == subject and (acronym_of(name) or " " not in self._keys[topic_id])
+            }
+            if len(candidates) == 1:
+                return TopicMatch(candidates.pop(), "acronym", 1.0)
+
+        grams = trigrams(key)
+        shared: Dict[int, int] = defaultdict(int)
+        for gram in grams:
+            for topic_id in self._by_trigram.get(gram, ()):
+                shared[topic_id] += 1
+        best: Optional[TopicMatch] = None
+        for topic_id, count in shared.items():
+            if self._subjects[topic_id] != subject:
+                continue
+            other = self._keys[topic_id]
+            score = 2 * count / (len(grams) + len(trigrams(other)))  # Dice coefficient
+            if score >= self.threshold and (best is None or score > best.score) and words_match(key, other):
+                best = TopicMatch(topic_id, "fuzzy", score)
+        return best
+
+    def stats(self) -> dict:
+        return {"topics": len(self._keys), "aliases": len(self._aliases), "threshold": self.threshold}
+
+
+# ========== OFFLINE MERGE ==========
+
+def plan_merge(conn: sqlite3.Connection, threshold: float, exclude: Iterable[str]) -> Dict[int, List[sqlite3.Row]]:
+    """canonical topic id -> duplicate topic rows; the most used name of each group is kept"""
+    rows = conn.execute("""
+        SELECT t.id, t.name, t.subject, COUNT(s.id) AS notes
+        FROM topics t LEFT JOIN summaries s ON s.topic_id = t.id
+        GROUP BY t.id
+        ORDER BY notes DESC, t.id
+    """).fetchall()
+    canonicalizer = TopicCanonicalizer(threshold)
+    groups: Dict[int, List[sqlite3.Row]] = defaultdict(list)
+    kept: List[sqlite3.Row] = []
+    exclude = set(exclude)
+    for row in rows:
+        if row["name"] in exclude:
+            continue
+        found = canonicalizer.match(row["name"], row["subject"])
+        if found:
+            groups[found.topic_id].append(row)
+        else:
+            canonicalizer.add(row["id"], row["name"], row["subject"])
+            kept.append(row)
+
+    # Names matching an alias saved by the server (e.g. "ML" → "Machine Learning") join its topic,
+    # unless that topic is gone or they're themselves the target of a merge
+    aliases = dict(conn.execute("SELECT alias, topic_id FROM topic_aliases").fetchall())
+    kept_ids = {row["id"] for row in kept}
+    for row in kept:
+        target = aliases.get(topic_key(row["name"]))
+        if target is not None and target != row["id"] and target in kept_ids and row["id"] not in groups:
+            groups[target].append(row)
+            kept_ids.discard(row["id"])
+    return groups
+
+
+def apply_merge(conn: sqlite3.Connection, groups: Dict[int, List[sqlite3.Row]]) -> int:
+    """Move notes onto the canonical topics, keep the old names as aliases, delete the duplicates"""
+    merged = 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for canonical_id, duplicates in groups.items():
+            for dup in duplicates:
+                conn.execute("UPDATE summaries SET topic_id = ? WHERE topic_id = ?", (canonical_id, dup["id"]))
+                conn.execute("UPDATE topic_aliases SET topic_id = ? WHERE topic_id = ?", (canonical_id, dup["id"]))
+                conn.execute(
+                    "INSERT OR REPLACE INTO topic_aliases (alias, topic_id) VALUES (?, ?)",
+                    (topic_key(dup["name"]), canonical_id)
+                )
+                conn.execute("DELETE FROM topic_embeddings WHERE topic_id = ?", (dup["id"],))
+                conn.execute("DELETE FROM topics WHERE id = ?", (dup["id"],))
+                merged += 1
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return merged
+
+
+def main():
+    from dotenv import load_dotenv
+    import text_codec
+    from migrations import migrate
+
+    load_dotenv()
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    if not args or args[0] != "merge":
+        print(__doc__)
+        sys.exit(1)
+    db_path = args[1] if len(args) > 1 else os.getenv("DB_PATH", "study_assistant.db")
+    if not os.path.exists(db_path):
+        print(f"❌ Database not found: {db_path}")
+        sys.exit(1)
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    text_codec.register(conn)
+    migrate(conn)
+
+    threshold = float(os.getenv("TOPIC_FUZZY_THRESHOLD", "0.8"))
+    groups = plan_merge(conn, threshold, exclude=["Unclassified"])
+    names = {row["id"]: row["name"] for row in conn.execute("SELECT id, name FROM topics")}
+    if not groups:
+        print("✅ No duplicate topics found")
+        return
+    for canonical_id, duplicates in groups.items():
+        variants = ", ".join(f"{dup['name']} ({dup['notes']} notes)" for dup in duplicates)
+        print(f"📚 {names[canonical_id]} ← {variants}")
+
+    if "--apply" not in sys.argv:
+        print(f"\n{sum(len(d) for d in groups.values())} topics would be merged; re-run with --apply to merge them")
+        return
+    merged = apply_merge(conn, groups)
+    print(f"\n✅ Merged {merged} topics. Restart the server so it reloads the topic list.")
+
+
+if __name__ == "__main__":
+    main()
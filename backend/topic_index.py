@@ -0,0 +1,191 @@
+"""
+Embedding-based topic index for the Study Assistant backend.
+
+Each topic name gets an embedding stored in the `topic_embeddings` table as a
+float32 blob. The whole set is kept in memory as one normalised NumPy matrix,
+so finding the nearest topics for a capture is a single matrix-vector product
+regardless of how many topics exist.
+"""
+
+import threading
+import time
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from instrumentation import StructuredLogger
+
+log = StructuredLogger("study_assistant.topic_index")
+
+
+class TopicIndex:
+    """
+    In-memory cosine-similarity index over topic embeddings.
+
+    `get_db` is the app's connection context manager and `embed` turns a list
+    of strings into a list of vectors (e.g. OllamaEmbeddings.embed_documents).
+    If embedding fails the index marks itself unavailable for `retry_seconds`
+    so callers can fall back to the full topic list without paying for a
+    failing request on every capture.
+    """
+
+    def __init__(self, get_db: Callable, embed: Callable[[List[str]], List[List[float]]],
+                 model: str, retry_seconds: int = 60, exclude: Optional[List[str]] = None):
+        self.get_db = get_db
+        self.embed = embed
+        self.model = model
+        self.retry_seconds = retry_seconds
+        self.exclude = set(exclude or [])  # Topic names never suggested (e.g. the pending placeholder)
+        self.ready = False
+        self._unavailable_until = 0.0
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._topic_ids: List[int] = []
+        self._names: List[str] = []
+        self._subjects: List[str] = []
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+
+    @property
+    def available(self) -> bool:
+        return self.ready and time.time() >= self._unavailable_until
+
+    def _mark_unavailable(self, error: Exception):
+        self._unavailable_until = time.time() + self.retry_seconds
+        log.warning("⚠️ Topic index unavailable", retry_seconds=self.retry_seconds, error=str(error))
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """Embed and L2-normalise so a dot product is cosine similarity"""
+        vectors = np.asarray(self.embed(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def load(self):
+        """Load stored embeddings, embedding (and storing) any topic that has none for this model"""
+        # Only one loader at a time; concurrent callers just keep using the full topic list
+        if not self._load_lock.acquire(blocking=False):
+            return
+        try:
+            self._load()
+        finally:
+            self._load_lock.release()
+
+    def _load(self):
+        with self.get_db() as conn:
+            rows = conn.execute("""
+                SELECT t.id, t.name, t.subject, e.embedding
+                FROM topics t
+                LEFT JOIN topic_embeddings e ON e.topic_id = t.id AND e.model = ?
+                ORDER BY t.id
+            """, (self.model,)).fetchall()
+        rows = [row for row in rows if row[1] not in self.exclude]
+
+        missing = [row for row in rows if row[3] is None]
+        new_vectors = {}
+        if missing:
+            try:
+                log.info("🧭 Embedding topics for the topic index", topics=len(missing))
+                vectors = self._embed([row[1] for row in missing])
+            except Exception as e:
+                self._mark_unavailable(e)
+                return
+            with self.get_db() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO topic_embeddings (topic_id, model, embedding) VALUES (?, ?, ?)",
+                    [(row[0], self.model, vector.tobytes()) for row, vector in zip(missing, vectors)]
+                )
+                conn.commit()
+            new_vectors = {row[0]: vector for row, vector in zip(missing, vectors)}
+
+        vectors = [
+            new_vectors[row[0]] if row[3] is None else np.frombuffer(row[3], dtype=np.float32)
+            for row in rows
+        ]
+        with self._lock:
+            self._topic_ids = [row[0] for row in rows]
+            self._names = [row[1] for row in rows]
+            self._subjects = [row[2] for row in rows]
+            self._matrix = np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+            self.ready = True
+        log.info("🧭 Topic index ready", topics=len(rows))
+
+    def add_topic(self, topic_id: int, name: str, subject: str):
+        """Embed a newly created topic and append it to the index"""
+        if not self.ready or name in self.exclude:
+            return
+        if time.time() < self._unavailable_until:
+            # Embeddings are down; force a full reload (which embeds missing topics) once they're back
+            self.ready = False
+            return
+        try:
+            vector = self._embed([name])[0]
+        except Exception as e:
+            self._mark_unavailable(e)
+            self.ready = False
+            return
+        with self.get_db() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO topic_embeddings (topic_id, model, embedding) VALUES (?, ?, ?)",
+                (topic_id, self.model, vector.tobytes())
+            )
+            conn.commit()
+        with self._lock:
+            if topic_id in self._topic_ids:
+                return
+            self._topic_ids.append(topic_id)
+            self._names.append(name)
+            self._subjects.append(subject)
+            self._matrix = np.vstack([self._matrix, vector]) if self._matrix.size else vector[np.newaxis, :]
+
+    def nearest(self, text: str, k: int) -> Optional[List[dict]]:
+        """
+        Top-k topics by cosine similarity to `text`, best first.
+
+        Returns None when the index can't answer (not loaded or embedding
+        failed) so the caller can use the full topic list instead.
+        """
+        result = self.nearest_many([text], k)
+        return result[0] if result is not None else None
+
+    def nearest_many(self, texts: List[str], k: int) -> Optional[List[List[dict]]]:
+        """nearest() for several texts with a single embedding call"""
+        if time.time() < self._unavailable_until:
+            return None
+        if not self.ready:
+            # Startup load failed earlier; retry now that the back-off has passed
+            self.load()
+            if not self.ready:
+                return None
+        try:
+            queries = self._embed(texts)
+        except Exception as e:
+            self._mark_unavailable(e)
+            return None
+
+        with self._lock:
+            if not self._matrix.size:
+                return [[] for _ in texts]
+            if self._matrix.shape[1] != queries.shape[1]:
+                self._mark_unavailable(ValueError("embedding dimension changed, reload needed"))
+                self.ready = False
+                return None
+            results = []
+            for scores in queries @ self._matrix.T:
+                top_k = min(k, len(scores))
+                top = np.argpartition(-scores, top_k - 1)[:top_k]
+                top = top[np.argsort(-scores[top])]
+                results.append([
+                    {"id": self._topic_ids[i], "name": self._names[i], "subject": self._subjects[i],
+                     "score": float(scores[i])}
+                    for i in top
+                ])
+            return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "available": self.available,
+                "model": self.model,
+                "topics": len(self._topic_ids),
+            }
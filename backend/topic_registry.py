@@ -0,0 +1,180 @@
+"""
+In-memory topic registry for the Study Assistant backend.
+
+The `topics` table is small and read on every capture (to build the prompt)
+and every `/topics` call, but only grows when the LLM invents a new topic.
+The registry loads it once and is updated write-through when a topic is
+created, so reads never touch SQLite. Each change gets a new version, used
+as the `/topics` ETag.
+
+With a fuzzy threshold set, names the LLM invents are first matched against
+the existing topics (see topic_canonicalizer.py), so "ML" or "Machine
+Learning Basics" reuse "Machine Learning" instead of adding a topic.
+"""
+
+import hashlib
+import threading
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from topic_canonicalizer import TopicCanonicalizer, topic_key
+
+
+class TopicSnapshot(NamedTuple):
+    topics: List[dict]  # {"id", "name", "subject"} sorted by name
+    names: List[str]  # names offered to the LLM (excluded names left out)
+    etag: str
+
+
+def topics_etag(topics: Iterable[dict]) -> str:
+    """Fingerprint of the topic list, changes whenever a topic is added, renamed or removed"""
+    joined = "\n".join(f"{t['id']}\t{t['name']}\t{t['subject']}" for t in topics)
+    return hashlib.sha1(joined.encode("utf-8")).hexdigest()[:16]
+
+
+class TopicRegistry:
+    """
+    name → (id, subject) map of the `topics` table, loaded on first use.
+
+    Readers get an immutable snapshot; writers build a new one under a lock,
+    so a capture never sees a half-updated list. Call reload() after the
+    table is changed behind the registry's back (e.g. by a merge script).
+    """
+
+    def __init__(self, get_db: Callable, exclude: Iterable[str] = (), fuzzy_threshold: Optional[float] = None):
+        self.get_db = get_db
+        self.exclude = set(exclude)
+        self.fuzzy_threshold = fuzzy_threshold  # None turns canonicalisation off (exact names only)
+        self._by_name: Dict[str, Tuple[int, str]] = {}
+        self._by_id: Dict[int, dict] = {}
+        self._canonicalizer: Optional[TopicCanonicalizer] = None
+        self._snapshot: Optional[TopicSnapshot] = None
+        self._lock = threading.Lock()
+        # Serialises topic creation so two variants of a new topic can't both be inserted
+        self._create_lock = threading.Lock()
+        self.loads = 0
+        self.inserts = 0
+        self.canonicalized = 0
+
+    def _publish(self):
+        topics = [
+            {"id": topic_id, "name": name, "subject": subject}
+            for name, (topic_id, subject) in sorted(self._by_name.items())
+        ]
+        names = [t["name"] for t in topics if t["name"] not in self.exclude]
+        self._by_id = {t["id"]: t for t in topics}
+        self._snapshot = TopicSnapshot(topics, names, topics_etag(topics))
+
+    def reload(self):
+        with self.get_db() as conn:
+            rows = conn.execute("SELECT id, name, subject FROM topics ORDER BY id").fetchall()
+            aliases = conn.execute("SELECT alias, topic_id FROM topic_aliases").fetchall() \
+                if self.fuzzy_threshold is not None else []
+        canonicalizer = None
+        if self.fuzzy_threshold is not None:
+            canonicalizer = TopicCanonicalizer(self.fuzzy_threshold)
+            for topic_id, name, subject in rows:
+                if name not in self.exclude:
+                    canonicalizer.add(topic_id, name, subject)
+            for alias, topic_id in aliases:
+                canonicalizer.add_alias(alias, topic_id)
+        with self._lock:
+            self._by_name = {row[1]: (row[0], row[2]) for row in rows}
+            self._canonicalizer = canonicalizer
+            self._publish()
+            self.loads += 1
+
+    def snapshot(self) -> TopicSnapshot:
+        snapshot = self._snapshot
+        if snapshot is None:
+            self.reload()
+            snapshot = self._snapshot
+        return snapshot
+
+    def get(self, name: str) -> Optional[Tuple[int, str]]:
+        """(id, subject) of a topic by exact name"""
+        self.snapshot()
+        return self._by_name.get(name)
+
+    def resolve(self, name: str, subject: str) -> Optional[Tuple[dict, str]]:
+        """
+        The existing topic `name` stands for and how it was matched ("exact",
+        "key", "alias", "acronym" or "fuzzy"), or None for a new topic.
+        Acronym and fuzzy matches are saved as aliases so they're exact next time.
+        """
+        self.snapshot()
+        existing = self._by_name.get(name)
+        if existing:
+            return self._by_id[existing[0]], "exact"
+        if self._canonicalizer is None:
+            return None
+        with self._lock:
+            match = self._canonicalizer.match(name, subject)
+            topic = self._by_id.get(match.topic_id) if match else None
+        if topic is None:
+            return None
+        if match.how in ("acronym", "fuzzy"):
+            alias = topic_key(name)
+            with self.get_db() as conn:
+                conn.execute(
+                    "INSERT OR IGNORE INTO topic_aliases (alias, topic_id) VALUES (?, ?)", (alias, topic["id"])
+                )
+                conn.commit()
+            with self._lock:
+                self._canonicalizer.add_alias(alias, topic["id"])
+        self.canonicalized += 1
+        return topic, match.how
+
+    def get_or_create(self, name: str, subject: str) -> Tuple[int, bool]:
+        """
+        Id of the topic called `name` (or the existing topic it's a variant
+        of), inserting it if needed; returns (id, created).
+
+        The insert is a single `INSERT ... ON CONFLICT DO NOTHING`, so a
+        capture racing another process for the same new topic gets its id
+        instead of failing on the UNIQUE constraint.
+        """
+        existing = self.get(name)
+        if existing:
+            return existing[0], False
+        with self._create_lock:
+            return self._create(name, subject)
+
+    def _create(self, name: str, subject: str) -> Tuple[int, bool]:
+        resolved = self.resolve(name, subject)
+        if resolved:
+            return resolved[0]["id"], False
+
+        with self.get_db() as conn:
+            row = conn.execute(
+                "INSERT INTO topics (name, subject) VALUES (?, ?) ON CONFLICT(name) DO NOTHING RETURNING id",
+                (name, subject)
+            ).fetchone()
+            created = row is not None
+            if not created:
+                # Created by another process since the registry was loaded
+                row = conn.execute("SELECT id, subject FROM topics WHERE name = ?", (name,)).fetchone()
+                subject = row[1]
+            conn.commit()
+
+        topic_id = row[0]
+        with self._lock:
+            if name not in self._by_name:
+                self._by_name[name] = (topic_id, subject)
+                if self._canonicalizer is not None and name not in self.exclude:
+                    self._canonicalizer.add(topic_id, name, subject)
+                self._publish()
+            if created:
+                self.inserts += 1
+        return topic_id, created
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "loaded": snapshot is not None,
+            "topics": len(snapshot.topics) if snapshot else 0,
+            "etag": snapshot.etag if snapshot else None,
+            "loads": self.loads,
+            "inserts": self.inserts,
+            "canonicalized": self.canonicalized,
+            "fuzzy": self._canonicalizer.stats() if self._canonicalizer else {"enabled": False},
+        }
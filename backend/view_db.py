@@ -7,6 +7,8 @@ import sqlite3
 import sys
 from datetime import datetime
 
+from text_codec import decode_text
+
 DB_PATH = "study_assistant.db"
 
 
@@ -40,7 +42,7 @@ def show_topics():
     cursor.execute("""
         SELECT t.id, t.name, t.subject, COUNT(n.id) as note_count
         FROM topics t
-        LEFT JOIN notes n ON t.id = n.topic_id
+        LEFT JOIN summaries n ON t.id = n.topic_id
         GROUP BY t.id
         ORDER BY t.name
     """)
@@ -59,7 +61,7 @@ def show_notes(limit=10):
     
     cursor.execute("""
         SELECT n.id, n.title, t.name as topic, n.created_at
-        FROM notes n
+        FROM summaries n
         JOIN topics t ON n.topic_id = t.id
         ORDER BY n.created_at DESC
         LIMIT ?
@@ -75,12 +77,13 @@ def show_notes(limit=10):
 def show_note_details(note_id):
     """Show full details of a note"""
     conn = sqlite3.connect(DB_PATH)
+    conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
     
     # Get note info
     cursor.execute("""
-        SELECT n.*, t.name as topic, t.subject
-        FROM notes n
+        SELECT n.id, n.title, n.original_text, n.source_url, n.created_at, t.name as topic, t.subject
+        FROM summaries n
         JOIN topics t ON n.topic_id = t.id
         WHERE n.id = ?
     """, (note_id,))
@@ -90,40 +93,27 @@ def show_note_details(note_id):
         print(f"❌ Note ID {note_id} not found")
         return
     
-    # Get summary points
-    cursor.execute("""
-        SELECT point_text FROM summary_points
-        WHERE note_id = ?
-        ORDER BY point_order
-    """, (note_id,))
-    summary = cursor.fetchall()
-    
     # Get keywords
     cursor.execute("""
-        SELECT keyword FROM keywords
+        SELECT keyword FROM note_keywords
         WHERE note_id = ?
     """, (note_id,))
     keywords = cursor.fetchall()
     
     print(f"\n📄 NOTE DETAILS (ID: {note_id})")
     print("=" * 70)
-    print(f"Title:      {note[1]}")
-    print(f"Topic:      {note[-2]} ({note[-1]})")
-    print(f"Created:    {note[6]}")
-    if note[2]:
-        print(f"Source:     {note[2]}")
-    if note[7]:
-        print(f"Notion:     {note[8]}")
-    
-    print(f"\nSummary:")
-    for i, (point,) in enumerate(summary, 1):
-        print(f"  {i}. {point}")
+    print(f"Title:      {note['title']}")
+    print(f"Topic:      {note['topic']} ({note['subject']})")
+    print(f"Created:    {note['created_at']}")
+    if note["source_url"]:
+        print(f"Source:     {note['source_url']}")
     
     print(f"\nKeywords:")
     print(f"  {', '.join(kw[0] for kw in keywords)}")
     
+    text = decode_text(note["original_text"])
     print(f"\nOriginal Text:")
-    print(f"  {note[5][:200]}..." if len(note[5]) > 200 else f"  {note[5]}")
+    print(f"  {text[:200]}..." if len(text) > 200 else f"  {text}")
     
     conn.close()
 
@@ -136,16 +126,19 @@ def show_stats():
     cursor.execute("SELECT COUNT(*) FROM topics")
     topics_count = cursor.fetchone()[0]
     
-    cursor.execute("SELECT COUNT(*) FROM notes")
+    cursor.execute("SELECT COUNT(*) FROM summaries")
     notes_count = cursor.fetchone()[0]
     
-    cursor.execute("SELECT COUNT(*) FROM keywords")
+    cursor.execute("SELECT COUNT(DISTINCT keyword) FROM note_keywords")
     keywords_count = cursor.fetchone()[0]
     
+    cursor.execute("PRAGMA user_version")
+    schema_version = cursor.fetchone()[0]
+    
     cursor.execute("""
         SELECT t.subject, COUNT(n.id) as count
         FROM topics t
-        LEFT JOIN notes n ON t.id = n.topic_id
+        LEFT JOIN summaries n ON t.id = n.topic_id
         GROUP BY t.subject
         ORDER BY count DESC
     """)
@@ -156,6 +149,7 @@ def show_stats():
     print(f"Total Topics:    {topics_count}")
     print(f"Total Notes:     {notes_count}")
     print(f"Total Keywords:  {keywords_count}")
+    print(f"Schema Version:  {schema_version}")
     
     print(f"\nNotes by Subject:")
     for subject, count in by_subject:
@@ -164,6 +158,26 @@ def show_stats():
     conn.close()
 
 
+def show_keywords(limit=20):
+    """Show the most used keywords"""
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        SELECT keyword, COUNT(*) as note_count
+        FROM note_keywords
+        GROUP BY keyword
+        ORDER BY note_count DESC, keyword
+        LIMIT ?
+    """, (limit,))
+    
+    print(f"\n🏷️ TOP KEYWORDS (Top {limit})")
+    print("=" * 70)
+    print_table(["Keyword", "Notes"], cursor.fetchall())
+    
+    conn.close()
+
+
 def main():
     if len(sys.argv) < 2:
         print("Usage:")
@@ -171,6 +185,7 @@ def main():
         print("  python view_db.py topics         - Show all topics")
         print("  python view_db.py notes [limit]  - Show recent notes")
         print("  python view_db.py note <id>      - Show note details")
+        print("  python view_db.py keywords [limit] - Show top keywords")
         sys.exit(1)
     
     command = sys.argv[1]
@@ -188,6 +203,9 @@ def main():
                 print("❌ Please provide note ID")
                 sys.exit(1)
             show_note_details(int(sys.argv[2]))
+        elif command == "keywords":
+            limit = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+            show_keywords(limit)
         else:
             print(f"❌ Unknown command: {command}")
             sys.exit(1)
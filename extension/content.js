@@ -60,6 +60,68 @@ function handleSelection() {
   }
 }
 
+// Update the label shown next to the spinner while a capture is in progress
+function setLoadingLabel(label) {
+  const span = captureButton.querySelector('span');
+  if (span && captureButton.classList.contains('loading')) {
+    span.textContent = label;
+  }
+}
+
+// Stream a capture from /capture/stream, calling onEvent for each progress event.
+// Resolves with the final note data; falls back to /capture on servers without streaming.
+async function streamCapture(apiUrl, apiToken, payload, onEvent) {
+  const headers = {
+    'Content-Type': 'application/json',
+  };
+  // Multi-tenant backends pick the user's database from this token
+  if (apiToken) {
+    headers['Authorization'] = `Bearer ${apiToken}`;
+  }
+  const request = {
+    method: 'POST',
+    headers,
+    body: JSON.stringify(payload)
+  };
+
+  const response = await fetch(`${apiUrl}/capture/stream`, request);
+  if (response.status === 404 || response.status === 405) {
+    const fallback = await fetch(`${apiUrl}/capture`, request);
+    if (!fallback.ok) {
+      throw new Error(`HTTP ${fallback.status}`);
+    }
+    return (await fallback.json()).data;
+  }
+  if (!response.ok || !response.body) {
+    throw new Error(`HTTP ${response.status}`);
+  }
+
+  // One JSON event per line
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { value, done } = await reader.read();
+    buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+    const lines = buffer.split('\n');
+    buffer = done ? '' : lines.pop();
+    for (const line of lines) {
+      if (!line.trim()) continue;
+      const event = JSON.parse(line);
+      if (event.event === 'failed') {
+        throw new Error(event.error || 'Capture failed');
+      }
+      if (event.event === 'done' || event.event === 'duplicate') {
+        return event.data;
+      }
+      onEvent(event);
+    }
+    if (done) {
+      throw new Error('Capture stream ended early');
+    }
+  }
+}
+
 // Send captured text to backend
 async function captureText() {
   if (!selectedText) return;
@@ -74,46 +136,23 @@ async function captureText() {
   `;
   captureButton.classList.add('loading');
   
-  try {
-    // Get API URL from storage
-    const { apiUrl = 'http://localhost:8000' } = await chrome.storage.sync.get('apiUrl');
-    
-    // Send to backend
-    const response = await fetch(`${apiUrl}/capture`, {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-      },
-      body: JSON.stringify({
-        text: selectedText,
-        url: window.location.href,
-        pageTitle: document.title
-      })
-    });
-    
-    if (!response.ok) {
-      throw new Error(`HTTP ${response.status}`);
-    }
-    
-    const data = await response.json();
-    
-    // Show success state
+  let saved = false;
+  
+  // Show success state (as soon as the note is classified; Notion sync may still be running)
+  const showSaved = (label) => {
+    if (saved) return;
+    saved = true;
     captureButton.innerHTML = `
       <svg width="14" height="14" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
         <path d="M22 11.08V12a10 10 0 1 1-5.93-9.14"/>
         <polyline points="22 4 12 14.01 9 11.01"/>
       </svg>
-      <span>Saved!</span>
+      <span></span>
     `;
+    captureButton.querySelector('span').textContent = label;
     captureButton.classList.remove('loading');
     captureButton.classList.add('success');
     
-    // Send notification
-    chrome.runtime.sendMessage({
-      type: 'CAPTURE_SUCCESS',
-      data: data.data
-    });
-    
     // Reset button after showing success
     setTimeout(() => {
       captureButton.innerHTML = `
@@ -128,10 +167,41 @@ async function captureText() {
       hideButton();
       // Don't clear selection - let user select again if they want
     }, 1500);
+  };
+  
+  try {
+    // Get API URL and token from storage
+    const { apiUrl = 'http://localhost:8000', apiToken = '' } = await chrome.storage.sync.get(['apiUrl', 'apiToken']);
+    
+    // Send to backend, showing each stage as it happens
+    const data = await streamCapture(apiUrl, apiToken, {
+      text: selectedText,
+      url: window.location.href,
+      pageTitle: document.title
+    }, (event) => {
+      if (event.event === 'stored') {
+        setLoadingLabel('Saved, classifying...');
+      } else if (event.event === 'partial') {
+        setLoadingLabel(`${event.topic}...`);
+      } else if (event.event === 'classified') {
+        showSaved(`Saved to ${event.topic}`);
+      }
+    });
+    
+    showSaved('Saved!');
+    
+    // Send notification
+    chrome.runtime.sendMessage({
+      type: 'CAPTURE_SUCCESS',
+      data: data
+    });
     
   } catch (error) {
     console.error('Capture error:', error);
     
+    // The note was already saved and classified; only the rest of the stream was lost
+    if (saved) return;
+    
     // Show error state
     captureButton.innerHTML = `
       <svg width="14" height="14" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
@@ -3,15 +3,19 @@
  */
 
 const apiUrlInput = document.getElementById('apiUrl');
+const apiTokenInput = document.getElementById('apiToken');
 const saveBtn = document.getElementById('saveBtn');
 const statusMsg = document.getElementById('statusMsg');
 const captureCountEl = document.getElementById('captureCount');
 
 // Load saved settings
-chrome.storage.sync.get(['apiUrl', 'captureCount'], (result) => {
+chrome.storage.sync.get(['apiUrl', 'apiToken', 'captureCount'], (result) => {
   if (result.apiUrl) {
     apiUrlInput.value = result.apiUrl;
   }
+  if (result.apiToken) {
+    apiTokenInput.value = result.apiToken;
+  }
   if (result.captureCount) {
     captureCountEl.textContent = result.captureCount;
   }
@@ -20,6 +24,7 @@ chrome.storage.sync.get(['apiUrl', 'captureCount'], (result) => {
 // Save settings
 saveBtn.addEventListener('click', () => {
   const apiUrl = apiUrlInput.value.trim();
+  const apiToken = apiTokenInput.value.trim();
   
   if (!apiUrl) {
     showStatus('Please enter an API URL', 'error');
@@ -35,7 +40,7 @@ saveBtn.addEventListener('click', () => {
   }
 
   // Save to storage
-  chrome.storage.sync.set({ apiUrl }, () => {
+  chrome.storage.sync.set({ apiUrl, apiToken }, () => {
     showStatus('Settings saved successfully!', 'success');
   });
 });